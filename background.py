@@ -0,0 +1,155 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import queue
+import threading
+import traceback
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from progress import Progress, TransferCancelled, StageTimer
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Intervalo (ms) entre as leituras da fila de progresso pela interface
+POLL_INTERVAL = 100
+
+# ------------------------------------------------------------------------------------
+# Background Task --------------------------------------------------------------------
+
+# Execução de uma transferência de cores em uma thread separada da interface.
+# work(progress) faz todo o processamento e devolve o resultado; ele não deve tocar em widgets Tk.
+# As mensagens para a interface passam por uma fila (thread-safe):
+#   ("progress", etapa, feito, total), ("done", resultado), ("cancelled",) ou ("error", exceção, traceback)
+class BackgroundTask:
+
+    def __init__(self, work):
+        self.work = work
+        self.messages = queue.Queue()
+        self.progress = Progress(lambda stage, done, total: self.messages.put(("progress", stage, done, total)))
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    # Pede o cancelamento; a transferência para no próximo ponto de verificação
+    def cancel(self):
+        self.progress.cancel()
+
+    def run(self):
+        try:
+            self.messages.put(("done", self.work(self.progress)))
+        except TransferCancelled:
+            self.messages.put(("cancelled",))
+        except Exception as e:
+            self.messages.put(("error", e, traceback.format_exc()))
+
+    def running(self):
+        return self.thread.is_alive()
+
+# ------------------------------------------------------------------------------------
+# Progress Window --------------------------------------------------------------------
+
+# Janela com a etapa atual, barra de progresso, tempo restante estimado e botão de cancelar
+class ProgressWindow:
+
+    def __init__(self, parent, title, onCancel):
+        self.window = tk.Toplevel(parent)
+        self.window.title(title)
+        self.window.geometry("+1000+50")
+        self.window.resizable(False, False)
+        self.window.protocol("WM_DELETE_WINDOW", onCancel)
+
+        self.stage = tk.Label(self.window, text="Starting...", anchor="w", width=40)
+        self.stage.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="w")
+
+        self.bar = ttk.Progressbar(self.window, orient="horizontal", length=300, mode="determinate", maximum=1.0)
+        self.bar.grid(row=1, column=0, padx=10, pady=5)
+
+        self.eta = tk.Label(self.window, text="", anchor="w", width=40)
+        self.eta.grid(row=2, column=0, padx=10, pady=5, sticky="w")
+
+        self.cancelButton = tk.Button(self.window, text="Cancel", command=onCancel)
+        self.cancelButton.grid(row=3, column=0, pady=(5, 10))
+
+        self.timer = StageTimer()
+
+    # Mostra o andamento de uma etapa
+    def update(self, stage, done, total):
+        self.stage.config(text=f"{stage}: {done}/{total}")
+        self.bar["value"] = done / total if total > 0 else 0.0
+        remaining = self.timer.remaining(stage, done, total)
+        self.eta.config(text="" if remaining is None else f"About {remaining:.0f} s left")
+
+    # Indica que o cancelamento foi pedido e aguarda o processamento parar
+    def cancelling(self):
+        self.cancelButton.config(state="disabled")
+        self.eta.config(text="Cancelling...")
+
+    def close(self):
+        self.window.destroy()
+
+# ------------------------------------------------------------------------------------
+# Run In Background ------------------------------------------------------------------
+
+# Função que executa work(progress) em segundo plano, mostrando a janela de progresso.
+# A fila é lida pela própria interface a cada POLL_INTERVAL ms (after), então apenas a thread da interface toca
+# nos widgets; onDone(resultado) é chamado nela ao final.
+# Retorno: a tarefa (BackgroundTask), para que a interface saiba se há uma execução em andamento
+def runInBackground(parent, work, onDone, title="Color Transfer"):
+    task = BackgroundTask(work)
+
+    def cancel():
+        task.cancel()
+        window.cancelling()
+
+    window = ProgressWindow(parent, title, cancel)
+
+    def poll():
+        latest = None
+        while True:
+            try:
+                message = task.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                latest = message
+                continue
+
+            # Fim da execução
+            window.close()
+            if message[0] == "done":
+                onDone(message[1])
+            elif message[0] == "cancelled":
+                messagebox.showinfo("Process", "The color transfer process was cancelled.")
+            else:
+                print(message[2])
+                messagebox.showerror("Error", f"The color transfer process failed: {message[1]}")
+            return
+
+        if latest is not None:
+            window.update(*latest[1:])
+        parent.after(POLL_INTERVAL, poll)
+
+    task.start()
+    parent.after(POLL_INTERVAL, poll)
+    return task
+
+# ------------------------------------------------------------------------------------
+# When Done --------------------------------------------------------------------------
+
+# Função que espera, sem bloquear a interface, o fim de uma tarefa que roda em outra thread (concurrent.futures.Future,
+# ex.: a gravação do resultado em writer.AsyncWriter). O Future é verificado a cada POLL_INTERVAL ms, e onDone(resultado)
+# ou onError(exceção) é chamado na thread da interface.
+def whenDone(parent, future, onDone, onError):
+    def poll():
+        if not future.done():
+            parent.after(POLL_INTERVAL, poll)
+        elif future.exception() is not None:
+            onError(future.exception())
+        else:
+            onDone(future.result())
+
+    parent.after(POLL_INTERVAL, poll)
@@ -0,0 +1,166 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from transfer import GlobalTransfer, readSource, readTarget, writeResult
+from writer import AsyncWriter
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Extensões de arquivo aceitas quando um diretório de imagens target é informado
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+# ------------------------------------------------------------------------------------
+# Batch Summary ----------------------------------------------------------------------
+
+# Resultado de um lote de transferências de cores: arquivos gerados, falhas (arquivo -> mensagem de erro),
+# arquivos gravados com outro nome porque o nome já era usado por outra target (arquivo -> arquivo gerado),
+# tempo total (incluindo a pré-computação da source) e número de pixels coloridos.
+@dataclass
+class BatchSummary:
+    done: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+    renamed: dict = field(default_factory=dict)
+    seconds: float = 0.0
+    pixels: int = 0
+
+    # Imagens coloridas por segundo
+    def imagesPerSecond(self):
+        return len(self.done) / self.seconds if self.seconds > 0 else 0.0
+
+    # Texto com o resumo do lote
+    def report(self):
+        lines = [f"{len(self.done)} images colorized, {len(self.failed)} failed in {self.seconds:.2f} s "
+                 f"({self.imagesPerSecond():.2f} images/s, {self.pixels / max(self.seconds, 1e-9) / 1e6:.2f} MP/s)"]
+        for path, result in self.renamed.items():
+            lines.append(f"  renamed: {path} -> {result} (name already used by another target)")
+        for path, error in self.failed.items():
+            lines.append(f"  failed: {path}: {error}")
+        return "\n".join(lines)
+
+# ------------------------------------------------------------------------------------
+# Target Listing ---------------------------------------------------------------------
+
+# Função que expande a lista de caminhos informada: diretórios são trocados pelas imagens que contêm (em ordem alfabética)
+def listTargets(paths):
+    targets = []
+    for path in paths:
+        if os.path.isdir(path):
+            targets.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS)))
+        else:
+            targets.append(path)
+    return targets
+
+# Função que define o arquivo de saída de uma imagem target
+def outputPath(targetPath, outputDir, extension=".png"):
+    return os.path.join(outputDir, os.path.splitext(os.path.basename(targetPath))[0] + extension)
+
+# Função que define os arquivos de saída de todas as imagens target, sem repetições: targets com o mesmo nome
+# (ex.: a.png e a.jpg, ou img.png de diretórios diferentes) seriam gravadas no mesmo arquivo, então a primeira fica
+# com o nome de outputPath e as seguintes recebem um sufixo (_2, _3, ...) ainda não usado.
+# Retorno: lista com o arquivo de saída de cada target, na ordem de targetPaths
+def outputPaths(targetPaths, outputDir, extension=".png"):
+    paths = [outputPath(path, outputDir, extension) for path in targetPaths]
+    used = {os.path.normcase(path) for path in paths}
+    taken = set()
+    for i, path in enumerate(paths):
+        if os.path.normcase(path) in taken:
+            base = os.path.splitext(path)[0]
+            number = 2
+            while os.path.normcase(f"{base}_{number}{extension}") in used:
+                number += 1
+            path = paths[i] = f"{base}_{number}{extension}"
+            used.add(os.path.normcase(path))
+        taken.add(os.path.normcase(path))
+    return paths
+
+# ------------------------------------------------------------------------------------
+# Worker -----------------------------------------------------------------------------
+
+# Estado de cada processo do pool: o processo de transferência, a source pré-computada e as opções de gravação.
+# É definido uma única vez por processo (initializer); com o start method "fork" os arrays da source são
+# herdados do processo principal sem cópia (copy-on-write), já que nunca são alterados.
+# Com worker_writer (writer.AsyncWriter), a gravação de cada resultado roda em segundo plano enquanto a próxima
+# imagem é colorida; os erros de gravação ficam em worker_writer.failed.
+worker_transfer = None
+worker_prepared = None
+worker_options = None
+worker_writer = None
+
+# Inicializa o estado do processo
+def initWorker(transfer, prepared, options=None, writer=None):
+    global worker_transfer, worker_prepared, worker_options, worker_writer
+    worker_transfer = transfer
+    worker_prepared = prepared
+    worker_options = options
+    worker_writer = writer
+
+# Colore um único arquivo. Qualquer erro fica restrito ao arquivo e é devolvido como mensagem.
+# Retorno: tupla (arquivo target, arquivo gerado ou None, mensagem de erro ou None, número de pixels)
+def colorizeFile(targetPath, resultPath):
+    try:
+        target = readTarget(targetPath)
+        result = worker_transfer.apply(worker_prepared, target)
+        if worker_writer is not None:
+            worker_writer.submit(resultPath, result, worker_options)
+        else:
+            writeResult(resultPath, result, worker_options)
+        return targetPath, resultPath, None, target.size
+    except Exception as e:
+        return targetPath, None, f"{type(e).__name__}: {e}", 0
+
+# ------------------------------------------------------------------------------------
+# Batch Transfer ---------------------------------------------------------------------
+
+# Função que colore várias imagens target com a mesma imagem source (transferência global).
+# Como funciona:
+# - A source é pré-computada uma única vez (Lab, desvio padrão, amostras; ver GlobalTransfer.prepare), ou lida do cache.
+# - As targets são distribuídas entre workers processos, que recebem a source pré-computada ao iniciar; cada processo
+#   consulta o índice espacial com uma única thread (params.query_workers = 1).
+# - Os resultados são gravados com as opções options (writer.WriteOptions); com um único worker, a gravação de cada
+#   resultado roda em segundo plano enquanto a próxima imagem é colorida.
+# - Uma falha em um arquivo não interrompe o lote; ela é registrada no resumo.
+# Retorno: BatchSummary
+def colorizeBatch(sourcePath, targetPaths, outputDir, params=None, workers=None, extension=".png", cache=None, options=None):
+    start = time.perf_counter()
+    summary = BatchSummary()
+
+    # Pré-computa a imagem source (ou a lê do cache em disco)
+    transfer = GlobalTransfer(params, cache)
+    prepared = transfer.prepare(readSource(sourcePath))
+
+    os.makedirs(outputDir, exist_ok=True)
+    targets = listTargets(targetPaths)
+    jobs = list(zip(targets, outputPaths(targets, outputDir, extension)))
+    summary.renamed = {target: result for target, result in jobs if result != outputPath(target, outputDir, extension)}
+
+    # Com um único worker o lote roda no próprio processo
+    workers = workers if workers is not None else os.cpu_count() or 1
+    writeErrors = {}
+    if workers <= 1 or len(jobs) <= 1:
+        with AsyncWriter() as writer:
+            initWorker(transfer, prepared, options, writer)
+            results = [colorizeFile(*job) for job in jobs]
+        initWorker(transfer, prepared, options)
+        writeErrors = writer.failed
+    else:
+        poolTransfer = GlobalTransfer(replace(transfer.params, query_workers=1))
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=initWorker, initargs=(poolTransfer, prepared, options)) as pool:
+            results = list(pool.map(colorizeFile, *zip(*jobs)))
+
+    # Monta o resumo
+    for targetPath, resultPath, error, pixels in results:
+        error = error or writeErrors.get(resultPath)
+        if error is None:
+            summary.done.append(resultPath)
+            summary.pixels += pixels
+        else:
+            summary.failed[targetPath] = error
+
+    summary.seconds = time.perf_counter() - start
+    return summary
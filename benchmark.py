@@ -0,0 +1,621 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import argparse
+import cv2
+import numpy as np
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from instrument import Instrumentation
+from transfer import TransferParams, GlobalTransfer, SwatchTransfer, readSource, readTarget
+from sampling import SAMPLERS, sampleSource, samplingCoverage
+from neighbourhood import localStd
+from matching import SampleIndex, bestMatchBatch
+from synthesis import texture_synthesis, SwatchPatches, PatchIndex, WindowMatches, synthesizeFromMatches
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Diretório das imagens usadas no benchmark
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+
+# Pares de swatches das imagens de exemplo (ver img/source_swatches e img/target_swatches)
+SWATCHES_FILE = os.path.join(IMG_DIR, "swatches.json")
+
+# Imagens coloridas usadas como source e target (convertida para tons de cinza) ao mesmo tempo
+SELF_GLOBAL_IMAGES = ("Gramado_72k.jpg", "Space_187k.jpg", "Underwater_53k.jpg")
+
+# Pares source/target da transferência global
+GLOBAL_PAIRS = ("1", "2", "3", "4")
+
+# Configurações medidas: grade do Jitter Sampling (M = N) e tamanho da vizinhança
+JITTER_GRIDS = (8, 15, 30)
+KERNEL_SIZES = (3, 5, 9)
+
+# Configuração única do modo rápido (--quick)
+QUICK_JITTER_GRIDS = (15,)
+QUICK_KERNEL_SIZES = (5,)
+
+# Semente fixa do Jitter Sampling, para que todas as execuções meçam o mesmo trabalho
+SEED = 0
+
+# Regressão tolerada por padrão no modo de comparação (fração do tempo de referência)
+DEFAULT_THRESHOLD = 0.25
+
+# Diferenças abaixo deste valor (segundos) não são consideradas regressão (ruído de medição)
+DEFAULT_MIN_SECONDS = 0.005
+
+# Fatores de redução da target medidos no modo preview
+PREVIEW_SCALES = (0.5, 0.25)
+
+# Números de candidatos da busca aproximada da síntese de textura medidos no modo recall
+ANN_CANDIDATES = (1, 2, 4, 8, 16, 32)
+
+# Orçamentos de amostras (grade M = N) medidos no modo sampling
+SAMPLING_GRIDS = (4, 8, 15, 30)
+
+# Fatores de ampliação das imagens no modo memory (o custo por megapixel é a diferença entre os picos)
+MEMORY_ENLARGE = (2, 4)
+
+# Número de casos aleatórios de cada verificação do modo verify
+VERIFY_CASES = 30
+
+# Configurações medidas no modo memory: (nome, modo, parâmetros adicionais)
+MEMORY_CONFIGS = (
+    ("exact", "global", {}),
+    ("lut", "global", {"lut": True}),
+    ("preview", "global", {"preview_scale": 0.25}),
+    ("swatches", "swatches", {"jitter_m": 8, "jitter_n": 8}),
+)
+
+# ------------------------------------------------------------------------------------
+# Workloads --------------------------------------------------------------------------
+
+# Função que lista as cargas de trabalho do benchmark: tuplas (nome, modo, source, target, pares de swatches)
+def workloads():
+    items = []
+    for name in SELF_GLOBAL_IMAGES:
+        path = os.path.join(IMG_DIR, "self_global", name)
+        items.append((f"self_global/{os.path.splitext(name)[0]}", "global", path, path, None))
+    for number in GLOBAL_PAIRS:
+        items.append((f"global/{number}", "global", os.path.join(IMG_DIR, "source", f"source{number}.jpg"), os.path.join(IMG_DIR, "target", f"target{number}.jpg"), None))
+
+    with open(SWATCHES_FILE) as f:
+        swatches = json.load(f)
+    for number in sorted(name for name in swatches if not name.startswith("_")):
+        entry = swatches[number]
+        pairs = [tuple(tuple(rect) for rect in pair) for pair in entry["pairs"]]
+        items.append((f"swatches/{number}", "swatches", os.path.join(IMG_DIR, entry["source"]), os.path.join(IMG_DIR, entry["target"]), pairs))
+    return items
+
+# ------------------------------------------------------------------------------------
+# Run --------------------------------------------------------------------------------
+
+# Função que executa uma carga de trabalho com uma configuração, repeat vezes, e devolve a melhor execução.
+# Tempo por etapa vem da instrumentação; o pico de memória é medido com tracemalloc (alocações do numpy incluídas),
+# em uma execução separada para não afetar os tempos.
+def runWorkload(mode, source, target, pairs, params, repeat):
+    best = None
+    for _ in range(repeat):
+        instrument = Instrumentation()
+        start = time.perf_counter()
+        if mode == "global":
+            GlobalTransfer(params, instrument=instrument).run(source, target)
+        else:
+            SwatchTransfer(params, instrument=instrument).run(source, target, pairs)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, instrument.seconds())
+
+    tracemalloc.start()
+    if mode == "global":
+        GlobalTransfer(params).run(source, target)
+    else:
+        SwatchTransfer(params).run(source, target, pairs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds, stages = best
+    return {
+        "seconds": seconds,
+        "stages": stages,
+        "peak_mb": peak / (1 << 20),
+        "pixels": int(target.size),
+        "mpixels_per_second": target.size / seconds / 1e6 if seconds > 0 else 0.0,
+    }
+
+# Função que executa todas as cargas de trabalho em todas as configurações.
+# Retorno: dicionário serializável em JSON (ambiente e uma entrada por execução, identificada por "id")
+def runBenchmark(jitterGrids=JITTER_GRIDS, kernelSizes=KERNEL_SIZES, repeat=3, match=None, progress=None):
+    results = []
+    for name, mode, sourcePath, targetPath, pairs in workloads():
+        if match is not None and match not in name:
+            continue
+        source = readSource(sourcePath)
+        target = readTarget(targetPath)
+        for grid in jitterGrids:
+            for kernel in kernelSizes:
+                params = TransferParams(kernel_size=kernel, jitter_m=grid, jitter_n=grid, seed=SEED)
+                record = {"id": f"{name}/jitter{grid}/kernel{kernel}", "workload": name, "mode": mode, "jitter": grid, "kernel_size": kernel}
+                record.update(runWorkload(mode, source, target, pairs, params, repeat))
+                results.append(record)
+                if progress is not None:
+                    progress(record)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+        },
+        "repeat": repeat,
+        "results": results,
+    }
+
+# ------------------------------------------------------------------------------------
+# Recall -----------------------------------------------------------------------------
+
+# Função que mede a busca aproximada da síntese de textura contra a busca exata nos exemplos com swatches.
+# As imagens (e os retângulos) podem ser ampliadas por scale para simular swatches grandes.
+# Retorno: lista de dicionários (exemplo, candidatos, recall, razão de erro, tempo da síntese, speedup sobre a busca exata)
+def runRecall(candidates=ANN_CANDIDATES, components=6, scale=1, progress=None):
+    results = []
+    for name, mode, sourcePath, targetPath, pairs in workloads():
+        if mode != "swatches":
+            continue
+        source = readSource(sourcePath)
+        target = readTarget(targetPath)
+        if scale != 1:
+            source = cv2.resize(source, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+            target = cv2.resize(target, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+            pairs = [tuple(tuple(v * scale for v in rect) for rect in pair) for pair in pairs]
+
+        # Referência: busca exata (melhor de duas execuções, a primeira também aquece as bibliotecas)
+        exactSeconds = float("inf")
+        for _ in range(2):
+            instrument = Instrumentation()
+            SwatchTransfer(TransferParams(jitter_m=8, jitter_n=8, seed=SEED), instrument=instrument).run(source, target, pairs)
+            exactSeconds = min(exactSeconds, instrument.seconds()["texture_synthesis"])
+
+        for k in candidates:
+            instrument = Instrumentation()
+            transfer = SwatchTransfer(TransferParams(jitter_m=8, jitter_n=8, seed=SEED, ann=True, ann_components=components, ann_candidates=k), instrument=instrument)
+            transfer.run(source, target, pairs)
+            seconds = instrument.seconds()["texture_synthesis"]
+            record = dict(transfer.stats["synthesis_recall"], workload=name, scale=scale, candidates=k, components=components,
+                          seconds=seconds, exact_seconds=exactSeconds, speedup=exactSeconds / seconds if seconds > 0 else 0.0)
+            results.append(record)
+            if progress is not None:
+                progress(record)
+    return results
+
+# ------------------------------------------------------------------------------------
+# Preview ----------------------------------------------------------------------------
+
+# Função que calcula a diferença de cor (ΔE CIE76, no espaço L*a*b* em ponto flutuante) entre duas imagens RGB uint8.
+# Retorno: tupla (média, percentil 95)
+def colorError(reference, result):
+    referenceLab = cv2.cvtColor(reference.astype(np.float32) / 255, cv2.COLOR_RGB2Lab)
+    resultLab = cv2.cvtColor(result.astype(np.float32) / 255, cv2.COLOR_RGB2Lab)
+    delta = np.linalg.norm(referenceLab - resultLab, axis=2)
+    return float(delta.mean()), float(np.percentile(delta, 95))
+
+# Função que mede o modo rápido (matching na target reduzida + ampliação guiada) contra o modo exato nas cargas de
+# trabalho globais. Para dar uma escala ao erro, também mede a diferença entre duas execuções exatas com sementes
+# diferentes (seed_floor) e, quando a target é a própria source em tons de cinza, o erro em relação à imagem original.
+# Retorno: lista de dicionários (um por carga de trabalho e fator de redução)
+def runPreview(scales=PREVIEW_SCALES, repeat=3, enlarge=1, progress=None):
+    results = []
+    for name, mode, sourcePath, targetPath, pairs in workloads():
+        if mode != "global":
+            continue
+        source = readSource(sourcePath)
+        target = readTarget(targetPath)
+        original = readSource(targetPath) if sourcePath == targetPath else None
+        if enlarge != 1:
+            target = cv2.resize(target, None, fx=enlarge, fy=enlarge, interpolation=cv2.INTER_CUBIC)
+            original = cv2.resize(original, None, fx=enlarge, fy=enlarge, interpolation=cv2.INTER_CUBIC) if original is not None else None
+
+        # Referência: modo exato (a pré-computação da source é compartilhada e fica fora da medição)
+        exactTransfer = GlobalTransfer(TransferParams(seed=SEED))
+        prepared = exactTransfer.prepare(source)
+        exactSeconds, exact = bestOf(repeat, lambda: exactTransfer.apply(prepared, target))
+        other = GlobalTransfer(TransferParams(seed=SEED + 1)).run(source, target)
+        seedFloor = colorError(exact, other)
+
+        for scale in scales:
+            transfer = GlobalTransfer(TransferParams(seed=SEED, preview_scale=scale))
+            seconds, preview = bestOf(repeat, lambda: transfer.apply(prepared, target))
+            mean, p95 = colorError(exact, preview)
+            record = {
+                "workload": name, "size": list(target.shape), "scale": scale,
+                "seconds": seconds, "exact_seconds": exactSeconds, "speedup": exactSeconds / seconds if seconds > 0 else 0.0,
+                "delta_e_mean": mean, "delta_e_p95": p95,
+                "seed_floor_mean": seedFloor[0], "seed_floor_p95": seedFloor[1],
+            }
+            if original is not None:
+                record["original_delta_e_exact"] = colorError(original, exact)[0]
+                record["original_delta_e_preview"] = colorError(original, preview)[0]
+            results.append(record)
+            if progress is not None:
+                progress(record)
+    return results
+
+# Função que executa run repeat vezes. Retorno: tupla (menor tempo, resultado da última execução)
+def bestOf(repeat, run):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+# ------------------------------------------------------------------------------------
+# Sampling ---------------------------------------------------------------------------
+
+# Função que mede cada amostrador da imagem source (sampling.SAMPLERS) nas cargas de trabalho globais, para cada
+# orçamento de amostras: cobertura da distribuição (luminância, desvio padrão) da source (sampling.samplingCoverage),
+# tempo da amostragem e, quando a target é a própria source em tons de cinza, o erro de cor do resultado em relação à
+# imagem original. As medidas são médias sobre seeds sementes, para separar o amostrador da sorte do sorteio.
+# Retorno: lista de dicionários (carga de trabalho, amostrador, grade, amostras, medidas)
+def runSampling(grids=SAMPLING_GRIDS, seeds=3, kernel=5, progress=None):
+    results = []
+    for name, mode, sourcePath, targetPath, pairs in workloads():
+        if mode != "global":
+            continue
+        source = readSource(sourcePath)
+        target = readTarget(targetPath)
+        lum = cv2.cvtColor(source, cv2.COLOR_RGB2Lab)[:, :, 0].astype(np.float64)
+        std = localStd(lum, kernel)
+
+        for grid in grids:
+            for sampler in SAMPLERS:
+                coverage = []
+                seconds = []
+                errors = []
+                for seed in range(SEED, SEED + seeds):
+                    start = time.perf_counter()
+                    _, sampleLum, sampleStd = sampleSource(lum, std, grid, grid, sampler, seed)
+                    seconds.append(time.perf_counter() - start)
+                    coverage.append(samplingCoverage(lum, std, sampleLum, sampleStd))
+                    if sourcePath == targetPath:
+                        result = GlobalTransfer(TransferParams(kernel_size=kernel, jitter_m=grid, jitter_n=grid, sampler=sampler, seed=seed)).run(source, target)
+                        errors.append(colorError(source, result)[0])
+
+                record = {"workload": name, "sampler": sampler, "grid": grid, "samples": coverage[0]["samples"], "seconds": float(np.mean(seconds))}
+                for measure in ("strata_coverage", "distance_mean", "distance_p95"):
+                    record[measure] = float(np.mean([entry[measure] for entry in coverage]))
+                if errors:
+                    record["original_delta_e"] = float(np.mean(errors))
+                results.append(record)
+                if progress is not None:
+                    progress(record)
+    return results
+
+# ------------------------------------------------------------------------------------
+# Memory -----------------------------------------------------------------------------
+
+# Função que mede o pico de memória (tracemalloc) de cada pipeline com as imagens ampliadas por cada fator de enlarge.
+# A pré-computação da source (modo global) fica fora da medição. O custo por megapixel da target é a inclinação entre
+# o menor e o maior fator, o que separa o que cresce com a imagem dos blocos de tamanho fixo (matching, síntese).
+# Retorno: lista de dicionários (carga de trabalho, configuração, pico em cada tamanho, MB por megapixel)
+def runMemory(enlarge=MEMORY_ENLARGE, match=None, progress=None):
+    results = []
+    for name, mode, sourcePath, targetPath, pairs in workloads():
+        if match is not None and match not in name:
+            continue
+        for config, configMode, extra in MEMORY_CONFIGS:
+            if configMode != mode:
+                continue
+            peaks = []
+            for factor in enlarge:
+                source = cv2.resize(readSource(sourcePath), None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+                target = cv2.resize(readTarget(targetPath), None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+                params = TransferParams(seed=SEED, **extra)
+                if mode == "global":
+                    transfer = GlobalTransfer(params)
+                    prepared = transfer.prepare(source)
+                    run = lambda: transfer.apply(prepared, target)
+                else:
+                    scaled = [tuple(tuple(v * factor for v in rect) for rect in pair) for pair in pairs]
+                    run = lambda: SwatchTransfer(params).run(source, target, scaled)
+                tracemalloc.start()
+                run()
+                peaks.append((int(target.size), tracemalloc.get_traced_memory()[1]))
+                tracemalloc.stop()
+
+            (pixelsA, peakA), (pixelsB, peakB) = peaks[0], peaks[-1]
+            record = {
+                "workload": name, "config": config, "enlarge": list(enlarge),
+                "pixels": [pixels for pixels, _ in peaks], "peak_mb": [peak / (1 << 20) for _, peak in peaks],
+                "mb_per_mpixel": (peakB - peakA) / (pixelsB - pixelsA) * 1e6 / (1 << 20) if pixelsB > pixelsA else float("nan"),
+            }
+            results.append(record)
+            if progress is not None:
+                progress(record)
+    return results
+
+# ------------------------------------------------------------------------------------
+# Verify -----------------------------------------------------------------------------
+
+# Laço original do matching (bestMatch pixel a pixel): a primeira amostra de menor distância para cada pixel
+def referenceMatch(target, targetStd, source, sourceCoord, sourceStd):
+    result = np.empty((target.size, 2), dtype=sourceCoord.dtype)
+    for p, (lum, std) in enumerate(zip(np.ravel(target), np.ravel(targetStd))):
+        distances = (source - lum)**2 + (sourceStd - std)**2
+        result[p] = sourceCoord[np.argmin(distances)]
+    return result
+
+# Laço original da síntese de texturas (janelas de 2*d em 2*d sobre as imagens com padding BORDER_REPLICATE).
+# Como no colorTransfer original, a imagem de resultado e os swatches são float64 (com luminância de valores inteiros),
+# então o erro do laço é exato.
+def referenceSynthesis(colorized_swatches, result_img, result_mask, window_size):
+    half_size = window_size // 2
+    size = 2*half_size
+    result_pad = cv2.copyMakeBorder(result_img.astype(np.float64), size, size, size, size, cv2.BORDER_REPLICATE)
+    mask_pad = cv2.copyMakeBorder(result_mask.astype(np.float64), size, size, size, size, cv2.BORDER_REPLICATE)
+    swatches_pad = [cv2.copyMakeBorder(swatch.astype(np.float64), size, size, size, size, cv2.BORDER_REPLICATE) for swatch in colorized_swatches]
+
+    for i in range(size, result_pad.shape[0]-half_size, size):
+        for j in range(size, result_pad.shape[1]-half_size, size):
+            if all(mask_pad[i+dx, j+dy] == 1 for dx in [-half_size, half_size] for dy in [-half_size, half_size]):
+                continue
+            temp = result_pad[i-half_size:i+half_size, j-half_size:j+half_size, 0]
+            min_error = float('inf')
+            best_patch = None
+            for swatch in swatches_pad:
+                for l in range(size, swatch.shape[0]-half_size, size):
+                    for m in range(size, swatch.shape[1]-half_size, size):
+                        each = swatch[l-half_size:l+half_size, m-half_size:m+half_size, 0]
+                        error = np.sum((temp - each) ** 2)
+                        if error < min_error:
+                            min_error = error
+                            best_patch = swatch[l-half_size:l+half_size, m-half_size:m+half_size]
+            if best_patch is not None:
+                result_pad[i-half_size:i+half_size, j-half_size:j+half_size, 1:] = best_patch[:, :, 1:]
+
+    return result_pad[size:-size, size:-size]
+
+# Função que sorteia um caso de matching com muitos empates: luminâncias e desvios padrão inteiros em faixas estreitas,
+# com amostras repetidas e amostras diferentes à mesma distância. O número de amostras cobre a busca linear e o índice
+# espacial (SAMPLE_INDEX_THRESHOLD).
+# Retorno: (luminâncias, desvios padrão e coordenadas das amostras, luminâncias e desvios padrão dos pixels)
+def randomMatchCase(rng):
+    samples = int(rng.integers(1, 400))
+    levels = int(rng.integers(2, 40))
+    source = rng.integers(0, levels, samples).astype(np.float64)
+    sourceStd = rng.integers(0, max(2, levels // 4), samples).astype(np.float64)
+    coord = np.column_stack((rng.permutation(samples), rng.permutation(samples)))
+    target = rng.integers(-2, levels + 2, 1000).astype(np.float64)
+    targetStd = rng.integers(0, max(2, levels // 4) + 2, 1000).astype(np.float64)
+    return source, sourceStd, coord, target, targetStd
+
+# Função que sorteia um caso de síntese de textura com muitos empates: poucos níveis de luminância, swatches pequenos
+# e uma máscara com os retângulos dos swatches target já coloridos.
+# Retorno: (swatches coloridos (Lab uint8), imagem de resultado (Lab uint8), máscara, outra máscara, window_size)
+def randomSynthesisCase(rng):
+    levels = int(rng.integers(2, 5))
+    step = int(rng.integers(1, 86))
+    height, width = (int(v) for v in rng.integers(6, 32, 2))
+    result = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    result[:, :, 0] = rng.integers(0, levels, (height, width)) * step
+    swatches = []
+    for _ in range(int(rng.integers(1, 4))):
+        swatch = rng.integers(0, 256, (int(rng.integers(2, 12)), int(rng.integers(2, 12)), 3), dtype=np.uint8)
+        swatch[:, :, 0] = rng.integers(0, levels, swatch.shape[:2]) * step
+        swatches.append(swatch)
+    masks = []
+    for _ in range(2):
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for _ in range(int(rng.integers(0, 4))):
+            y, x = int(rng.integers(0, height)), int(rng.integers(0, width))
+            mask[y:y + int(rng.integers(1, 12)), x:x + int(rng.integers(1, 12))] = 1
+        masks.append(mask)
+    return swatches, result, masks[0], masks[1], int(rng.integers(2, 7))
+
+# Função que verifica que as implementações vetorizadas têm exatamente o resultado dos laços originais em casos
+# aleatórios com muitos empates (onde a ordem de desempate importa):
+# - matching: bestMatchBatch e SampleIndex (busca linear ou índice espacial, e a visão remapeada com escala potência
+#   de 2 e deslocamento inteiro, em que a conversão dos pixels é exata) contra o laço pixel a pixel;
+# - synthesis: texture_synthesis com SwatchPatches, com PatchIndex com todos os candidatos, e synthesizeFromMatches
+#   (inclusive reaproveitando as buscas com outra máscara) contra o laço original da síntese.
+# Retorno: lista de dicionários (verificação, casos, casos com diferença)
+def runVerify(cases=VERIFY_CASES, seed=0, progress=None):
+    rng = np.random.default_rng(seed)
+    mismatches = {}
+    def check(name, reference, result):
+        mismatches[name] = mismatches.get(name, 0) + int(not np.array_equal(reference, result))
+
+    for _ in range(cases):
+        source, sourceStd, coord, target, targetStd = randomMatchCase(rng)
+        reference = referenceMatch(target, targetStd, source, coord, sourceStd)
+        check("bestMatchBatch", reference, bestMatchBatch(target, targetStd, source, coord, sourceStd))
+        index = SampleIndex(source, coord, sourceStd)
+        check("SampleIndex", reference, index.match(target, targetStd))
+        scale, offset = float(rng.choice([0.5, 2.0, 4.0])), float(rng.integers(-8, 8))
+        reference = referenceMatch(target, targetStd, scale * source + offset, coord, scale * sourceStd)
+        check("SampleIndex.remapped", reference, index.remapped(scale, offset).match(target, targetStd))
+
+    for _ in range(cases):
+        swatches, result, mask, otherMask, window_size = randomSynthesisCase(rng)
+        reference = referenceSynthesis(swatches, result, mask, window_size)
+        check("texture_synthesis", reference, texture_synthesis(swatches, result.copy(), mask, window_size))
+        patches = PatchIndex(swatches, window_size, candidates=len(SwatchPatches(swatches, window_size).distinct))
+        check("texture_synthesis (ann, all candidates)", reference, texture_synthesis(swatches, result.copy(), mask, window_size, patches))
+        matches = [WindowMatches(swatch[:, :, 0], result.shape, window_size) for swatch in swatches]
+        check("synthesizeFromMatches", reference, synthesizeFromMatches(swatches, matches, result.copy(), mask, window_size))
+        check("synthesizeFromMatches (reused)", referenceSynthesis(swatches, result, otherMask, window_size),
+              synthesizeFromMatches(swatches, matches, result.copy(), otherMask, window_size))
+
+    results = []
+    for name, count in mismatches.items():
+        record = {"check": name, "cases": cases, "mismatches": count}
+        results.append(record)
+        if progress is not None:
+            progress(record)
+    return results
+
+# ------------------------------------------------------------------------------------
+# Compare ----------------------------------------------------------------------------
+
+# Função que compara dois resultados do benchmark, etapa por etapa (e o tempo total).
+# Uma etapa regrediu se ficou mais de threshold (fração) mais lenta e a diferença passa de minSeconds.
+# Retorno: lista de tuplas (id, etapa, tempo de referência, tempo atual, variação relativa), com as regressões
+def compareResults(baseline, current, threshold=DEFAULT_THRESHOLD, minSeconds=DEFAULT_MIN_SECONDS):
+    reference = {record["id"]: record for record in baseline["results"]}
+    regressions = []
+    for record in current["results"]:
+        base = reference.get(record["id"])
+        if base is None:
+            continue
+        timings = dict(record["stages"], total=record["seconds"])
+        baseTimings = dict(base["stages"], total=base["seconds"])
+        for stage, seconds in timings.items():
+            if stage not in baseTimings:
+                continue
+            before = baseTimings[stage]
+            if seconds - before > minSeconds and seconds > before * (1 + threshold):
+                regressions.append((record["id"], stage, before, seconds, seconds / before - 1 if before > 0 else float("inf")))
+    return regressions
+
+# ------------------------------------------------------------------------------------
+# Command Line -----------------------------------------------------------------------
+#
+# Uso:
+#   python benchmark.py run -o results.json [--quick] [--repeat 3] [--match swatches]
+#   python benchmark.py compare baseline.json results.json [--threshold 0.25] [--min-seconds 0.005]
+#   python benchmark.py recall [--scale 4] [--components 6] [-o recall.json]
+#   python benchmark.py preview [--scales 0.5 0.25] [--enlarge 4] [-o preview.json]
+#   python benchmark.py sampling [--grids 4 8 15 30] [--seeds 3] [-o sampling.json]
+#   python benchmark.py memory [--enlarge 2 4] [--match global] [-o memory.json]
+#   python benchmark.py verify [--cases 30] [--seed 0]
+#
+# O modo compare termina com código 1 se alguma etapa regrediu, e o modo verify se alguma implementação vetorizada
+# diferiu do laço original, para serem usados em scripts de integração.
+
+# Função que escreve uma linha de progresso por execução
+def printRecord(record):
+    stages = ", ".join(f"{stage} {seconds * 1000:.1f}" for stage, seconds in record["stages"].items())
+    print(f"{record['id']}: {record['seconds'] * 1000:.1f} ms ({record['mpixels_per_second']:.2f} MP/s, peak {record['peak_mb']:.1f} MB) [{stages}]")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the color transfer pipelines over the images in img/.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="run the benchmark and write the results as JSON")
+    run.add_argument("-o", "--output", required=True, help="results file (JSON)")
+    run.add_argument("--quick", action="store_true", help="a single configuration (jitter 15, kernel 5)")
+    run.add_argument("--repeat", type=int, default=3, help="runs per configuration; the fastest is kept")
+    run.add_argument("--match", default=None, help="only workloads whose name contains this text")
+
+    compare = subparsers.add_parser("compare", help="compare two results and fail on regressions")
+    compare.add_argument("baseline", help="reference results (JSON)")
+    compare.add_argument("current", help="new results (JSON)")
+    compare.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="tolerated slowdown per stage (fraction)")
+    compare.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS, help="ignore differences smaller than this")
+
+    recall = subparsers.add_parser("recall", help="recall of the approximate patch search of the texture synthesis")
+    recall.add_argument("-o", "--output", default=None, help="results file (JSON)")
+    recall.add_argument("--scale", type=int, default=1, help="enlarge the images (and swatches) by this factor")
+    recall.add_argument("--components", type=int, default=6, help="PCA dimensions")
+    recall.add_argument("--candidates", type=int, nargs="+", default=ANN_CANDIDATES, help="candidate counts to measure")
+
+    preview = subparsers.add_parser("preview", help="speed and color error of the fast (reduced resolution) global mode")
+    preview.add_argument("-o", "--output", default=None, help="results file (JSON)")
+    preview.add_argument("--scales", type=float, nargs="+", default=PREVIEW_SCALES, help="reduction factors to measure")
+    preview.add_argument("--repeat", type=int, default=3, help="runs per configuration; the fastest is kept")
+    preview.add_argument("--enlarge", type=int, default=1, help="enlarge the targets by this factor (larger images)")
+
+    sampling = subparsers.add_parser("sampling", help="coverage of the (luminance, std) distribution per sample budget of each source sampler")
+    sampling.add_argument("-o", "--output", default=None, help="results file (JSON)")
+    sampling.add_argument("--grids", type=int, nargs="+", default=SAMPLING_GRIDS, help="sample grids (M = N) to measure")
+    sampling.add_argument("--seeds", type=int, default=3, help="seeds averaged per configuration")
+
+    memory = subparsers.add_parser("memory", help="peak memory per megapixel of each pipeline")
+    memory.add_argument("-o", "--output", default=None, help="results file (JSON)")
+    memory.add_argument("--enlarge", type=int, nargs="+", default=MEMORY_ENLARGE, help="enlargement factors of the images")
+    memory.add_argument("--match", default=None, help="only workloads whose name contains this text")
+
+    verify = subparsers.add_parser("verify", help="check that the vectorized matching and synthesis give exactly the results of the original loops")
+    verify.add_argument("--cases", type=int, default=VERIFY_CASES, help="random tie-heavy cases per check")
+    verify.add_argument("--seed", type=int, default=0, help="seed of the random cases")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        results = runVerify(args.cases, args.seed, lambda r: print(f"{r['check']}: {r['cases'] - r['mismatches']}/{r['cases']} identical"))
+        failed = sum(r["mismatches"] > 0 for r in results)
+        print(f"{failed} checks with differences")
+        return 1 if failed else 0
+
+    if args.command == "sampling":
+        def printSampling(r):
+            line = (f"{r['workload']} {r['sampler']} {r['samples']} samples: strata {r['strata_coverage'] * 100:.1f}%, "
+                    f"distance mean {r['distance_mean']:.2f} p95 {r['distance_p95']:.2f}, {r['seconds'] * 1000:.1f} ms")
+            if "original_delta_e" in r:
+                line += f", vs original dE {r['original_delta_e']:.2f}"
+            print(line)
+        results = runSampling(args.grids, args.seeds, progress=printSampling)
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    if args.command == "memory":
+        printMemory = lambda r: print(f"{r['workload']} {r['config']}: {r['mb_per_mpixel']:.1f} MB/MP "
+                                      f"(peak {', '.join(f'{mb:.1f}' for mb in r['peak_mb'])} MB at x{', x'.join(map(str, r['enlarge']))})")
+        results = runMemory(args.enlarge, args.match, printMemory)
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    if args.command == "preview":
+        def printPreview(r):
+            line = (f"{r['workload']} {r['size'][1]}x{r['size'][0]} scale {r['scale']}: {r['speedup']:.2f}x, "
+                    f"dE mean {r['delta_e_mean']:.2f} p95 {r['delta_e_p95']:.2f} (seed floor {r['seed_floor_mean']:.2f} / {r['seed_floor_p95']:.2f})")
+            if "original_delta_e_exact" in r:
+                line += f", vs original: exact {r['original_delta_e_exact']:.2f} preview {r['original_delta_e_preview']:.2f}"
+            print(line)
+        results = runPreview(args.scales, args.repeat, args.enlarge, printPreview)
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    if args.command == "recall":
+        printRecall = lambda r: print(f"{r['workload']} x{r['scale']} k={r['candidates']}: recall {r['recall']:.3f} (same window {r['same_window']:.3f}), error ratio {r['error_ratio']:.3f}, "
+                                      f"{r['seconds'] * 1000:.1f} ms (exact {r['exact_seconds'] * 1000:.1f} ms, {r['speedup']:.2f}x)")
+        results = runRecall(args.candidates, args.components, args.scale, printRecall)
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    if args.command == "run":
+        jitterGrids = QUICK_JITTER_GRIDS if args.quick else JITTER_GRIDS
+        kernelSizes = QUICK_KERNEL_SIZES if args.quick else KERNEL_SIZES
+        results = runBenchmark(jitterGrids, kernelSizes, args.repeat, args.match, printRecord)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compareResults(baseline, current, args.threshold, args.min_seconds)
+    for identifier, stage, before, after, change in regressions:
+        print(f"REGRESSION {identifier} {stage}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms (+{change * 100:.0f}%)")
+    print(f"{len(regressions)} regressions (threshold {args.threshold * 100:.0f}%)")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
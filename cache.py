@@ -0,0 +1,261 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Diretório padrão do cache (pode ser trocado pela variável de ambiente COLORTRANSFER_CACHE_DIR)
+DEFAULT_CACHE_DIR = os.environ.get("COLORTRANSFER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "colortransfer"))
+
+# Tamanho máximo padrão do cache em disco (bytes); as entradas usadas há mais tempo são removidas primeiro
+DEFAULT_CACHE_BYTES = 1 << 30
+
+# Arquivo de metadados de cada entrada (a data de modificação marca o último uso)
+META_FILE = "meta.json"
+
+# Tamanho máximo padrão do cache de etapas em memória (bytes)
+DEFAULT_STAGE_BYTES = 512 << 20
+
+# ------------------------------------------------------------------------------------
+# Image Hash -------------------------------------------------------------------------
+
+# Função que calcula o hash do conteúdo de uma imagem (pixels, formato e tipo), independente do arquivo de origem
+def imageHash(img):
+    img = np.ascontiguousarray(img)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{img.shape}{img.dtype}".encode())
+    digest.update(memoryview(img).cast("B"))
+    return digest.hexdigest()
+
+# ------------------------------------------------------------------------------------
+# Source Cache -----------------------------------------------------------------------
+
+# Cache persistente, endereçado por conteúdo, de arrays pré-computados.
+# Como funciona:
+# - Cada entrada é um diretório com um .npy por array e um meta.json com os valores escalares.
+# - Os arrays são lidos com mmap (np.load(..., mmap_mode="r")), então uma entrada grande não é copiada para a memória.
+# - Ao passar de maxBytes, as entradas usadas há mais tempo são removidas (LRU pela data de modificação do meta.json).
+# - hits, misses e evictions contam os acessos feitos por este objeto.
+class SourceCache:
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, maxBytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # Chave de uma entrada: hash da imagem mais os parâmetros que influenciam a pré-computação
+    def key(self, img, **params):
+        parts = [imageHash(img)] + [f"{name}={params[name]}" for name in sorted(params)]
+        return hashlib.blake2b("|".join(parts).encode(), digest_size=20).hexdigest()
+
+    # Busca uma entrada. Retorno: tupla (arrays, valores escalares) ou None se a entrada não existir
+    def get(self, key):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in meta["arrays"]}
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        # Marca a entrada como usada agora
+        os.utime(os.path.join(path, META_FILE))
+        self.hits += 1
+        return arrays, meta["values"]
+
+    # Grava uma entrada (arrays: dicionário nome -> array; values: dicionário de valores serializáveis em JSON)
+    def put(self, key, arrays, values):
+        path = os.path.join(self.directory, key)
+        if os.path.exists(path):
+            return
+
+        # Escreve em um diretório temporário e renomeia, para que leitores nunca vejam uma entrada incompleta
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(array))
+            with open(os.path.join(tmp, META_FILE), "w") as f:
+                json.dump({"arrays": sorted(arrays), "values": values}, f)
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(path):
+                raise
+            return
+
+        self.evict()
+
+    # Remove as entradas usadas há mais tempo até o cache caber em maxBytes
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                used = os.path.getmtime(os.path.join(path, META_FILE))
+            except OSError:
+                continue
+            entries.append((used, size, path))
+            total += size
+
+        for used, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    # Texto com as contagens de acesso ao cache
+    def report(self):
+        return f"cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions ({self.directory})"
+
+# ------------------------------------------------------------------------------------
+# Stage Cache ------------------------------------------------------------------------
+
+# Função que estima a memória ocupada por um valor guardado no cache de etapas: arrays, inclusive dentro de
+# tuplas, listas, dicionários e objetos (um nível de atributos, ex.: PreparedSource e o SampleIndex dentro dele)
+def valueBytes(value, depth=2):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if depth == 0:
+        return 0
+    if isinstance(value, (tuple, list)):
+        return sum(valueBytes(item, depth) for item in value)
+    if isinstance(value, dict):
+        return sum(valueBytes(item, depth) for item in value.values())
+    if hasattr(value, "__dict__"):
+        return sum(valueBytes(item, depth - 1) for item in vars(value).values())
+    return 0
+
+# Cache em memória das saídas de cada etapa do processo de transferência de cores (conversão para Lab, Luminance
+# Remapping, mapas de desvio padrão, jitter sampling, matching, síntese de textura), para que mudar uma configuração
+# refaça apenas as etapas que dependem dela.
+# Como funciona:
+# - A chave de cada etapa é o hash do nome da etapa, das chaves das etapas de que ela depende (ou do conteúdo das
+#   imagens, fingerprint) e dos parâmetros que ela usa; assim, mudar um parâmetro muda a chave dessa etapa e de
+#   todas as seguintes, e só elas são refeitas.
+# - run(etapa, chave, compute) devolve a saída guardada ou chama compute e guarda a saída. As saídas são
+#   compartilhadas entre execuções e não devem ser alteradas por quem as recebe.
+# - Ao passar de maxBytes, as saídas usadas há mais tempo são descartadas (LRU).
+# - begin() começa o registro de uma execução; summary() diz, para cada etapa, quantas vezes a saída veio do cache
+#   e quantas foi calculada.
+# Sem semente, o sorteio do jitter sampling também é guardado: ele é refeito apenas quando as entradas da etapa mudam.
+class StageCache:
+
+    enabled = True
+
+    def __init__(self, maxBytes=DEFAULT_STAGE_BYTES):
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()  # chave -> (saída, bytes)
+        self.bytes = 0
+        self.log = {}
+
+    # Identificação do conteúdo de uma imagem de entrada
+    def fingerprint(self, img):
+        return imageHash(img)
+
+    # Chave de uma etapa a partir das suas entradas (chaves de outras etapas e parâmetros).
+    # Uma entrada None (etapa sem chave) deixa a etapa sem chave: ela é sempre calculada.
+    def key(self, stage, *inputs):
+        if any(value is None for value in inputs):
+            return None
+        return hashlib.blake2b(repr((stage,) + inputs).encode(), digest_size=20).hexdigest()
+
+    # Começa o registro das etapas de uma execução
+    def begin(self):
+        self.log = {}
+
+    # Saída guardada de uma etapa, ou None
+    def get(self, stage, key):
+        if key is None or key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        self.note(stage, "cached")
+        return self.entries[key][0]
+
+    # Guarda a saída de uma etapa calculada
+    def put(self, stage, key, value):
+        self.note(stage, "computed")
+        if key is None:
+            return
+        size = valueBytes(value)
+        if size > self.maxBytes:
+            return
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.maxBytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+
+    # Saída da etapa: a guardada, ou a calculada por compute()
+    def run(self, stage, key, compute):
+        if key is not None and key in self.entries:
+            return self.get(stage, key)
+        value = compute()
+        self.put(stage, key, value)
+        return value
+
+    # Registra se a saída de uma etapa veio do cache ou foi calculada
+    def note(self, stage, source):
+        counts = self.log.setdefault(stage, {"cached": 0, "computed": 0})
+        counts[source] += 1
+
+    # Resumo da execução atual: etapa -> "cached", "computed" ou "N cached, M computed"
+    def summary(self):
+        summary = {}
+        for stage, counts in self.log.items():
+            if counts["computed"] == 0:
+                summary[stage] = "cached" if counts["cached"] == 1 else f"{counts['cached']} cached"
+            elif counts["cached"] == 0:
+                summary[stage] = "computed" if counts["computed"] == 1 else f"{counts['computed']} computed"
+            else:
+                summary[stage] = f"{counts['cached']} cached, {counts['computed']} computed"
+        return summary
+
+    # Texto com o resumo da execução atual
+    def report(self):
+        return "stages: " + ", ".join(f"{stage} {state}" for stage, state in self.summary().items())
+
+# Cache de etapas desligado: nenhuma chave é calculada (nem o hash das imagens) e toda etapa é calculada.
+# É o padrão dos processos de transferência de cores.
+class NullStageCache:
+
+    enabled = False
+
+    def fingerprint(self, img):
+        return None
+
+    def key(self, stage, *inputs):
+        return None
+
+    def begin(self):
+        pass
+
+    def get(self, stage, key):
+        return None
+
+    def put(self, stage, key, value):
+        pass
+
+    def run(self, stage, key, compute):
+        return compute()
+
+    def summary(self):
+        return {}
+
+NULL_STAGE_CACHE = NullStageCache()
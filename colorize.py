@@ -0,0 +1,296 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+
+from batch import colorizeBatch
+from sequence import SequenceTransfer, FrameWriter, readFrames, framesPerSecond
+from tiled import TiledTransfer, TILE_SIZE, openTarget
+from cache import SourceCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_BYTES
+from sampling import SAMPLERS
+from transfer import TransferParams, GlobalTransfer, SwatchTransfer, checkParams, checkSwatchPairs, readSource, readTarget, writeResult
+from instrument import Instrumentation
+from service import serve, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_QUEUE_SIZE, WORKER_STAGE_BYTES
+from writer import WriteOptions, checkOptions, DEFAULT_PNG_COMPRESSION, DEFAULT_JPEG_QUALITY
+
+# ------------------------------------------------------------------------------------
+# Command Line -----------------------------------------------------------------------
+#
+# Uso (sem janelas, pode rodar em máquinas sem display):
+#   python colorize.py global SOURCE TARGET -o RESULT [--kernel-size 5] [--jitter 15 15] [--sampler stratified] [--seed 0] [--lut] [--preview 0.25] [--cache [DIR]] [--stats STATS.json]
+#   python colorize.py swatches SOURCE TARGET -o RESULT --swatch 10,10,60,60:20,30,70,80 [--swatch ...] [--window-size 5] [--ann] [--workers 8]
+#   python colorize.py batch SOURCE TARGET_OR_DIR [...] -o OUTPUT_DIR [--workers 8] [--format .png]
+#   python colorize.py tiled SOURCE TARGET -o RESULT [--tile 1024]   (TARGET/RESULT podem ser .npy, lidos/escritos com mmap)
+#   Gravação (global, swatches, batch e tiled): [--png-compression 3] [--jpeg-quality 95] [--depth 16] [--lab]
+#   python colorize.py serve [--host 127.0.0.1] [--port 8350] [--workers 4] [--queue 32]   (serviço HTTP, ver service.py)
+#   python colorize.py sequence SOURCE FRAMES_DIR_OR_VIDEO -o VIDEO_OR_DIR [--threshold 2] [--fps 24]
+#
+# Cada --swatch é um par de retângulos x1,y1,x2,y2 (source) : x1,y1,x2,y2 (target), em pixels.
+
+# Função que converte um par de retângulos "x1,y1,x2,y2:x1,y1,x2,y2" em uma tupla de tuplas
+def parseSwatchPair(text):
+    try:
+        sourceRect, targetRect = (tuple(int(v) for v in rect.split(",")) for rect in text.split(":"))
+        if len(sourceRect) != 4 or len(targetRect) != 4:
+            raise ValueError
+        if any(rect[0] >= rect[2] or rect[1] >= rect[3] for rect in (sourceRect, targetRect)):
+            raise argparse.ArgumentTypeError(f"invalid swatch pair '{text}', each rectangle must have x1 < x2 and y1 < y2")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid swatch pair '{text}', expected x1,y1,x2,y2:x1,y1,x2,y2")
+    return sourceRect, targetRect
+
+# Função que converte a semente do jitter sampling (inteiro não negativo)
+def parseSeed(text):
+    try:
+        seed = int(text)
+        if seed < 0:
+            raise ValueError
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid seed '{text}', expected a non-negative integer")
+    return seed
+
+# Função que adiciona os parâmetros comuns aos dois modos
+def addTransferArguments(parser, jitterSamples):
+    parser.add_argument("--kernel-size", type=int, default=5, help="neighbourhood size of the std filter")
+    parser.add_argument("--jitter", type=int, nargs=2, metavar=("M", "N"), default=(jitterSamples, jitterSamples), help="jitter sampling grid")
+    parser.add_argument("--sampler", choices=SAMPLERS, default="jitter", help="source sampler: spatial MxN grid (jitter) or M*N samples spread over (luminance, std) (stratified)")
+    parser.add_argument("--seed", type=parseSeed, default=None, help="seed of the jitter sampling")
+
+# Função que adiciona as imagens de entrada e saída de uma única transferência
+def addImageArguments(parser):
+    parser.add_argument("source", help="source image (colorful)")
+    parser.add_argument("target", help="target image (converted to grayscale)")
+    parser.add_argument("-o", "--output", required=True, help="result image; format is taken from the extension")
+
+# Função que adiciona os parâmetros do cache em disco
+def addCacheArguments(parser):
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, default=None, metavar="DIR", help="cache the source precomputation on disk (requires --seed)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_BYTES >> 20, metavar="MB", help="maximum size of the cache")
+
+# Função que cria o cache em disco pedido na linha de comando
+def cacheFromArgs(args):
+    if args.cache is None:
+        return None
+    if args.seed is None:
+        print("warning: --cache has no effect without --seed", file=sys.stderr)
+    return SourceCache(args.cache, args.cache_size << 20)
+
+# Função que adiciona as opções de gravação do resultado
+def addWriteArguments(parser):
+    parser.add_argument("--png-compression", type=int, choices=range(10), default=DEFAULT_PNG_COMPRESSION, metavar="0-9", help="PNG compression level; lower is faster")
+    parser.add_argument("--jpeg-quality", type=int, choices=range(101), default=DEFAULT_JPEG_QUALITY, metavar="0-100", help="JPEG quality")
+    parser.add_argument("--depth", type=int, choices=(8, 16), default=8, help="bits per channel of the result (16: PNG, TIFF or .npy)")
+    parser.add_argument("--lab", action="store_true", help="write the result as float32 Lab instead of RGB (TIFF or .npy)")
+
+# Função que converte os argumentos da linha de comando nas opções de gravação
+def writeOptionsFromArgs(args):
+    return WriteOptions(png_compression=args.png_compression, jpeg_quality=args.jpeg_quality, depth=args.depth, lab=args.lab)
+
+# Função que adiciona os parâmetros do modo de tabela de lookup
+def addLutArguments(parser):
+    parser.add_argument("--lut", action="store_true", help="colorize through a (L, std) lookup table")
+    parser.add_argument("--lut-std-step", type=float, default=0.5, help="std quantization step of the lookup table")
+    parser.add_argument("--lut-all-pixels", action="store_true", help="build the lookup table from every source pixel")
+
+# Função que adiciona os parâmetros do modo rápido (matching em resolução reduzida)
+def addPreviewArguments(parser):
+    parser.add_argument("--preview", type=float, default=1.0, metavar="SCALE", help="match on the target reduced by SCALE (e.g. 0.25) and upsample the colors guided by luminance")
+    parser.add_argument("--guide-radius", type=int, default=2, help="radius of the guided upsampling filter (reduced resolution pixels)")
+    parser.add_argument("--guide-eps", type=float, default=1e-3, help="regularization of the guided upsampling filter; higher is smoother")
+
+# Função que adiciona os parâmetros do resumo da execução (etapas, contadores e memória)
+def addStatsArguments(parser):
+    parser.add_argument("--stats", default=None, metavar="JSON", help="write per-stage timings and counters of the run to this file")
+    parser.add_argument("--track-memory", action="store_true", help="also track the peak memory of each stage (slower; with --stats)")
+
+# Função que monta o parser da linha de comando
+def buildParser():
+    parser = argparse.ArgumentParser(description="Transfer color to greyscale images without the Tk interface.")
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    globalParser = modes.add_parser("global", help="global color transfer")
+    addImageArguments(globalParser)
+    addTransferArguments(globalParser, TransferParams().jitter_m)
+    addLutArguments(globalParser)
+    addPreviewArguments(globalParser)
+    addCacheArguments(globalParser)
+    addWriteArguments(globalParser)
+    addStatsArguments(globalParser)
+
+    swatchParser = modes.add_parser("swatches", help="color transfer with swatches")
+    addImageArguments(swatchParser)
+    addTransferArguments(swatchParser, SwatchTransfer().params.jitter_m)
+    swatchParser.add_argument("--swatch", type=parseSwatchPair, action="append", required=True, help="swatch pair x1,y1,x2,y2:x1,y1,x2,y2")
+    swatchParser.add_argument("--window-size", type=int, default=5, help="neighbourhood window of the texture synthesis")
+    swatchParser.add_argument("--ann", action="store_true", help="approximate patch search in the texture synthesis (large swatches)")
+    swatchParser.add_argument("--ann-components", type=int, default=6, help="PCA dimensions of the approximate patch search")
+    swatchParser.add_argument("--ann-candidates", type=int, default=8, help="candidates re-ranked exactly; higher is more accurate and slower")
+    swatchParser.add_argument("--workers", type=int, default=None, help="workers colorizing the swatch pairs (default: all cores)")
+    swatchParser.add_argument("--executor", choices=("thread", "process"), default="thread", help="worker pool of the swatch pairs")
+    addWriteArguments(swatchParser)
+    addStatsArguments(swatchParser)
+
+    batchParser = modes.add_parser("batch", help="global color transfer of many targets with one source")
+    batchParser.add_argument("source", help="source image (colorful)")
+    batchParser.add_argument("targets", nargs="+", help="target images or directories of target images")
+    batchParser.add_argument("-o", "--output", required=True, help="output directory")
+    batchParser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    batchParser.add_argument("--format", default=".png", help="extension of the result images")
+    addTransferArguments(batchParser, TransferParams().jitter_m)
+    addLutArguments(batchParser)
+    addPreviewArguments(batchParser)
+    addCacheArguments(batchParser)
+    addWriteArguments(batchParser)
+
+    tiledParser = modes.add_parser("tiled", help="global color transfer of very large targets, tile by tile")
+    addImageArguments(tiledParser)
+    tiledParser.add_argument("--tile", type=int, default=TILE_SIZE, help="tile side in pixels")
+    addTransferArguments(tiledParser, TransferParams().jitter_m)
+    addLutArguments(tiledParser)
+    addCacheArguments(tiledParser)
+    addWriteArguments(tiledParser)
+
+    sequenceParser = modes.add_parser("sequence", help="global color transfer of a frame sequence or video")
+    sequenceParser.add_argument("source", help="source image (colorful)")
+    sequenceParser.add_argument("frames", help="directory of frames or video file")
+    sequenceParser.add_argument("-o", "--output", required=True, help="output video file, or directory of frames when it has no extension")
+    sequenceParser.add_argument("--fps", type=float, default=None, help="frame rate of the output video (default: input frame rate)")
+    sequenceParser.add_argument("--threshold", type=float, default=0, help="grey levels a pixel must change to be matched again")
+    sequenceParser.add_argument("--no-reuse", action="store_true", help="match every pixel of every frame")
+    sequenceParser.add_argument("--unlock-remap", action="store_true", help="recompute the luminance remapping on every frame (disables reuse)")
+    addTransferArguments(sequenceParser, TransferParams().jitter_m)
+    addCacheArguments(sequenceParser)
+
+    serveParser = modes.add_parser("serve", help="local HTTP colorization service (see service.py)")
+    serveParser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    serveParser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    serveParser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    serveParser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE, help="pending requests accepted before answering 503")
+    serveParser.add_argument("--stage-cache", type=int, default=WORKER_STAGE_BYTES >> 20, metavar="MB", help="stage cache size of each worker")
+    serveParser.add_argument("--verbose", action="store_true", help="log every request")
+
+    return parser
+
+# Função que converte os argumentos da linha de comando nos parâmetros do processo
+def paramsFromArgs(args):
+    return TransferParams(
+        kernel_size=args.kernel_size,
+        jitter_m=args.jitter[0],
+        jitter_n=args.jitter[1],
+        sampler=args.sampler,
+        window_size=getattr(args, "window_size", 5),
+        lut=getattr(args, "lut", False),
+        lut_std_step=getattr(args, "lut_std_step", 0.5),
+        lut_all_pixels=getattr(args, "lut_all_pixels", False),
+        preview_scale=getattr(args, "preview", 1.0),
+        guide_radius=getattr(args, "guide_radius", 2),
+        guide_eps=getattr(args, "guide_eps", 1e-3),
+        ann=getattr(args, "ann", False),
+        ann_components=getattr(args, "ann_components", 6),
+        ann_candidates=getattr(args, "ann_candidates", 8),
+        workers=(args.workers or os.cpu_count() or 1) if args.mode == "swatches" else 1,
+        executor=getattr(args, "executor", "thread"),
+        seed=args.seed,
+    )
+
+# Ponto de entrada da linha de comando
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    if args.mode == "serve":
+        serve(args.host, args.port, args.workers, args.queue, args.stage_cache << 20, args.verbose)
+        return 0
+    params = paramsFromArgs(args)
+    try:
+        checkParams(params)
+    except ValueError as e:
+        print(f"Invalid parameters: {e}", file=sys.stderr)
+        return 1
+
+    cache = cacheFromArgs(args) if args.mode != "swatches" else None
+
+    # Verifica as opções de gravação antes de processar (ex.: 16 bits só em PNG, TIFF ou .npy)
+    if args.mode != "sequence":
+        try:
+            checkOptions(args.output if args.mode != "batch" else "result" + args.format, writeOptionsFromArgs(args))
+        except ValueError as e:
+            print(f"Invalid output: {e}", file=sys.stderr)
+            return 1
+
+    if args.mode == "batch":
+        try:
+            summary = colorizeBatch(args.source, args.targets, args.output, params, args.workers, args.format, cache, writeOptionsFromArgs(args))
+        except FileNotFoundError as e:
+            print(f"Unfound file: {e}", file=sys.stderr)
+            return 1
+        print(summary.report())
+        if cache is not None:
+            print(cache.report())
+        return 0 if not summary.failed else 2
+
+    if args.mode == "sequence":
+        try:
+            source = readSource(args.source)
+            fps = args.fps if args.fps is not None else framesPerSecond(args.frames)
+            transfer = SequenceTransfer(params, lockRemap=not args.unlock_remap, reuseMatches=not args.no_reuse, threshold=args.threshold, cache=cache)
+            with FrameWriter(args.output, fps) as writer:
+                transfer.run(source, readFrames(args.frames), writer,
+                             progress=lambda frames, seconds: print(f"\r{frames} frames, {frames / seconds:.2f} fps", end="", file=sys.stderr))
+        except FileNotFoundError as e:
+            print(f"Unfound file: {e}", file=sys.stderr)
+            return 1
+        print(file=sys.stderr)
+        for key, value in transfer.stats.items():
+            print(f"{key}: {value}")
+        return 0
+
+    try:
+        source = readSource(args.source)
+        target = openTarget(args.target) if args.mode == "tiled" else readTarget(args.target)
+    except FileNotFoundError as e:
+        print(f"Unfound file: {e}", file=sys.stderr)
+        return 1
+
+    # Verifica se os swatches estão dentro das imagens
+    if args.mode == "swatches":
+        try:
+            checkSwatchPairs(args.swatch, source.shape, target.shape)
+        except ValueError as e:
+            print(f"Invalid swatch: {e}", file=sys.stderr)
+            return 1
+
+    if args.mode == "tiled":
+        transfer = TiledTransfer(params, args.tile, cache)
+        transfer.run(source, target, args.output, writeOptionsFromArgs(args))
+        for key, value in transfer.stats.items():
+            print(f"{key}: {value}")
+        if cache is not None:
+            print(cache.report())
+        return 0
+
+    instrument = Instrumentation(memory=args.track_memory) if args.stats is not None else None
+    try:
+        if args.mode == "global":
+            transfer = GlobalTransfer(params, cache, instrument)
+            result = transfer.run(source, target)
+        else:
+            transfer = SwatchTransfer(params, instrument)
+            result = transfer.run(source, target, args.swatch)
+    finally:
+        if instrument is not None:
+            instrument.close()
+
+    writeResult(args.output, result, writeOptionsFromArgs(args))
+    if instrument is not None:
+        instrument.dump(args.stats, stats=transfer.stats)
+
+    # Mostra as informações da execução (ex.: desvio da tabela de lookup)
+    for key, value in transfer.stats.items():
+        print(f"{key}: {value}")
+    if cache is not None:
+        print(cache.report())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,19 @@
 # Bibliotecas ------------------------------------------------------------------------
 
 import numpy as np
-from scipy.ndimage import generic_filter
-import cv2
-import random
 
 import tkinter as tk
 from tkinter import *
 from tkinter import filedialog, messagebox
-from PIL import Image, ImageTk
+
+from transfer import TransferParams, GlobalTransfer
+from cache import SourceCache, StageCache
+from background import runInBackground, whenDone
+from loader import ImageLoader
+from instrument import Instrumentation
+from statsview import showStats
+from viewport import Viewport
+from writer import AsyncWriter, WriteOptions, checkOptions
 
 # ------------------------------------------------------------------------------------
 # Constantes -------------------------------------------------------------------------
@@ -18,6 +23,19 @@ NEIGHBOURHOOD_KERNEL_SIZE = 5 # Tamanho da vizinhança em que se pré-computa o
 JITTER_SAMPLES = 200
 JITTER_SAMPLES_M = int(np.ceil(np.sqrt(JITTER_SAMPLES)))
 JITTER_SAMPLES_N = JITTER_SAMPLES_M
+STRATIFIED_SAMPLING = 0 # Distribui as M*N amostras da source no espaço (luminância, desvio padrão) em vez da grade espacial MxN
+LUT_MODE = 0 # Colore a imagem com uma tabela de lookup (L, desvio padrão quantizado) -> (a, b) em vez de fazer o matching pixel a pixel
+LUT_STD_STEP = 0.5 # Passo de quantização do desvio padrão na tabela de lookup
+LUT_ALL_PIXELS = 0 # Monta a tabela de lookup com todos os pixels da imagem source em vez das amostras do jitter sampling
+PREVIEW_SCALE = 1.0 # Modo rápido: com valor menor que 1 o matching é feito na target reduzida por esse fator e as cores são ampliadas guiadas pela luminância
+TRACK_MEMORY = 0 # Mede o pico de memória de cada etapa (tracemalloc) no resumo do menu Stats; deixa a transferência mais lenta
+SEED = None # Semente do jitter sampling (None sorteia novas amostras a cada execução; com semente a pré-computação da source fica em cache no disco)
+
+# Opções de gravação do resultado (menu File > Save); o formato é dado pela extensão do arquivo
+PNG_COMPRESSION = 3 # Nível de compressão dos arquivos PNG (0 a 9; menor é mais rápido)
+JPEG_QUALITY = 95 # Qualidade dos arquivos JPEG (0 a 100)
+SAVE_16_BIT = 0 # Grava 16 bits por canal (PNG, TIFF ou .npy)
+SAVE_LAB = 0 # Grava o resultado em Lab float32 (TIFF ou .npy)
 
 # ------------------------------------------------------------------------------------
 # Definição das imagens envolvidas no processo de transferência de cores
@@ -25,89 +43,31 @@ source = None
 target = None
 result = None
 
-# ------------------------------------------------------------------------------------
-# Set Default Image ------------------------------------------------------------------
+# Cache em disco da pré-computação da imagem source
+source_cache = SourceCache()
 
-# Função que coloca a imagem default no display informado
-def setDefaultImg(display):
-    default = ImageTk.PhotoImage(file="img/default.jpg")
-    display.config(image=default)
-    display.image = default
-
-# ------------------------------------------------------------------------------------
-# Luminance Remapping ----------------------------------------------------------------
+# Cache em memória das etapas da transferência de cores: ao mudar uma configuração, só as etapas que dependem dela são refeitas
+stage_cache = StageCache()
 
-# Função que realiza o Luminance Remapping sobre a imagem A
-def lumRemap(lumA, lumB):
-   
-   # Pega a média das luminâncias de ambas imagens
-   meanA = np.mean(lumA)
-   meanB = np.mean(lumB)
+# Cache das imagens decodificadas: reabrir uma imagem usada há pouco não lê o arquivo de novo.
+# Os arrays são somente leitura e compartilhados entre a tela e o processo de transferência de cores.
+image_loader = ImageLoader()
 
-   # Pega o desvio padrão das luminâncias de ambas imagens
-   stdA = np.std(lumA)
-   stdB = np.std(lumB)
+# Transferência de cores em andamento (background.BackgroundTask)
+running_task = None
 
-   # Evita divisão por zero
-   if stdA == 0:
-      stdA = 1
-   stdB_A = stdB/stdA
+# Gravação do resultado em segundo plano: a interface continua respondendo enquanto a imagem é codificada
+result_writer = AsyncWriter()
 
-   # Remapeia os valores da imagem A e retorna
-   return stdB_A * (lumA - meanA) + meanB
+# Resumo da última transferência de cores (etapas, contadores e informações do processo), mostrado no menu Stats
+last_report = None
 
 # ------------------------------------------------------------------------------------
-# Jitter Sampling --------------------------------------------------------------------
-
-# Função para amostragem jitterizada e armazenamento de coordenadas
-# Como funciona:
-# - A imagem é dividida em uma grade de MxN blocos.
-# - Para cada bloco, um ponto é selecionado aleatoriamente dentro de seus limites. Isso é feito para evitar padrões fixos.
-# Retorno: três arrays
-# 1) Coordenadas de cada amostra na imagem original
-# 2) Valor da luminância de cada amostra
-# 3) Desvio padrão relativo a cada amostra (usa os valores pré-calculados e recebidos como argumento na função)
-def jitterSampling(img, M, N, imgStd):
-
-    # Cria vetores que armazenam coordenadas, valores de luminância e desvio padrão, respectivamente
-    coord = []
-    lum = []
-    std = []
-
-    # Calcula o tamanho dos passos a partir do tamanho dos MxN blocos indicados
-    stepX = img.shape[0] // M  # Tamanho do passo em linhas
-    stepY = img.shape[1] // N  # Tamanho do passo em colunas
-
-    # Pega MxN amostras
-    for i in range(M):
-        for j in range(N):
-
-            # Coordenada x aleatória
-            x = random.randint(i * stepX, min((i + 1) * stepX - 1, img.shape[0] - 1))
-
-            # Coordenada y aleatória
-            y = random.randint(j * stepY, min((j + 1) * stepY - 1, img.shape[1] - 1))
-
-            # Guarda as coordenadas, valores de luminância e desvio padrão
-            coord.append((x, y))
-            lum.append(img[x, y])
-            std.append(imgStd[x, y])
-
-    # Retorna os vetores
-    return np.array(coord), np.array(lum), np.array(std)
-
-# ------------------------------------------------------------------------------------
-# Best Matching Color ----------------------------------------------------------------
-
-# Função que encontra a melhor cor de match da imagem source a ser usada na imagem target com base em luminância (50%) e desvio padrão (50%)
-def bestMatch(target, targetStd, source, sourceCoord, sourceStd):
-
-    # Calcula uma "distância" para cada amostra, que é a soma das diferenças quadráticas entre as luminância e entre os desvios padrões.
-    # Os pesos (50% cada) estão implícitos na fórmula, tratando igualmente as diferenças quadradas para luminância e desvio padrão.
-    distances = (source - target)**2 + (sourceStd - targetStd)**2  # Distância ponderada
+# Set Default Image ------------------------------------------------------------------
 
-    # Retorna as coordenadas da melhor correspondência (menor distância)
-    return sourceCoord[np.argmin(distances)]
+# Função que coloca a imagem default no display informado
+def setDefaultImg(display):
+    display.show(image_loader.load("img/default.jpg"))
 
 # ------------------------------------------------------------------------------------
 # Show Result Image ------------------------------------------------------------------
@@ -117,94 +77,72 @@ def showResult(result, display):
 
     global NEIGHBOURHOOD_KERNEL_SIZE, JITTER_SAMPLES, JITTER_SAMPLES_M, JITTER_SAMPLES_N
 
-    # Configura a imagem e o display indicado para mostra-la na tela.
-    result = Image.fromarray(result)
-    result = ImageTk.PhotoImage(result)
-    display.config(image = result)
-    display.image = result
+    # Mostra a imagem no display indicado (prévia do tamanho da tela, com zoom e pan)
+    display.show(result)
     
 
 # ------------------------------------------------------------------------------------
 # Transferring Color to Greyscale Images ---------------------------------------------
 
-# Algoritmo do processo de transferência de cores
+# Parâmetros do processo de transferência de cores a partir das configurações atuais
+def currentParams():
+   return TransferParams(
+      kernel_size=NEIGHBOURHOOD_KERNEL_SIZE,
+      jitter_m=JITTER_SAMPLES_M,
+      jitter_n=JITTER_SAMPLES_N,
+      sampler="stratified" if STRATIFIED_SAMPLING else "jitter",
+      lut=bool(LUT_MODE),
+      lut_std_step=LUT_STD_STEP,
+      lut_all_pixels=bool(LUT_ALL_PIXELS),
+      preview_scale=PREVIEW_SCALE,
+      seed=SEED,
+   )
+
+# Algoritmo do processo de transferência de cores.
+# A transferência roda em segundo plano (background.runInBackground), com janela de progresso e opção de cancelar;
+# a interface continua respondendo e só é atualizada quando o resultado fica pronto (showTransferResult).
 def colorTransfer(display):
-   global source, target, result
-   
-   # Verifica se as imagens foram selecionadas
-   if source is not None and target is not None:
-      
-      # Converte a imagem source para o espaço de cores Lab
-      sourceLab = cv2.cvtColor(source, cv2.COLOR_RGB2Lab)
-      
-      # Converte para tipo float64 para maior precisão
-      sourceLab = sourceLab.astype(np.float64)
-      targetLum = target.astype(np.float64)
-      
-      # Pega a luminância da imagem source
-      sourceLum = sourceLab[:,:,0]
-      
-      # Realiza o Luminance Remapping sobre a imagem source
-      sourceRemap = lumRemap(sourceLum, targetLum)
-      
-      # Caso haja valores negativos na nova luminância, ajusta os valores para serem inteiros não negativos
-    #   sourceRemapMin = np.amin(sourceRemap)
-    #   if sourceRemapMin < 0:
-    #      sourceRemap = sourceRemap - sourceRemapMin
-    #      sourceRemapMax = np.amax(sourceRemap)
-    #      if sourceRemapMax == 0:
-    #          sourceRemapMax = 1
-    #      sourceRemap = sourceRemap * 255 / sourceRemapMax
-
-      # Pré-computa o desvio padrão dos valores de luminância de vizinhanças 5x5 em cada imagem.
-      sourceStd = generic_filter(sourceRemap, np.std, size = NEIGHBOURHOOD_KERNEL_SIZE)
-      targetStd = generic_filter(target, np.std, size = NEIGHBOURHOOD_KERNEL_SIZE)
-
-      # Realiza Jitter Sampling para diminuir o número de amostras necessárias da imagem source
-      sourceSamplesCoord, sourceSamplesLum, sourceSamplesStd = jitterSampling(sourceRemap, JITTER_SAMPLES_M, JITTER_SAMPLES_N, sourceStd)
-
-      # Configura variável que guarda o resultado do processo
-      result = np.zeros((targetLum.shape[0], targetLum.shape[1], 3))  # Inicializa o array do resultado
-      result[:, :, 0] = targetLum  # Copia o canal de luminância da imagem target
-
-      # Loop para colorir cada pixel da imagem
-      for i in range(result.shape[0]):
-        for j in range(result.shape[1]):
-           
-           # Encontra a melhor cor de match para o pixel, onde a cor é dada pelos índices dos canais alfa e beta da imagem source
-           [a, b] = bestMatch(result[i][j][0], targetStd[i][j], sourceSamplesLum, sourceSamplesCoord, sourceSamplesStd)
-
-           # Pega os valores dos canais alfa e beta do pixel da imagem original
-           alpha_channel = sourceLab[a][b][1]  # Canal alpha
-           beta_channel = sourceLab[a][b][2]  # Canal beta
+   global source, target, running_task
 
-           # Salva os valores dos canais alfa e beta na imagem resultante
-           result[i][j][1] = alpha_channel
-           result[i][j][2] = beta_channel
+   # Não permite iniciar uma nova transferência enquanto outra está em andamento
+   if running_task is not None and running_task.running():
+      messagebox.showinfo("Process", "A color transfer process is already running.")
+      return
 
-      # Configura imagem do resultado
-      result = result.astype('uint8')  # Converte o resultado para tipo uint8
-      result = cv2.cvtColor(result, cv2.COLOR_LAB2RGB)  # Converte para RGB
+   # Verifica se as imagens foram selecionadas
+   if source is not None and target is not None:
 
-      L, a, b = cv2.split(result)
+      # Parâmetros e imagens desta execução (alterações posteriores nas configurações não afetam a transferência em andamento)
+      params = currentParams()
+      source_img, target_img = source, target
+      track_memory = bool(TRACK_MEMORY)
 
-      # Criar uma máscara onde os canais cromáticos (a, b) são iguais a 0
-      mascara_cromatica_zerada = (b == 0)
+      # Realiza a transferência de cores global (transfer.GlobalTransfer) fora da thread da interface, medindo cada etapa
+      def work(progress):
+         instrument = Instrumentation(memory=track_memory)
+         try:
+            transfer = GlobalTransfer(params, source_cache, instrument=instrument, progress=progress, stages=stage_cache)
+            return transfer.run(source_img, target_img), transfer, instrument
+         finally:
+            instrument.close()
 
-      # Contar os pixels com os canais cromáticos zerados
-      pixels_com_cromatica_zerada = np.sum(mascara_cromatica_zerada)
+      running_task = runInBackground(result_window, work, lambda done: showTransferResult(done, display))
 
-      # Exibir o resultado
-      print(f"Há {pixels_com_cromatica_zerada} pixels com os canais cromáticos (a e b) zerados.")
+   else:
+      messagebox.showerror("Unfound file", "You must select source and target images.")
 
-      # Mostra imagem de resultado na tela
-      showResult(result, display)
+# Função que mostra o resultado de uma transferência concluída (chamada na thread da interface)
+def showTransferResult(done, display):
+   global result, last_report
+   result, transfer, instrument = done
+   # Etapas, cache de etapas, cache em disco e desvio da tabela de lookup ficam no relatório (janela Stats)
+   last_report = dict(instrument.report(), stats=transfer.stats)
 
-      # Avisa que o processo terminou
-      messagebox.showinfo("Process", "The color transfer process was successful!")
+   # Mostra imagem de resultado na tela
+   showResult(result, display)
 
-   else:
-      messagebox.showerror("Unfound file", "You must select source and target images.")
+   # Avisa que o processo terminou
+   messagebox.showinfo("Process", "The color transfer process was successful!")
       
 # ------------------------------------------------------------------------------------
 # Root Window Destruction ------------------------------------------------------------
@@ -224,26 +162,19 @@ def OpenFile(display, grayscale):
     file = filedialog.askopenfilename(initialdir= "", filetypes= [("Image file", (".png", ".jpg"))])
     # Verifica se o arquivo foi selecionado corretamente
     if file:
-        # Lê o arquivo
-        img = cv2.imread(file)
+        # Lê o arquivo (ou pega a imagem do cache): a imagem target em tons de cinza, a source em RGB
+        img = image_loader.load(file, grayscale=grayscale)
         if grayscale:
-            # Caso for a imagem target, a mesma deve estar em tons de cinza
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
             # Salva a imagem target na variável
             global target
             target = img
         else:
-            # Caso contrário, é source, e a convertemos para o espaço de cores RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
             # Salva a imagem source na variável
             global source
             source = img
         
-        # Configura a imagem e o display indicado para mostra-la na tela.
-        img = Image.fromarray(img)
-        img = ImageTk.PhotoImage(img)
-        display.config(image=img)
-        display.image = img
+        # Mostra a imagem no display indicado (prévia do tamanho da tela, com zoom e pan)
+        display.show(img)
         return file
 
   except FileNotFoundError:
@@ -263,12 +194,36 @@ def openSettings():
 
     def saveSettings():
         try:
-            global NEIGHBOURHOOD_KERNEL_SIZE, JITTER_SAMPLES, JITTER_SAMPLES_M, JITTER_SAMPLES_N
+            global NEIGHBOURHOOD_KERNEL_SIZE, JITTER_SAMPLES, JITTER_SAMPLES_M, JITTER_SAMPLES_N, LUT_MODE, LUT_STD_STEP, LUT_ALL_PIXELS, PREVIEW_SCALE, TRACK_MEMORY, SEED, STRATIFIED_SAMPLING, PNG_COMPRESSION, JPEG_QUALITY, SAVE_16_BIT, SAVE_LAB
             # Obtém os novos valores das entradas e atualiza as constantes
             NEIGHBOURHOOD_KERNEL_SIZE = int(kernel_size_entry.get())
             # JITTER_SAMPLES = int(jitter_samples_entry.get())
             JITTER_SAMPLES_M = int(jitter_samples_m_entry.get())
             JITTER_SAMPLES_N = int(jitter_samples_n_entry.get())
+            STRATIFIED_SAMPLING = stratified_sampling_var.get()
+            lut_std_step = float(lut_std_step_entry.get())
+            if lut_std_step <= 0:
+                raise ValueError
+            LUT_STD_STEP = lut_std_step
+            LUT_MODE = lut_mode_var.get()
+            LUT_ALL_PIXELS = lut_all_pixels_var.get()
+            preview_scale = float(preview_scale_entry.get())
+            if not 0 < preview_scale <= 1:
+                raise ValueError
+            PREVIEW_SCALE = preview_scale
+            TRACK_MEMORY = track_memory_var.get()
+            seed = int(seed_entry.get()) if seed_entry.get().strip() else None
+            if seed is not None and seed < 0:
+                raise ValueError
+            SEED = seed
+            png_compression = int(png_compression_entry.get())
+            jpeg_quality = int(jpeg_quality_entry.get())
+            if not 0 <= png_compression <= 9 or not 0 <= jpeg_quality <= 100:
+                raise ValueError
+            PNG_COMPRESSION = png_compression
+            JPEG_QUALITY = jpeg_quality
+            SAVE_16_BIT = save_16_bit_var.get()
+            SAVE_LAB = save_lab_var.get()
 
             # Fecha a janela de configurações
             settings_window.destroy()
@@ -293,6 +248,9 @@ def openSettings():
     # jitter_samples_entry.insert(0, str(JITTER_SAMPLES))
     # jitter_samples_entry.grid(row=1, column=1, padx=10, pady=5)
 
+    stratified_sampling_var = tk.IntVar(value=STRATIFIED_SAMPLING)
+    tk.Checkbutton(settings_window, text="Stratified sampling (luminance, std)", variable=stratified_sampling_var).grid(row=1, column=0, columnspan=2, padx=10, pady=5)
+
     tk.Label(settings_window, text="Jitter M:").grid(row=2, column=0, padx=10, pady=5)
     jitter_samples_m_entry = tk.Entry(settings_window)
     jitter_samples_m_entry.insert(0, str(JITTER_SAMPLES_M))
@@ -303,33 +261,82 @@ def openSettings():
     jitter_samples_n_entry.insert(0, str(JITTER_SAMPLES_N))
     jitter_samples_n_entry.grid(row=3, column=1, padx=10, pady=5)
 
+    lut_mode_var = tk.IntVar(value=LUT_MODE)
+    tk.Checkbutton(settings_window, text="Lookup table mode", variable=lut_mode_var).grid(row=4, column=0, columnspan=2, padx=10, pady=5)
+
+    tk.Label(settings_window, text="LUT std step:").grid(row=5, column=0, padx=10, pady=5)
+    lut_std_step_entry = tk.Entry(settings_window)
+    lut_std_step_entry.insert(0, str(LUT_STD_STEP))
+    lut_std_step_entry.grid(row=5, column=1, padx=10, pady=5)
+
+    lut_all_pixels_var = tk.IntVar(value=LUT_ALL_PIXELS)
+    tk.Checkbutton(settings_window, text="LUT from all source pixels", variable=lut_all_pixels_var).grid(row=6, column=0, columnspan=2, padx=10, pady=5)
+
+    tk.Label(settings_window, text="Seed (empty = random):").grid(row=7, column=0, padx=10, pady=5)
+    seed_entry = tk.Entry(settings_window)
+    seed_entry.insert(0, "" if SEED is None else str(SEED))
+    seed_entry.grid(row=7, column=1, padx=10, pady=5)
+
+    tk.Label(settings_window, text="Preview scale (1 = full):").grid(row=8, column=0, padx=10, pady=5)
+    preview_scale_entry = tk.Entry(settings_window)
+    preview_scale_entry.insert(0, str(PREVIEW_SCALE))
+    preview_scale_entry.grid(row=8, column=1, padx=10, pady=5)
+
+    track_memory_var = tk.IntVar(value=TRACK_MEMORY)
+    tk.Checkbutton(settings_window, text="Track memory in Stats (slower)", variable=track_memory_var).grid(row=9, column=0, columnspan=2, padx=10, pady=5)
+
+    tk.Label(settings_window, text="PNG compression (0-9):").grid(row=10, column=0, padx=10, pady=5)
+    png_compression_entry = tk.Entry(settings_window)
+    png_compression_entry.insert(0, str(PNG_COMPRESSION))
+    png_compression_entry.grid(row=10, column=1, padx=10, pady=5)
+
+    tk.Label(settings_window, text="JPEG quality (0-100):").grid(row=11, column=0, padx=10, pady=5)
+    jpeg_quality_entry = tk.Entry(settings_window)
+    jpeg_quality_entry.insert(0, str(JPEG_QUALITY))
+    jpeg_quality_entry.grid(row=11, column=1, padx=10, pady=5)
+
+    save_16_bit_var = tk.IntVar(value=SAVE_16_BIT)
+    tk.Checkbutton(settings_window, text="Save 16 bits per channel (PNG, TIFF, NPY)", variable=save_16_bit_var).grid(row=12, column=0, columnspan=2, padx=10, pady=5)
+
+    save_lab_var = tk.IntVar(value=SAVE_LAB)
+    tk.Checkbutton(settings_window, text="Save as float Lab (TIFF, NPY)", variable=save_lab_var).grid(row=13, column=0, columnspan=2, padx=10, pady=5)
+
     # Botão para salvar as configurações
-    tk.Button(settings_window, text="Salvar", command=saveSettings).grid(row=4, column=0, columnspan=2, pady=10)
+    tk.Button(settings_window, text="Salvar", command=saveSettings).grid(row=14, column=0, columnspan=2, pady=10)
 
 # ------------------------------------------------------------------------------------
 # Save Image -------------------------------------------------------------------------
 
-# Função para salvar a imagem gerada
-def saveImage(display):
+# Função para salvar a imagem gerada.
+# O resultado é gravado a partir do array em resolução total, em segundo plano (writer.AsyncWriter), no formato dado
+# pela extensão escolhida e com as opções de gravação das configurações.
+def saveImage():
     global result
     if result is not None:
-        try:
-            # Pega a imagem atualmente exibida no display
-            image = display.image._PhotoImage__photo  # Acessa o objeto interno da imagem
-            if image:
-                # Abre a janela de diálogo para salvar o arquivo
-                file_path = filedialog.asksaveasfilename(defaultextension=".png",
-                                                        filetypes=[("PNG files", "*.png"),
-                                                                    ("JPEG files", "*.jpg"),
-                                                                    ("All files", "*.*")])
-                if file_path:
-                    # Salva a imagem no local especificado
-                    image.write(file_path, format="png")
-                    messagebox.showinfo("Save Image", "Image saved successfully!")
-            else:
-                messagebox.showerror("Error", "No image to save.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save image: {e}")
+        # Abre a janela de diálogo para salvar o arquivo
+        file_path = filedialog.asksaveasfilename(defaultextension=".png",
+                                                filetypes=[("PNG files", "*.png"),
+                                                            ("JPEG files", "*.jpg"),
+                                                            ("TIFF files", "*.tif"),
+                                                            ("NumPy arrays", "*.npy"),
+                                                            ("All files", "*.*")])
+        if file_path:
+            options = WriteOptions(png_compression=PNG_COMPRESSION, jpeg_quality=JPEG_QUALITY, depth=16 if SAVE_16_BIT else 8, lab=bool(SAVE_LAB))
+            try:
+                checkOptions(file_path, options)
+            except ValueError as e:
+                messagebox.showerror("Error", f"Failed to save image: {e}")
+                return
+
+            # Grava em segundo plano e avisa quando terminar; a thread da interface nunca espera por uma vaga (com gravações
+            # demais pendentes, pede para tentar de novo)
+            future = result_writer.submit(file_path, result, options, blocking=False)
+            if future is None:
+                messagebox.showinfo("Save Image", "Previous images are still being saved. Please wait and try again.")
+                return
+            whenDone(result_window, future,
+                     lambda _: messagebox.showinfo("Save Image", "Image saved successfully!"),
+                     lambda e: messagebox.showerror("Error", f"Failed to save image: {e}"))
 
 # ------------------------------------------------------------------------------------
 # Interface --------------------------------------------------------------------------
@@ -348,8 +355,8 @@ source_window.geometry("+0+0")
 source_menu_bar = Menu(source_window)
 
 # Display da imagem (começa com imagem default)
-source_display = tk.Label(source_window)
-source_display.pack()
+source_display = Viewport(source_window)
+source_display.pack(fill=BOTH, expand=True)
 setDefaultImg(source_display)
 
 # Configura as opções da barra de menu
@@ -371,8 +378,8 @@ target_window.geometry("+500+0")
 target_menu_bar = Menu(target_window)
 
 # Display da imagem (começa com imagem default)
-target_display = tk.Label(target_window)
-target_display.pack()
+target_display = Viewport(target_window)
+target_display.pack(fill=BOTH, expand=True)
 setDefaultImg(target_display)
 
 # Configura as opções da barra de menu
@@ -396,14 +403,14 @@ result_window.geometry("+1000+0")
 result_menu_bar = Menu(result_window)
 
 # Display da imagem (começa com imagem default)
-result_display = tk.Label(result_window)
-result_display.pack()
+result_display = Viewport(result_window)
+result_display.pack(fill=BOTH, expand=True)
 setDefaultImg(result_display)
 
 # Configura as opções da barra de menu
 result_apply_menu = Menu(result_menu_bar, tearoff= 0)
 result_save_menu = Menu(result_menu_bar, tearoff=0)
-result_save_menu.add_command(label="Save", command=lambda: saveImage(result_display))
+result_save_menu.add_command(label="Save", command=saveImage)
 result_menu_bar.add_cascade(label="File", menu=result_save_menu)
 result_apply_menu.add_command(label= "Apply", command = lambda: colorTransfer(result_display))
 result_menu_bar.add_cascade(label= "Process", menu = result_apply_menu)
@@ -416,6 +423,9 @@ result_window.protocol("WM_DELETE_WINDOW", on_toplevel_close)
 # Adiciona um botão na janela principal para abrir as configurações
 result_menu_bar.add_command(label="Settings", command=openSettings)
 
+# Adiciona um botão para ver o resumo (etapas, contadores e memória) da última transferência
+result_menu_bar.add_command(label="Stats", command=lambda: showStats(result_window, last_report))
+
 # ------------------------------------------------------------------------------------
 
 # Mantém o loop da janela principal
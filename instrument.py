@@ -0,0 +1,154 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# ------------------------------------------------------------------------------------
+# Instrumentation --------------------------------------------------------------------
+
+# Medição de cada etapa do processo de transferência de cores: tempo, contadores e (opcionalmente) memória.
+# Uso:
+#     instrument = Instrumentation(memory=True)
+#     with instrument.span("matching"):
+#         ...
+#         instrument.count("pixels_matched", n)
+#     instrument.report() -> {"spans": {"matching": {"seconds": ..., "calls": ..., "peak_mb": ...}}, "counters": {...}, "peak_mb": ...}
+#     instrument.close()
+# Etapas e contadores com o mesmo nome (ex.: um "std_filter" por par de swatches) são acumulados.
+# Com memory, o tracemalloc é ligado (se ainda não estiver) e cada etapa guarda o maior pico de memória alocada
+# durante ela, acima do que já estava alocado no início (etapas internas entram no pico da etapa externa).
+# O tracemalloc deixa as alocações bem mais lentas, então os tempos medidos com memory não são comparáveis aos sem.
+class Instrumentation:
+
+    enabled = True
+
+    def __init__(self, memory=False):
+        self.spans = {}
+        self.counters = {}
+        self.memory = memory
+        self.peak = 0
+        self.stack = []  # [memória no início, maior pico] de cada etapa aberta
+        self.tracing = memory and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+
+    # Mede o bloco with e acumula na etapa name
+    @contextmanager
+    def span(self, name):
+        if self.memory:
+            self.enterMemory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.spans.setdefault(name, {"seconds": 0.0, "calls": 0})
+            entry["seconds"] += time.perf_counter() - start
+            entry["calls"] += 1
+            if self.memory:
+                entry["peak_mb"] = max(entry.get("peak_mb", 0.0), self.exitMemory() / (1 << 20))
+
+    # Soma value ao contador name
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    # Início de uma etapa: o pico até aqui pertence à etapa externa, e o pico do tracemalloc recomeça
+    def enterMemory(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.notePeak(peak)
+        tracemalloc.reset_peak()
+        self.stack.append([current, current])
+
+    # Fim de uma etapa: o seu pico entra no pico da etapa externa. Retorno: pico da etapa (bytes acima do início)
+    def exitMemory(self):
+        start, peak = self.stack.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        self.notePeak(peak)
+        return peak - start
+
+    # Guarda o pico na etapa aberta e no total
+    def notePeak(self, peak):
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        self.peak = max(self.peak, peak)
+
+    # Tempo acumulado de cada etapa
+    def seconds(self):
+        return {name: entry["seconds"] for name, entry in self.spans.items()}
+
+    # Resumo da execução (serializável em JSON)
+    def report(self):
+        report = {"spans": {name: dict(entry) for name, entry in self.spans.items()}, "counters": dict(self.counters)}
+        if self.memory:
+            if tracemalloc.is_tracing():
+                self.notePeak(tracemalloc.get_traced_memory()[1])
+            report["peak_mb"] = self.peak / (1 << 20)
+        return report
+
+    # Grava o resumo da execução em um arquivo JSON, junto com as informações extras (ex.: stats do processo)
+    def dump(self, path, **extra):
+        with open(path, "w") as f:
+            json.dump(dict(self.report(), **extra), f, indent=2, default=str)
+
+    # Desliga o tracemalloc, se foi ligado por esta instrumentação
+    def close(self):
+        if self.tracing:
+            self.report()
+            tracemalloc.stop()
+            self.tracing = False
+
+# Instrumentação desligada: span e count não medem nada e têm custo praticamente nulo.
+# É a instrumentação padrão dos processos de transferência de cores.
+class NullInstrumentation:
+
+    enabled = False
+    memory = False
+    spans = {}
+    counters = {}
+
+    def span(self, name):
+        return NULL_SPAN
+
+    def count(self, name, value=1):
+        pass
+
+    def seconds(self):
+        return {}
+
+    def report(self):
+        return {}
+
+    def close(self):
+        pass
+
+NULL_SPAN = nullcontext()
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+# ------------------------------------------------------------------------------------
+# Report -----------------------------------------------------------------------------
+
+# Função que formata o resumo de uma execução (Instrumentation.report, com as informações do processo em "stats",
+# se houver) como texto, uma etapa ou contador por linha
+def formatReport(report):
+    lines = []
+    spans = report.get("spans", {})
+    if spans:
+        lines.append("Stages:")
+    for name, entry in spans.items():
+        line = f"  {name}: {entry['seconds'] * 1000:.1f} ms"
+        if entry["calls"] > 1:
+            line += f" ({entry['calls']} calls)"
+        if "peak_mb" in entry:
+            line += f", peak {entry['peak_mb']:.1f} MB"
+        lines.append(line)
+    if report.get("counters"):
+        lines.append("Counters:")
+        lines.extend(f"  {name}: {value:,}" for name, value in report["counters"].items())
+    if "peak_mb" in report:
+        lines.append(f"Peak memory: {report['peak_mb']:.1f} MB")
+    if report.get("stats"):
+        lines.append("Results:")
+        lines.extend(f"  {name}: {value}" for name, value in report["stats"].items())
+    return "\n".join(lines)
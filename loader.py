@@ -0,0 +1,149 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import cv2
+import os
+from collections import OrderedDict
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Fatores de redução suportados na decodificação (modos IMREAD_REDUCED_* do OpenCV)
+DECODE_SCALES = (1, 2, 4, 8)
+
+# Modos de leitura do OpenCV para cada fator de redução: (colorido, tons de cinza)
+REDUCED_MODES = {
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+}
+
+# Tamanho máximo padrão do cache de imagens decodificadas (bytes); as usadas há mais tempo são removidas primeiro
+DEFAULT_LOADER_BYTES = 1 << 30
+
+# ------------------------------------------------------------------------------------
+# Image Decoding ---------------------------------------------------------------------
+
+# Função que decodifica um arquivo de imagem em RGB (ou em tons de cinza, com grayscale), com as dimensões divididas
+# por scale (1, 2, 4 ou 8).
+# - Em escala 1 a imagem é lida em BGR e convertida (COLOR_BGR2RGB ou COLOR_BGR2GRAY), como sempre foi feito.
+# - Nas escalas reduzidas, o OpenCV decodifica diretamente na resolução menor (em JPEG, sem decodificar a imagem
+#   inteira), e os tons de cinza vêm do canal de luminância do arquivo: os valores podem diferir em uma unidade dos
+#   da escala 1, o que não importa para prévias e miniaturas.
+# A conversão para RGB é feita no próprio array, sem cópia.
+# Retorno: array uint8 (altura, largura, 3) em RGB ou (altura, largura) em tons de cinza
+def decodeImage(path, scale=1, grayscale=False):
+    if scale not in DECODE_SCALES:
+        raise ValueError(f"Unsupported decode scale {scale}, expected one of {DECODE_SCALES}")
+    if scale == 1:
+        img = cv2.imread(path)
+    else:
+        img = cv2.imread(path, REDUCED_MODES[scale][1 if grayscale else 0])
+    if img is None:
+        raise FileNotFoundError(path)
+    if img.ndim == 2:
+        return img
+    if grayscale:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+# Função que decodifica uma imagem recebida na memória (bytes de um arquivo PNG, JPEG, ...), em RGB ou em tons de
+# cinza, com as mesmas conversões de decodeImage em escala 1
+def decodeImageBytes(data, grayscale=False):
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image")
+    if grayscale:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+# Função que lê apenas as dimensões (altura, largura) de um arquivo de imagem, sem decodificar os pixels
+def imageSize(path):
+    from PIL import Image
+    with Image.open(path) as img:
+        return img.height, img.width
+
+# Função que escolhe o maior fator de redução com que a imagem de dimensões size (altura, largura) ainda tem o
+# maior lado com pelo menos maxSide pixels (1 se a imagem já for menor)
+def fitScale(size, maxSide):
+    for scale in reversed(DECODE_SCALES):
+        if max(size) // scale >= maxSide:
+            return scale
+    return 1
+
+# ------------------------------------------------------------------------------------
+# Image Loader -----------------------------------------------------------------------
+
+# Camada de leitura de imagens com cache em memória (LRU) dos arrays decodificados.
+# Como funciona:
+# - Cada entrada é identificada pelo caminho absoluto, data de modificação e tamanho do arquivo, fator de redução e
+#   modo (RGB ou tons de cinza): um arquivo alterado no disco é lido de novo.
+# - Os arrays guardados são somente leitura (writeable = False), então o mesmo buffer pode ser usado pela tela
+#   (Image.fromarray) e pelo algoritmo sem cópias; quem precisar alterar a imagem deve copiá-la.
+# - Ao passar de maxBytes, as imagens usadas há mais tempo são removidas.
+# Uso:
+#     loader = ImageLoader()
+#     source = loader.load(path)                      # RGB em resolução total
+#     target = loader.load(path, grayscale=True)      # tons de cinza
+#     preview = loader.load(path, scale=4)            # decodificada em 1/4 das dimensões
+#     thumbnail = loader.fit(path, 256)               # menor decodificação com o maior lado >= 256 pixels
+class ImageLoader:
+
+    def __init__(self, maxBytes=DEFAULT_LOADER_BYTES):
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()  # chave -> array
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Chave de uma imagem decodificada
+    def key(self, path, scale, grayscale):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, scale, bool(grayscale))
+
+    # Imagem decodificada (somente leitura), do cache ou do arquivo
+    def load(self, path, scale=1, grayscale=False):
+        try:
+            key = self.key(path, scale, grayscale)
+        except FileNotFoundError:
+            raise FileNotFoundError(path)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        img = decodeImage(path, scale, grayscale)
+        img.flags.writeable = False
+        if img.nbytes <= self.maxBytes:
+            self.entries[key] = img
+            self.bytes += img.nbytes
+            while self.bytes > self.maxBytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+        return img
+
+    # Imagem decodificada no maior fator de redução (fitScale) em que o maior lado ainda tem pelo menos maxSide pixels,
+    # para prévias e miniaturas. As dimensões vêm de uma decodificação já guardada do arquivo, ou do cabeçalho.
+    # Retorno: tupla (imagem, fator de redução)
+    def fit(self, path, maxSide, grayscale=False):
+        size = None
+        for scale in DECODE_SCALES:
+            key = self.key(path, scale, grayscale)
+            if key in self.entries:
+                size = tuple(dim * scale for dim in self.entries[key].shape[:2])
+                break
+        if size is None:
+            size = imageSize(path)
+        scale = fitScale(size, maxSide)
+        return self.load(path, scale, grayscale), scale
+
+    # Remove todas as imagens do cache
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    # Texto com as contagens de acesso ao cache
+    def report(self):
+        return f"loader: {self.hits} hits, {self.misses} misses, {len(self.entries)} images ({self.bytes / (1 << 20):.1f} MB)"
@@ -0,0 +1,264 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+from scipy.spatial import cKDTree
+import copy
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Número máximo de elementos da matriz de distâncias (pixels x amostras) calculada de uma só vez.
+# Limita a memória usada pelo matching em lote (~32 MB em float64).
+MATCH_CHUNK_ELEMENTS = 1 << 22
+
+# Número de amostras a partir do qual o matching passa a usar um índice espacial (árvore KD) em vez da busca linear
+SAMPLE_INDEX_THRESHOLD = 32
+
+# Número máximo de pixels consultados no índice espacial de uma só vez
+INDEX_CHUNK_PIXELS = 1 << 20
+
+# Número de threads de cada consulta ao índice espacial (-1: todos os núcleos). Quem já roda dentro de um pool
+# (processos ou threads) deve passar 1, para não multiplicar as threads pelo número de workers.
+QUERY_WORKERS = -1
+
+# Número de vizinhos mais próximos consultados por pixel no índice espacial, para resolver empates de distância
+# como a busca linear (menor índice de amostra); pelo menos 2
+INDEX_TIE_CANDIDATES = 2
+
+# Passo de quantização do desvio padrão na tabela de lookup (L, desvio padrão) -> (a, b)
+LUT_STD_STEP = 0.5
+
+# Número de pixels (sorteados) usados para medir o desvio da tabela de lookup em relação ao matching exato
+LUT_CHECK_PIXELS = 10000
+
+# Número de pixels por bloco no cálculo do erro de quantização da tabela de lookup
+LUT_ERROR_CHUNK_PIXELS = 1 << 16
+
+# ------------------------------------------------------------------------------------
+# Best Matching Color (Batch) --------------------------------------------------------
+
+# Função que encontra, para todos os pixels da imagem target de uma vez, o índice da melhor amostra da imagem source
+# com base em luminância (50%) e desvio padrão (50%).
+# Como funciona:
+# - Os pixels da target são processados em blocos, de modo que a matriz de distâncias de cada bloco
+#   tenha no máximo chunkElements elementos.
+# - Para cada bloco, a "distância" de cada pixel para cada amostra é a mesma usada pelo bestMatch original
+#   (soma das diferenças quadráticas entre as luminâncias e entre os desvios padrões).
+# - O np.argmin por linha devolve a primeira amostra de menor distância, assim como no laço pixel a pixel.
+# Retorno: array com o índice da melhor amostra para cada pixel, em ordem de linha.
+def bestMatchBatchIndices(target, targetStd, source, sourceStd, chunkElements=MATCH_CHUNK_ELEMENTS):
+
+    # Trata as imagens target como vetores de pixels
+    target = np.ravel(target)
+    targetStd = np.ravel(targetStd)
+
+    # Índice da melhor amostra para cada pixel
+    best = np.empty(target.size, dtype=np.intp)
+
+    # Número de pixels por bloco
+    step = max(1, chunkElements // max(1, source.size))
+
+    for start in range(0, target.size, step):
+        stop = start + step
+
+        # Distância ponderada entre cada pixel do bloco (linhas) e cada amostra (colunas)
+        distances = (source - target[start:stop, None])**2 + (sourceStd - targetStd[start:stop, None])**2
+
+        # Guarda a amostra de menor distância para cada pixel do bloco
+        best[start:stop] = np.argmin(distances, axis=1)
+
+    return best
+
+# Função que encontra a melhor amostra para todos os pixels com a busca linear em lote (bestMatchBatchIndices).
+# Retorno: array (número de pixels, 2) com as coordenadas da melhor amostra para cada pixel, em ordem de linha.
+def bestMatchBatch(target, targetStd, source, sourceCoord, sourceStd, chunkElements=MATCH_CHUNK_ELEMENTS):
+    return sourceCoord[bestMatchBatchIndices(target, targetStd, source, sourceStd, chunkElements)]
+
+# ------------------------------------------------------------------------------------
+# Sample Index -----------------------------------------------------------------------
+
+# Função que constrói um índice espacial (árvore KD) sobre as amostras da imagem source no espaço (luminância, desvio padrão).
+# A distância euclidiana nesse espaço é a raiz da distância usada pelo bestMatchBatch, então o vizinho mais próximo
+# na árvore tem a menor distância. Amostras repetidas (mesma luminância e mesmo desvio padrão) são indexadas uma única
+# vez, mantendo a primeira ocorrência; empates entre amostras diferentes são resolvidos em bestMatchIndex.
+# Retorno: tupla (árvore, índices das amostras indexadas no vetor original)
+def buildSampleIndex(source, sourceStd):
+    points = np.column_stack((np.ravel(source), np.ravel(sourceStd))).astype(np.float64, copy=False)
+    points, first = np.unique(points, axis=0, return_index=True)
+    return cKDTree(points), first
+
+# Função que encontra a melhor amostra para todos os pixels da imagem target consultando o índice espacial em lote,
+# com o mesmo resultado da busca linear (bestMatchBatch).
+# Como funciona:
+# - Cada pixel consulta os INDEX_TIE_CANDIDATES vizinhos mais próximos na árvore; a distância de cada candidato é
+#   recalculada com a fórmula da busca linear, e entre os candidatos de menor distância fica o de menor índice original
+#   (o que o np.argmin da busca linear escolheria).
+# - Se todos os candidatos de um pixel empatam na menor distância, pode haver outras amostras empatadas fora deles:
+#   esses pixels (raros, exceto com valores inteiros) são resolvidos pela busca linear.
+# Os pixels são consultados em blocos de até chunkPixels pixels para limitar a memória usada, com workers threads
+# por consulta (QUERY_WORKERS).
+# Retorno: array (número de pixels, 2) com as coordenadas da melhor amostra para cada pixel, em ordem de linha.
+def bestMatchIndex(index, target, targetStd, source, sourceCoord, sourceStd, chunkPixels=INDEX_CHUNK_PIXELS, workers=QUERY_WORKERS):
+    tree, first = index
+    candidates = min(INDEX_TIE_CANDIDATES, first.size)
+
+    # Trata as imagens target como vetores de pixels
+    target = np.ravel(target)
+    targetStd = np.ravel(targetStd)
+
+    # Índice da melhor amostra para cada pixel
+    best = np.empty(target.size, dtype=np.intp)
+
+    for start in range(0, target.size, chunkPixels):
+        stop = start + chunkPixels
+
+        # Consulta os vizinhos mais próximos de cada pixel do bloco
+        lum = target[start:stop, None]
+        std = targetStd[start:stop, None]
+        near = first[tree.query(np.column_stack((lum, std)), k=[*range(1, candidates + 1)], workers=workers)[1]]
+
+        # Distância da busca linear para cada candidato; entre os de menor distância, o de menor índice original
+        distances = (source[near] - lum)**2 + (sourceStd[near] - std)**2
+        ties = distances == distances.min(axis=1, keepdims=True)
+        best[start:stop] = np.where(ties, near, source.size).min(axis=1)
+
+        # Pixels com todos os candidatos empatados: busca linear
+        if candidates < first.size:
+            tied = np.flatnonzero(ties.all(axis=1))
+            if tied.size:
+                best[start + tied] = bestMatchBatchIndices(lum[tied, 0], std[tied, 0], source, sourceStd)
+
+    # Retorna as coordenadas das melhores correspondências
+    return sourceCoord[best]
+
+# ------------------------------------------------------------------------------------
+# Sample Set -------------------------------------------------------------------------
+
+# Conjunto de amostras da imagem source pronto para o matching, construído uma única vez por source.
+# Como funciona:
+# - Com poucas amostras o matching é a busca linear em lote (bestMatchBatch); a partir de SAMPLE_INDEX_THRESHOLD
+#   amostras, a árvore KD é construída no próprio construtor.
+# - remapped(scale, offset) devolve uma visão do mesmo conjunto em que as amostras valem scale * lum + offset e
+#   scale * std (o efeito do lumRemap). Como a distância apenas é multiplicada por scale², o matching é feito
+#   levando os pixels da target para o espaço original das amostras, sem recalcular amostras nem reconstruir a árvore.
+class SampleIndex:
+
+    def __init__(self, source, sourceCoord, sourceStd):
+        self.source = np.ravel(source)
+        self.coord = sourceCoord
+        self.std = np.ravel(sourceStd)
+        self.tree = buildSampleIndex(self.source, self.std) if self.source.size >= SAMPLE_INDEX_THRESHOLD else None
+        self.scale = 1.0
+        self.offset = 0.0
+
+    # Número de amostras do conjunto
+    def __len__(self):
+        return self.source.size
+
+    # Visão do conjunto com as amostras remapeadas (compartilha arrays e árvore)
+    def remapped(self, scale, offset):
+        view = copy.copy(self)
+        view.scale = scale
+        view.offset = offset
+        return view
+
+    # Função que encontra a melhor amostra para todos os pixels da imagem target (workers: threads da consulta ao índice)
+    # Retorno: array (número de pixels, 2) com as coordenadas da melhor amostra para cada pixel, em ordem de linha.
+    def match(self, target, targetStd, workers=QUERY_WORKERS):
+        target = np.ravel(target)
+        targetStd = np.ravel(targetStd)
+
+        # Com escala zero todas as amostras remapeadas são iguais: a primeira é a melhor correspondência
+        if self.scale == 0:
+            return np.repeat(self.coord[:1], target.size, axis=0)
+
+        # Leva os pixels da target para o espaço original das amostras
+        if self.scale != 1 or self.offset != 0:
+            target = (target - self.offset) / self.scale
+            targetStd = targetStd / self.scale
+
+        if self.tree is not None:
+            return bestMatchIndex(self.tree, target, targetStd, self.source, self.coord, self.std, workers=workers)
+        return bestMatchBatch(target, targetStd, self.source, self.coord, self.std)
+
+# ------------------------------------------------------------------------------------
+# Best Matching Color (Dispatch) -----------------------------------------------------
+
+# Função que escolhe a estratégia de matching de acordo com o número de amostras:
+# busca linear em lote para poucas amostras e índice espacial para muitas.
+def bestMatchSamples(target, targetStd, source, sourceCoord, sourceStd, workers=QUERY_WORKERS):
+    return SampleIndex(source, sourceCoord, sourceStd).match(target, targetStd, workers)
+
+# ------------------------------------------------------------------------------------
+# Chroma Transfer --------------------------------------------------------------------
+
+# Função que copia os canais alfa e beta das coordenadas encontradas na imagem source (Lab) para a imagem de resultado (Lab).
+# As coordenadas devem estar na mesma ordem de linha dos pixels de result (como retornado por bestMatchBatch).
+def transferChroma(result, sourceLab, coords):
+    result[:, :, 1:] = sourceLab[coords[:, 0], coords[:, 1], 1:].reshape(result.shape[0], result.shape[1], 2)
+    return result
+
+# ------------------------------------------------------------------------------------
+# Chroma Lookup Table ----------------------------------------------------------------
+
+# Função que monta uma tabela de lookup 256 x K com os canais alfa e beta da melhor amostra para cada par
+# (luminância inteira, desvio padrão quantizado). O desvio padrão é quantizado em passos de stdStep,
+# de 0 até maxStd (o maior desvio padrão da imagem target), e cada par é resolvido uma única vez pelo matching exato
+# no conjunto de amostras index (SampleIndex).
+# Retorno: array (256, K, 2) com os canais alfa e beta.
+def buildChromaLut(sourceLab, index, maxStd, stdStep=LUT_STD_STEP, workers=QUERY_WORKERS):
+
+    # Centros dos intervalos de luminância e de desvio padrão
+    lumBins = np.arange(256, dtype=np.float64)
+    stdBins = np.arange(int(np.ceil(maxStd / stdStep)) + 1, dtype=np.float64) * stdStep
+    lumGrid, stdGrid = np.meshgrid(lumBins, stdBins, indexing="ij")
+
+    # Resolve cada entrada da tabela com o matching exato
+    coords = index.match(lumGrid, stdGrid, workers)
+
+    # Retorna os canais alfa e beta de cada entrada
+    return sourceLab[coords[:, 0], coords[:, 1], 1:].reshape(lumBins.size, stdBins.size, 2)
+
+# Função que quantiza o desvio padrão da imagem target nos índices de coluna da tabela de lookup
+def lutStdIndex(lut, targetStd, stdStep=LUT_STD_STEP):
+    return np.clip(np.rint(targetStd / stdStep), 0, lut.shape[1] - 1).astype(np.intp)
+
+# Função que colore a imagem de resultado (Lab) com uma única leitura na tabela de lookup.
+# A luminância da target deve ter valores inteiros entre 0 e 255.
+def applyChromaLut(lut, result, targetLum, targetStd, stdStep=LUT_STD_STEP):
+    result[:, :, 1:] = lut[np.asarray(targetLum, dtype=np.intp), lutStdIndex(lut, targetStd, stdStep)]
+    return result
+
+# Função que mede o quanto a tabela de lookup se afasta do matching exato.
+# Como funciona:
+# - O erro de quantização do desvio padrão é calculado para todos os pixels (é no máximo stdStep/2).
+# - A diferença de cor é medida em até checkPixels pixels sorteados, comparando a cor da tabela com a cor do matching exato.
+# Retorno: dicionário com o maior erro de desvio padrão, a maior diferença nos canais alfa/beta
+# e a fração dos pixels verificados cuja cor mudou.
+def lutDeviation(lut, sourceLab, index, targetLum, targetStd, stdStep=LUT_STD_STEP, checkPixels=LUT_CHECK_PIXELS, seed=0, workers=QUERY_WORKERS):
+    targetLum = np.ravel(targetLum)
+    targetStd = np.ravel(targetStd)
+
+    # Maior erro de quantização do desvio padrão, em blocos (sem arrays temporários do tamanho da imagem)
+    stdError = 0.0
+    for start in range(0, targetStd.size, LUT_ERROR_CHUNK_PIXELS):
+        block = targetStd[start:start + LUT_ERROR_CHUNK_PIXELS]
+        stdError = max(stdError, float(np.max(np.abs(block - lutStdIndex(lut, block, stdStep) * stdStep))))
+
+    # Sorteia os pixels verificados
+    rng = np.random.default_rng(seed)
+    check = rng.choice(targetLum.size, size=min(checkPixels, targetLum.size), replace=False)
+
+    # Cor dada pela tabela e cor dada pelo matching exato
+    lutColor = lut[targetLum[check].astype(np.intp), lutStdIndex(lut, targetStd[check], stdStep)].astype(np.float64)
+    coords = index.match(targetLum[check], targetStd[check], workers)
+    exactColor = sourceLab[coords[:, 0], coords[:, 1], 1:].astype(np.float64)
+    diff = np.abs(lutColor - exactColor).max(axis=1)
+
+    return {
+        "std_error": stdError,
+        "chroma_error": float(diff.max()),
+        "changed_fraction": float(np.mean(diff > 0)),
+        "checked_pixels": int(check.size),
+    }
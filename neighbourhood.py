@@ -0,0 +1,100 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import cv2
+from scipy.ndimage import uniform_filter
+
+# ------------------------------------------------------------------------------------
+# Local Mean -------------------------------------------------------------------------
+
+# Função que calcula a média de cada vizinhança size x size da imagem.
+# Usa um filtro de caixa (somas acumuladas), então o custo por pixel não depende do tamanho da vizinhança.
+# As bordas são tratadas como no generic_filter (modo "reflect" do scipy), para manter os mesmos resultados.
+# Retorno: array float32 se a imagem for float32, float64 caso contrário.
+def localMean(img, size):
+    img = np.asarray(img)
+    if img.dtype != np.float32:
+        img = img.astype(np.float64, copy=False)
+    return uniform_filter(img, size=size, mode="reflect")
+
+# ------------------------------------------------------------------------------------
+# Local Standard Deviation -----------------------------------------------------------
+
+# Função que calcula o desvio padrão de cada vizinhança size x size da imagem.
+# Substitui generic_filter(img, np.std, size=size) usando a identidade var = E[x²] - E[x]²,
+# com E[x] e E[x²] obtidos por filtros de caixa.
+# Retorno: array float32 se a imagem for float32, float64 caso contrário (nunca uint8).
+def localStd(img, size):
+
+    # Média e média dos quadrados de cada vizinhança
+    mean = localMean(img, size)
+    img = np.asarray(img, dtype=mean.dtype)
+    meanSq = uniform_filter(img * img, size=size, mode="reflect")
+
+    # Variância (erros de arredondamento podem deixá-la levemente negativa em regiões constantes)
+    var = meanSq - mean * mean
+    np.maximum(var, 0, out=var)
+
+    # Retorna o desvio padrão
+    return np.sqrt(var, out=var)
+
+# Função que calcula o desvio padrão das vizinhanças size x size apenas nas linhas [top, bottom) da imagem,
+# lendo as linhas vizinhas necessárias (halo) e sem converter a imagem inteira para float.
+# O resultado é idêntico às mesmas linhas de localStd(img, size).
+# Retorno: array (bottom - top, largura) float32 se a imagem for float32, float64 caso contrário.
+def localStdRows(img, top, bottom, size):
+    halo = size // 2
+    haloTop, haloBottom = max(top - halo, 0), min(bottom + halo, img.shape[0])
+    return localStd(img[haloTop:haloBottom], size)[top - haloTop:bottom - haloTop]
+
+# ------------------------------------------------------------------------------------
+# Guided Upsampling ------------------------------------------------------------------
+
+# Função que leva uma imagem src calculada em baixa resolução para a resolução de guideFull, guiada pela luminância
+# (guided filter de He et al., na forma "fast guided filter").
+# Como funciona:
+# - Em baixa resolução, cada vizinhança size x size de src é aproximada por uma função linear da guia
+#   (src ≈ a * guia + b), com a e b obtidos por filtros de caixa; eps regulariza a (quanto maior, mais suave).
+# - a e b variam devagar, então são ampliados por interpolação bilinear e aplicados à guia em alta resolução:
+#   as bordas de src acompanham as bordas da luminância em alta resolução.
+# As guias devem estar em [0, 1] (eps é relativo a essa escala); src pode ter vários canais (último eixo).
+# Os cálculos são feitos em float32. Com out (array uint8 com a resolução de guideFull e os canais de src), cada canal
+# é arredondado e escrito diretamente nele, sem guardar o resultado em float dos outros canais.
+# Retorno: out, ou um array float32 com a resolução de guideFull e os canais de src.
+def guidedUpsample(guideSmall, src, guideFull, size, eps, out=None):
+    src = np.asarray(src, dtype=np.float32)
+    if src.ndim == 2:
+        result = guidedUpsample(guideSmall, src[:, :, None], guideFull, size, eps, None if out is None else out[:, :, None])
+        return result[:, :, 0]
+
+    guideSmall = np.asarray(guideSmall, dtype=np.float32)
+    guideFull = np.asarray(guideFull, dtype=np.float32)
+    height, width = guideFull.shape
+
+    # Estatísticas da guia em cada vizinhança (as mesmas para todos os canais)
+    meanI = localMean(guideSmall, size)
+    varI = localMean(guideSmall * guideSmall, size) - meanI * meanI
+
+    result = out if out is not None else np.empty((height, width, src.shape[2]), dtype=np.float32)
+    for c in range(src.shape[2]):
+        meanP = localMean(src[:, :, c], size)
+        covIP = localMean(guideSmall * src[:, :, c], size) - meanI * meanP
+
+        # Coeficientes da aproximação linear, suavizados
+        a = covIP / (varI + np.float32(eps))
+        b = meanP - a * meanI
+        a = localMean(a, size)
+        b = localMean(b, size)
+
+        # Amplia os coeficientes e aplica à guia em alta resolução (reaproveitando o array de a)
+        a = cv2.resize(a, (width, height), interpolation=cv2.INTER_LINEAR)
+        b = cv2.resize(b, (width, height), interpolation=cv2.INTER_LINEAR)
+        np.multiply(a, guideFull, out=a)
+        np.add(a, b, out=a)
+        if out is not None:
+            np.rint(a, out=a)
+            np.clip(a, 0, 255, out=a)
+        result[:, :, c] = a
+
+    return result
@@ -0,0 +1,67 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import threading
+import time
+
+# ------------------------------------------------------------------------------------
+# Cancellation -----------------------------------------------------------------------
+
+# Exceção lançada dentro do processo de transferência de cores quando o cancelamento é pedido
+class TransferCancelled(Exception):
+    pass
+
+# ------------------------------------------------------------------------------------
+# Progress ---------------------------------------------------------------------------
+
+# Canal de progresso e cancelamento de uma transferência de cores.
+# Como funciona:
+# - Os processos de transferência chamam update(etapa, feito, total) entre blocos de trabalho (linhas no matching,
+#   pares de swatches, janelas na síntese de textura); callback recebe os mesmos valores.
+# - update também verifica o pedido de cancelamento (cancel()) e, se houver, lança TransferCancelled, de modo que a
+#   transferência para no próximo bloco sem deixar estado pela metade.
+# - callback é chamado na thread que faz a transferência; quem precisa mostrar o progresso em outra thread
+#   (ex.: a interface Tk) deve repassar os valores por uma fila.
+# Uso:
+#     progress = Progress(lambda stage, done, total: print(stage, done, total))
+#     GlobalTransfer(params, progress=progress).run(source, target)   # em outra thread: progress.cancel()
+class Progress:
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.cancelled = threading.Event()
+
+    # Pede o cancelamento (pode ser chamado de qualquer thread)
+    def cancel(self):
+        self.cancelled.set()
+
+    # Lança TransferCancelled se o cancelamento foi pedido
+    def check(self):
+        if self.cancelled.is_set():
+            raise TransferCancelled()
+
+    # Informa o andamento de uma etapa (done de total unidades) e verifica o cancelamento
+    def update(self, stage, done, total):
+        self.check()
+        if self.callback is not None:
+            self.callback(stage, done, total)
+
+# ------------------------------------------------------------------------------------
+# Estimated Time ---------------------------------------------------------------------
+
+# Estimativa do tempo restante de uma etapa a partir do ritmo observado desde o seu início
+class StageTimer:
+
+    def __init__(self):
+        self.stage = None
+        self.start = None
+
+    # Atualiza a etapa atual. Retorno: segundos restantes estimados (None enquanto não há como estimar)
+    def remaining(self, stage, done, total):
+        now = time.perf_counter()
+        if stage != self.stage:
+            self.stage = stage
+            self.start = now
+        if done <= 0 or total <= 0:
+            return None
+        return (now - self.start) * (total - done) / done
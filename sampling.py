@@ -0,0 +1,176 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Amostradores da imagem source disponíveis (ver sampleSource)
+SAMPLERS = ("jitter", "stratified")
+
+# Amostragem estratificada: número de faixas de luminância e de desvio padrão (em escala de raiz quadrada) dos estratos
+STRATA_LUM_BINS = 32
+STRATA_STD_BINS = 16
+
+# Número de pixels (sorteados) usados para medir a cobertura de um conjunto de amostras
+COVERAGE_CHECK_PIXELS = 20000
+
+# ------------------------------------------------------------------------------------
+# Random Streams ---------------------------------------------------------------------
+
+# Função que cria o gerador usado pelo jitter sampling a partir de rng: um numpy.random.Generator (usado como está),
+# uma semente (int ou numpy.random.SeedSequence, resultado reprodutível) ou None (sementes novas a cada chamada).
+def samplingRng(rng=None):
+    return np.random.default_rng(rng)
+
+# ------------------------------------------------------------------------------------
+# Jitter Sampling --------------------------------------------------------------------
+
+# Função para amostragem jitterizada e armazenamento de coordenadas
+# Como funciona:
+# - A imagem é dividida em uma grade de MxN blocos, cujos limites são distribuídos igualmente pela imagem inteira.
+#   Em imagens com menos de M linhas (ou N colunas), a grade é reduzida para uma linha (coluna) por bloco, sem blocos vazios.
+# - Para cada bloco, um ponto é selecionado aleatoriamente dentro de seus limites. Isso é feito para evitar padrões fixos.
+# - Todos os sorteios são feitos de uma vez com um numpy.random.Generator (ver samplingRng): com uma semente ou um
+#   gerador próprio o resultado é reprodutível e não depende de estado global, então pode rodar em paralelo.
+# Retorno: três arrays, com as amostras na ordem dos blocos (linha a linha)
+# 1) Coordenadas de cada amostra na imagem original
+# 2) Valor da luminância de cada amostra
+# 3) Desvio padrão relativo a cada amostra (usa os valores pré-calculados e recebidos como argumento na função)
+def jitterSampling(img, M, N, imgStd, rng=None):
+    rng = samplingRng(rng)
+    height, width = img.shape[:2]
+
+    # Limites dos blocos em linhas e em colunas (no máximo um bloco por linha/coluna da imagem)
+    M, N = min(M, height), min(N, width)
+    rowEdges = np.arange(M + 1) * height // M
+    colEdges = np.arange(N + 1) * width // N
+
+    # Sorteia a coordenada de cada bloco dentro dos seus limites
+    x = rng.integers(rowEdges[:-1, None], rowEdges[1:, None], size=(M, N)).ravel()
+    y = rng.integers(colEdges[None, :-1], colEdges[None, 1:], size=(M, N)).ravel()
+
+    # Retorna coordenadas, valores de luminância e desvio padrão
+    return np.stack((x, y), axis=1), img[x, y], imgStd[x, y]
+
+# ------------------------------------------------------------------------------------
+# Stratified Sampling ----------------------------------------------------------------
+
+# Função que devolve o estrato (luminância, desvio padrão) de cada pixel: a luminância é dividida em lumBins faixas
+# iguais entre o menor e o maior valor da imagem, e o desvio padrão em stdBins faixas iguais da sua raiz quadrada
+# (mais faixas nos desvios pequenos, onde está a maior parte dos pixels), até o maior desvio padrão.
+# Retorno: array uint16 com a forma de img
+def strataOf(img, imgStd, lumBins=STRATA_LUM_BINS, stdBins=STRATA_STD_BINS, lumRange=None, maxStd=None):
+    lowLum, highLum = lumRange if lumRange is not None else (float(np.min(img)), float(np.max(img)))
+    maxStd = maxStd if maxStd is not None else float(np.max(imgStd))
+    lumBin = (np.asarray(img, dtype=np.float32) - np.float32(lowLum)) * np.float32(lumBins / max(highLum - lowLum, 1e-9))
+    stdBin = np.sqrt(np.asarray(imgStd, dtype=np.float32)) * np.float32(stdBins / max(np.sqrt(maxStd), 1e-9))
+    lumBin = np.clip(lumBin, 0, lumBins - 1).astype(np.uint16)
+    stdBin = np.clip(stdBin, 0, stdBins - 1).astype(np.uint16)
+    return lumBin * np.uint16(stdBins) + stdBin
+
+# Função que distribui budget amostras entre os estratos com counts pixels cada.
+# Todo estrato não vazio recebe uma amostra (se o orçamento permitir; senão, os mais populosos); o restante é dividido
+# proporcionalmente à raiz quadrada da população, um meio-termo entre cobrir os estratos raros e acompanhar a
+# densidade dos comuns. Nenhum estrato recebe mais amostras do que pixels.
+# Retorno: array com o número de amostras de cada estrato
+def allocateStrata(counts, budget):
+    allocation = np.zeros(len(counts), dtype=np.int64)
+    occupied = np.flatnonzero(counts)
+    budget = min(int(budget), int(counts.sum()))
+    if budget <= len(occupied):
+        allocation[occupied[np.argsort(-counts[occupied], kind="stable")[:budget]]] = 1
+        return allocation
+    allocation[occupied] = 1
+    while allocation.sum() < budget:
+        open_ = occupied[allocation[occupied] < counts[occupied]]
+        weights = np.sqrt(counts[open_].astype(np.float64))
+        share = (budget - allocation.sum()) * weights / weights.sum()
+        extra = np.minimum(np.floor(share).astype(np.int64), counts[open_] - allocation[open_])
+        if extra.sum() == 0:
+            # Resto menor que o número de estratos: vai para as maiores frações
+            extra = np.zeros(len(open_), dtype=np.int64)
+            extra[np.argsort(-(share - np.floor(share)), kind="stable")[:budget - allocation.sum()]] = 1
+        allocation[open_] += extra
+    return allocation
+
+# Função para amostragem estratificada no espaço (luminância, desvio padrão) da imagem source.
+# Como funciona:
+# - Cada pixel pertence a um estrato (strataOf), com a resolução reduzida enquanto houver mais estratos ocupados do que
+#   amostras; o orçamento de budget amostras é distribuído entre os estratos
+#   (allocateStrata), então combinações raras de luminância e textura recebem amostras mesmo quando grandes regiões
+#   uniformes (ex.: céu) ocupam a maior parte da imagem.
+# - Dentro de cada estrato, os pixels são percorridos em ordem de linha e divididos em tantos intervalos quanto as suas
+#   amostras, e um pixel é sorteado em cada intervalo (jitter dentro do estrato): as amostras não se repetem e ficam
+#   espalhadas pela imagem.
+# - Os sorteios usam um numpy.random.Generator (ver samplingRng), como no jitterSampling.
+# Retorno: os mesmos três arrays do jitterSampling (coordenadas, luminâncias e desvios padrão das amostras),
+# com as amostras agrupadas por estrato
+def stratifiedSampling(img, budget, imgStd, rng=None, lumBins=STRATA_LUM_BINS, stdBins=STRATA_STD_BINS):
+    rng = samplingRng(rng)
+    width = img.shape[1]
+
+    # Estratos: com menos amostras do que estratos ocupados, a resolução é reduzida à metade até que cada estrato
+    # ocupado possa receber uma amostra
+    while True:
+        strata = strataOf(img, imgStd, lumBins, stdBins).ravel()
+        counts = np.bincount(strata, minlength=lumBins * stdBins)
+        if np.count_nonzero(counts) <= budget or lumBins * stdBins == 1:
+            break
+        lumBins, stdBins = max(1, lumBins // 2), max(1, stdBins // 2)
+
+    # Pixels agrupados por estrato, em ordem de linha dentro de cada um (ordenação estável)
+    order = np.argsort(strata, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    # Amostras de cada estrato: um pixel sorteado em cada um dos seus intervalos
+    allocation = allocateStrata(counts, budget)
+    stratum = np.repeat(np.arange(len(counts)), allocation)
+    slot = np.arange(len(stratum)) - np.repeat(np.cumsum(allocation) - allocation, allocation)
+    offset = np.floor((slot + rng.random(len(stratum))) * counts[stratum] / allocation[stratum]).astype(np.int64)
+    flat = order[starts[stratum] + np.minimum(offset, counts[stratum] - 1)]
+
+    x, y = np.divmod(flat, width)
+    return np.stack((x, y), axis=1), img[x, y], imgStd[x, y]
+
+# ------------------------------------------------------------------------------------
+# Source Sampling --------------------------------------------------------------------
+
+# Função que amostra a imagem source com o amostrador sampler: "jitter" (grade espacial MxN, jitterSampling) ou
+# "stratified" (M*N amostras distribuídas no espaço (luminância, desvio padrão), stratifiedSampling).
+# Retorno: os três arrays do jitterSampling
+def sampleSource(img, imgStd, M, N, sampler="jitter", rng=None):
+    if sampler == "jitter":
+        return jitterSampling(img, M, N, imgStd, rng)
+    if sampler == "stratified":
+        return stratifiedSampling(img, M * N, imgStd, rng)
+    raise ValueError(f"Unknown sampler '{sampler}', expected one of {', '.join(SAMPLERS)}")
+
+# Função que mede o quanto um conjunto de amostras cobre a distribuição (luminância, desvio padrão) da imagem source,
+# em até checkPixels pixels sorteados:
+# - strata_coverage: fração dos pixels cujo estrato (strataOf) tem pelo menos uma amostra
+# - distance_mean, distance_p95: distância de cada pixel até a amostra mais próxima no espaço (luminância, desvio
+#   padrão), a mesma do matching (0 = o pixel tem uma amostra idêntica)
+# Retorno: dicionário com as medidas, o número de amostras e de pixels verificados
+def samplingCoverage(img, imgStd, sampleLum, sampleStd, checkPixels=COVERAGE_CHECK_PIXELS, seed=0):
+    rng = np.random.default_rng(seed)
+    size = img.shape[0] * img.shape[1]
+    flat = rng.choice(size, size=min(checkPixels, size), replace=False)
+    lum = np.asarray(img).reshape(-1)[flat].astype(np.float64)
+    std = np.asarray(imgStd).reshape(-1)[flat].astype(np.float64)
+
+    lumRange = (float(np.min(img)), float(np.max(img)))
+    maxStd = float(np.max(imgStd))
+    pixelStrata = strataOf(lum, std, lumRange=lumRange, maxStd=maxStd)
+    sampleStrata = strataOf(np.asarray(sampleLum), np.asarray(sampleStd), lumRange=lumRange, maxStd=maxStd)
+    distance = cKDTree(np.column_stack((sampleLum, sampleStd))).query(np.column_stack((lum, std)))[0]
+
+    return {
+        "samples": int(len(sampleLum)),
+        "strata_coverage": float(np.mean(np.isin(pixelStrata, sampleStrata))),
+        "distance_mean": float(distance.mean()),
+        "distance_p95": float(np.percentile(distance, 95)),
+        "checked_pixels": int(len(flat)),
+    }
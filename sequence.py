@@ -0,0 +1,203 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import cv2
+import os
+import time
+
+from batch import IMAGE_EXTENSIONS
+from neighbourhood import localStd
+from transfer import GlobalTransfer, lumRemapCoefficients
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Quadros por segundo usados ao gravar vídeo quando a entrada não informa (diretório de imagens)
+DEFAULT_FPS = 24.0
+
+# Codec padrão dos vídeos gravados
+DEFAULT_FOURCC = "mp4v"
+
+# ------------------------------------------------------------------------------------
+# Frame Input ------------------------------------------------------------------------
+
+# Função que lê os quadros de um diretório de imagens (em ordem alfabética) ou de um arquivo de vídeo,
+# um de cada vez, em tons de cinza.
+def readFrames(path):
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                frame = cv2.imread(os.path.join(path, name), cv2.IMREAD_GRAYSCALE)
+                if frame is None:
+                    raise ValueError(f"Could not read frame {name}")
+                yield frame
+        return
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise FileNotFoundError(path)
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    finally:
+        capture.release()
+
+# Função que devolve a taxa de quadros de um vídeo (ou DEFAULT_FPS para diretórios e vídeos sem essa informação)
+def framesPerSecond(path):
+    if os.path.isdir(path):
+        return DEFAULT_FPS
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return fps if fps > 0 else DEFAULT_FPS
+
+# ------------------------------------------------------------------------------------
+# Frame Output -----------------------------------------------------------------------
+
+# Gravação dos quadros coloridos (RGB) à medida que são gerados: em um arquivo de vídeo
+# ou, se o caminho não tiver extensão, em um diretório de imagens PNG numeradas.
+class FrameWriter:
+
+    def __init__(self, path, fps=DEFAULT_FPS, fourcc=DEFAULT_FOURCC):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.video = None
+        self.count = 0
+        if not os.path.splitext(path)[1]:
+            os.makedirs(path, exist_ok=True)
+
+    def write(self, frame):
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        if not os.path.splitext(self.path)[1]:
+            cv2.imwrite(os.path.join(self.path, f"frame_{self.count:06d}.png"), frame)
+        else:
+            if self.video is None:
+                self.video = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (frame.shape[1], frame.shape[0]))
+                if not self.video.isOpened():
+                    raise OSError(f"Could not open video writer for {self.path}")
+            self.video.write(frame)
+        self.count += 1
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ------------------------------------------------------------------------------------
+# Sequence Transfer ------------------------------------------------------------------
+
+# Transferência de cores global para uma sequência de quadros com a mesma imagem source.
+# Como funciona:
+# - A source é pré-computada uma única vez (GlobalTransfer.prepare), então todos os quadros usam as mesmas amostras
+#   (sem sorteio novo a cada quadro, o que causava cintilação das cores).
+# - Com lockRemap, o Luminance Remapping usa as estatísticas do primeiro quadro para o plano inteiro; assim a cor
+#   de um pixel só muda se a sua vizinhança mudar.
+# - Com reuseMatches (e lockRemap), apenas os pixels que mudaram mais que threshold níveis de cinza em relação à
+#   luminância usada no último matching são considerados alterados. O desvio padrão é recalculado apenas no retângulo
+#   que envolve essas mudanças (com halo) e o matching é refeito apenas onde a luminância ou o desvio padrão mudou.
+#   Com threshold = 0 o resultado é o mesmo de colorir cada quadro do zero (a menos de arredondamentos do filtro de desvio padrão).
+# Uso: SequenceTransfer(params).run(source_rgb, frames, writer) -> estatísticas da execução
+class SequenceTransfer:
+
+    def __init__(self, params=None, lockRemap=True, reuseMatches=True, threshold=0, cache=None):
+        self.transfer = GlobalTransfer(params, cache)
+        self.params = self.transfer.params
+        self.lockRemap = lockRemap
+        self.reuseMatches = reuseMatches and lockRemap
+        self.threshold = threshold
+        self.stats = {}
+
+    # Colore todos os quadros (qualquer iterável de imagens em tons de cinza) e os envia para writer
+    def run(self, source, frames, writer, progress=None):
+        params = self.params
+        start = time.perf_counter()
+        prepared = self.transfer.prepare(source)
+        prepareSeconds = time.perf_counter() - start
+
+        index = None
+        refLum = None  # Luminância usada no último matching de cada pixel
+        refStd = None  # Desvio padrão correspondente
+        chroma = None  # Canais alfa e beta atuais (uint8)
+        count = 0
+        matched = 0
+        pixels = 0
+
+        for frame in frames:
+            frameLum = frame.astype(np.float64)
+
+            # Remapeamento das amostras (fixo a partir do primeiro quadro com lockRemap)
+            if index is None or not self.lockRemap:
+                index = prepared.index.remapped(*lumRemapCoefficients(prepared.lum_mean, prepared.lum_std, np.mean(frameLum), np.std(frameLum)))
+
+            if not self.reuseMatches or refLum is None or refLum.shape != frameLum.shape:
+
+                # Quadro colorido do zero
+                refLum = frameLum
+                refStd = localStd(refLum, params.kernel_size)
+                coords = index.match(refLum, refStd)
+                chroma = prepared.lab[coords[:, 0], coords[:, 1], 1:].reshape(refLum.shape[0], refLum.shape[1], 2)
+                matched += refLum.size
+
+            else:
+
+                # Pixels que mudaram desde o último matching
+                changed = np.abs(frameLum - refLum) > self.threshold
+                if changed.any():
+                    refLum[changed] = frameLum[changed]
+                    matched += self.updateMatches(prepared, index, refLum, refStd, chroma, changed)
+
+            # Monta o quadro colorido: luminância do próprio quadro e cor dos matchings
+            lab = np.empty((frame.shape[0], frame.shape[1], 3), dtype=np.uint8)
+            lab[:, :, 0] = frame
+            lab[:, :, 1:] = chroma
+            writer.write(cv2.cvtColor(lab, cv2.COLOR_LAB2RGB))
+
+            count += 1
+            pixels += frame.size
+            if progress is not None:
+                progress(count, time.perf_counter() - start)
+
+        seconds = time.perf_counter() - start
+        self.stats = {
+            "frames": count,
+            "seconds": seconds,
+            "prepare_seconds": prepareSeconds,
+            "fps": count / seconds if seconds > 0 else 0.0,
+            "rematched_fraction": matched / pixels if pixels else 0.0,
+        }
+        return self.stats
+
+    # Atualiza o desvio padrão e os matchings na região afetada pelos pixels alterados (changed)
+    # Retorno: número de pixels refeitos
+    def updateMatches(self, prepared, index, refLum, refStd, chroma, changed):
+        size = self.params.kernel_size
+        halo = size // 2
+        height, width = refLum.shape
+
+        # Pixels cujo desvio padrão pode ter mudado: vizinhança dos pixels alterados
+        affected = cv2.dilate(changed.view(np.uint8), np.ones((2 * halo + 1, 2 * halo + 1), np.uint8)).astype(bool)
+
+        # Retângulo que envolve a região afetada, com halo para o cálculo do desvio padrão
+        rows = np.flatnonzero(affected.any(axis=1))
+        cols = np.flatnonzero(affected.any(axis=0))
+        top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        haloTop, haloLeft = max(top - halo, 0), max(left - halo, 0)
+        haloBottom, haloRight = min(bottom + halo, height), min(right + halo, width)
+        inner = (slice(top - haloTop, bottom - haloTop), slice(left - haloLeft, right - haloLeft))
+        refStd[top:bottom, left:right] = localStd(refLum[haloTop:haloBottom, haloLeft:haloRight], size)[inner]
+
+        # Refaz o matching apenas nos pixels afetados
+        coords = index.match(refLum[affected], refStd[affected])
+        chroma[affected] = prepared.lab[coords[:, 0], coords[:, 1], 1:]
+        return int(np.count_nonzero(affected))
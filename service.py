@@ -0,0 +1,574 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import base64
+import binascii
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass, fields, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cache import StageCache
+from loader import decodeImageBytes
+from transfer import TransferParams, GlobalTransfer, SwatchTransfer, SWATCH_JITTER_SAMPLES, checkParams, checkSwatchPairs
+from writer import WriteOptions, checkOptions, encodeImage
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Endereço padrão do serviço (apenas a máquina local)
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8350
+
+# Número máximo de requisições aceitas e ainda não respondidas (na fila ou em processamento); acima disso o serviço
+# responde 503 com Retry-After
+DEFAULT_QUEUE_SIZE = 32
+
+# Segundos sugeridos no Retry-After das respostas 503
+RETRY_AFTER = 1
+
+# Tamanho máximo do corpo de uma requisição (bytes)
+MAX_BODY_BYTES = 256 << 20
+
+# Tempo máximo de espera pelo resultado de uma requisição (segundos); depois disso o serviço responde 504
+REQUEST_TIMEOUT = 600.0
+
+# Tempo máximo de espera pelo aquecimento dos workers ao iniciar (segundos)
+WARMUP_TIMEOUT = 120.0
+
+# Uma requisição vai para o worker que já processou a sua source enquanto ele tiver no máximo AFFINITY_SLACK
+# requisições pendentes a mais que o worker menos ocupado; senão vai para o menos ocupado
+AFFINITY_SLACK = 2
+
+# Número de sources lembradas no roteamento por afinidade (as usadas há mais tempo são esquecidas primeiro)
+AFFINITY_ENTRIES = 1024
+
+# Número de sources decodificadas guardadas por worker
+WORKER_DECODED_SOURCES = 4
+
+# Tamanho padrão do cache de etapas de cada worker (bytes)
+WORKER_STAGE_BYTES = 512 << 20
+
+# Intervalo (segundos) entre as verificações de workers encerrados inesperadamente
+WORKER_CHECK_INTERVAL = 1.0
+
+# Número de requisições recentes usadas nos percentis de latência e janela (segundos) da vazão, em /metrics
+LATENCY_WINDOW = 1000
+THROUGHPUT_WINDOW = 60.0
+
+# Tipo de conteúdo das respostas para cada formato de imagem
+CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".tif": "image/tiff", ".tiff": "image/tiff",
+                 ".bmp": "image/bmp", ".webp": "image/webp", ".npy": "application/octet-stream"}
+
+# ------------------------------------------------------------------------------------
+# Service Errors ---------------------------------------------------------------------
+
+# Exceção lançada quando a fila de requisições está cheia
+class ServiceBusy(Exception):
+    pass
+
+# Exceção de uma requisição que falhou, com o código HTTP da resposta
+class RequestFailed(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# ------------------------------------------------------------------------------------
+# Service Job ------------------------------------------------------------------------
+
+# Requisição de transferência de cores já validada, enviada a um worker
+# - mode: "global" ou "swatches"
+# - source, target: bytes dos arquivos de imagem; sourceId: hash de source (roteamento por afinidade e cache do worker)
+# - pairs: pares de swatches ((x1, y1, x2, y2) na source, (x1, y1, x2, y2) na target), apenas no modo com swatches
+# - params: transfer.TransferParams; extension e options: formato e opções de gravação do resultado (writer.WriteOptions)
+@dataclass
+class ServiceJob:
+    mode: str
+    source: bytes
+    target: bytes
+    sourceId: str
+    pairs: list
+    params: TransferParams
+    extension: str = ".png"
+    options: WriteOptions = None
+
+# Função que decodifica um campo base64 da requisição
+def decodeField(request, name):
+    if not isinstance(request.get(name), str):
+        raise ValueError(f"'{name}' must be a base64 encoded image file")
+    try:
+        return base64.b64decode(request[name], validate=True)
+    except binascii.Error:
+        raise ValueError(f"'{name}' is not valid base64")
+
+# Função que monta um dataclass (parâmetros ou opções) a partir de um objeto JSON, recusando campos desconhecidos
+def dataclassFromJson(cls, base, values, name):
+    if not isinstance(values, dict):
+        raise ValueError(f"'{name}' must be an object")
+    known = {field.name for field in fields(cls)}
+    unknown = sorted(set(values) - known)
+    if unknown:
+        raise ValueError(f"Unknown {name}: {', '.join(unknown)}")
+    return replace(base, **values)
+
+# Função que converte o corpo JSON de uma requisição em um ServiceJob, verificando todos os campos.
+# Formato: {"mode": "global" | "swatches", "source": base64, "target": base64,
+#           "swatches": [[[x1, y1, x2, y2], [x1, y1, x2, y2]], ...], "params": {...}, "format": ".png", "options": {...}}
+# params são os campos de transfer.TransferParams e options os de writer.WriteOptions; cada worker processa uma
+# requisição por vez, então params.workers e params.query_workers são sempre 1.
+def parseJob(body):
+    try:
+        request = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(request, dict):
+        raise ValueError("The request must be a JSON object")
+
+    mode = request.get("mode", "global")
+    if mode not in ("global", "swatches"):
+        raise ValueError(f"Unknown mode '{mode}', expected 'global' or 'swatches'")
+    source = decodeField(request, "source")
+    target = decodeField(request, "target")
+
+    # Parâmetros, com os padrões de cada modo
+    if mode == "swatches":
+        samples = int(np.ceil(np.sqrt(SWATCH_JITTER_SAMPLES)))
+        base = TransferParams(jitter_m=samples, jitter_n=samples)
+    else:
+        base = TransferParams()
+    try:
+        params = replace(dataclassFromJson(TransferParams, base, request.get("params", {}), "params"), workers=1, query_workers=1)
+        options = dataclassFromJson(WriteOptions, WriteOptions(), request.get("options", {}), "options")
+    except TypeError as e:
+        raise ValueError(str(e))
+    checkParams(params)
+
+    # Pares de swatches
+    pairs = []
+    if mode == "swatches":
+        try:
+            pairs = [(tuple(int(v) for v in sourceRect), tuple(int(v) for v in targetRect)) for sourceRect, targetRect in request["swatches"]]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("'swatches' must be a list of [[x1, y1, x2, y2], [x1, y1, x2, y2]] pairs")
+        if not pairs or any(len(sourceRect) != 4 or len(targetRect) != 4 for sourceRect, targetRect in pairs):
+            raise ValueError("'swatches' must be a list of [[x1, y1, x2, y2], [x1, y1, x2, y2]] pairs")
+
+    # Formato do resultado
+    extension = request.get("format", ".png")
+    if not isinstance(extension, str) or extension.lower() not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported format '{extension}', expected one of {tuple(CONTENT_TYPES)}")
+    extension = extension.lower()
+    checkOptions("result" + extension, options)
+
+    sourceId = hashlib.blake2b(source, digest_size=16).hexdigest()
+    return ServiceJob(mode, source, target, sourceId, pairs, params, extension, options)
+
+# ------------------------------------------------------------------------------------
+# Worker Process ---------------------------------------------------------------------
+
+# Função que colore uma requisição no worker.
+# A source decodificada fica em um LRU (sources) pelo seu hash, e o cache de etapas (stages) guarda a conversão para
+# Lab, os mapas de desvio padrão e as amostras da source: requisições seguintes com a mesma source (que o roteamento
+# por afinidade manda para o mesmo worker) pulam essas etapas.
+# Retorno: tupla (bytes do resultado, informações da execução)
+def runJob(job, stages, sources):
+    source = sources.get(job.sourceId)
+    if source is None:
+        source = decodeImageBytes(job.source)
+        source.flags.writeable = False
+        sources[job.sourceId] = source
+        while len(sources) > WORKER_DECODED_SOURCES:
+            sources.popitem(last=False)
+    sources.move_to_end(job.sourceId)
+    target = decodeImageBytes(job.target, grayscale=True)
+
+    if job.mode == "swatches":
+        checkSwatchPairs(job.pairs, source.shape, target.shape)
+        transfer = SwatchTransfer(job.params, stages=stages)
+        result = transfer.run(source, target, job.pairs)
+    else:
+        transfer = GlobalTransfer(job.params, stages=stages)
+        result = transfer.run(source, target)
+
+    # A source foi reaproveitada quando as suas amostras (modo global) ou a sua conversão para Lab vieram do cache
+    stageSummary = transfer.stats.get("stages", {})
+    reused = "cached" in (stageSummary.get("sampling"), stageSummary.get("lab_conversion"))
+    return encodeImage(job.extension, result, job.options), {"source_reused": reused}
+
+# Função que aquece o worker: importações, alocações e codificadores do OpenCV ficam prontos antes da primeira requisição
+def warmUp():
+    rng = np.random.default_rng(0)
+    source = rng.integers(0, 256, (32, 32, 3), dtype=np.uint8)
+    target = rng.integers(0, 256, (32, 32), dtype=np.uint8)
+    result = GlobalTransfer(TransferParams(jitter_m=4, jitter_n=4, seed=0)).run(source, target)
+    SwatchTransfer(TransferParams(jitter_m=2, jitter_n=2, seed=0)).run(source, target, [((0, 0, 8, 8), (0, 0, 8, 8))])
+    encodeImage(".png", result)
+    encodeImage(".jpg", result)
+
+# Laço de cada processo worker: lê as requisições da sua fila (jobs) e manda as respostas para a fila compartilhada
+# (results). Mensagens: ("ready", worker), ("done", id, bytes, informações) e ("error", id, código HTTP, mensagem).
+def serviceWorker(index, jobs, results, stageBytes):
+    stages = StageCache(stageBytes)
+    sources = OrderedDict()
+    warmUp()
+    results.put(("ready", index))
+
+    while True:
+        message = jobs.get()
+        if message is None:
+            break
+        jobId, job = message
+        start = time.perf_counter()
+        try:
+            data, info = runJob(job, stages, sources)
+            info["seconds"] = time.perf_counter() - start
+            results.put(("done", jobId, data, info))
+        except ValueError as e:
+            results.put(("error", jobId, 400, str(e)))
+        except Exception as e:
+            results.put(("error", jobId, 500, f"{type(e).__name__}: {e}"))
+
+# ------------------------------------------------------------------------------------
+# Service Metrics --------------------------------------------------------------------
+
+# Contadores, latências e vazão do serviço (thread-safe), mostrados em /metrics
+class ServiceMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {"accepted": 0, "completed": 0, "failed": 0, "rejected": 0, "affinity_hits": 0, "source_reused": 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # (latência total, tempo de processamento) em segundos
+        self.finished = deque()  # instantes em que as requisições terminaram, dentro de THROUGHPUT_WINDOW
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    # Registra uma requisição respondida
+    def finish(self, latency, seconds, ok):
+        now = time.time()
+        with self.lock:
+            self.counters["completed" if ok else "failed"] += 1
+            if ok:
+                self.latencies.append((latency, seconds))
+            self.finished.append(now)
+            while self.finished and self.finished[0] < now - THROUGHPUT_WINDOW:
+                self.finished.popleft()
+
+    # Resumo (serializável em JSON): contadores, percentis de latência (ms) e vazão (requisições por segundo)
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            while self.finished and self.finished[0] < now - THROUGHPUT_WINDOW:
+                self.finished.popleft()
+            snapshot = dict(self.counters)
+            window = min(THROUGHPUT_WINDOW, now - self.started)
+            snapshot["throughput_rps"] = len(self.finished) / window if window > 0 else 0.0
+            latencies = np.array(self.latencies, dtype=np.float64).reshape(-1, 2)
+
+        for name, column in (("latency_ms", 0), ("processing_ms", 1)):
+            if len(latencies):
+                p50, p90, p99 = np.percentile(latencies[:, column] * 1000, [50, 90, 99])
+                snapshot[name] = {"p50": p50, "p90": p90, "p99": p99, "max": float(latencies[:, column].max() * 1000)}
+            else:
+                snapshot[name] = {}
+        return snapshot
+
+# ------------------------------------------------------------------------------------
+# Colorization Service ---------------------------------------------------------------
+
+# Processos worker e fila de requisições do serviço de transferência de cores.
+# Como funciona:
+# - Os workers são iniciados e aquecidos (warmUp) antes de o serviço aceitar requisições; cada um tem a sua fila e o
+#   seu cache de etapas, e processa uma requisição por vez.
+# - submit aceita no máximo queueSize requisições pendentes (na fila ou em processamento); acima disso lança
+#   ServiceBusy, e o servidor HTTP responde 503.
+# - Roteamento por afinidade: a requisição vai para o worker que já processou a sua source (que tem as amostras da
+#   source no cache de etapas), a menos que ele esteja com AFFINITY_SLACK requisições a mais que o menos ocupado.
+#   As requisições com a mesma source ficam em sequência na fila desse worker e reaproveitam a pré-computação.
+# - Uma thread (collect) recebe as respostas dos workers e completa o Future de cada requisição; se um worker
+#   termina inesperadamente, as suas requisições falham com 500 e ele deixa de receber requisições.
+# Uso:
+#     with ColorizationService(workers=4) as service:
+#         data, info = service.submit(parseJob(body)).result()
+class ColorizationService:
+
+    def __init__(self, workers=None, queueSize=DEFAULT_QUEUE_SIZE, stageBytes=WORKER_STAGE_BYTES):
+        self.queueSize = queueSize
+        self.metrics = ServiceMetrics()
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.requests = {}  # id -> (Future, worker, início)
+        self.affinity = OrderedDict()  # sourceId -> worker
+        self.closed = False
+
+        # Inicia os workers (antes de qualquer outra thread) e espera o aquecimento
+        context = multiprocessing.get_context()
+        self.results = context.Queue()
+        self.workers = []
+        for index in range(workers or os.cpu_count() or 1):
+            jobs = context.Queue()
+            process = context.Process(target=serviceWorker, args=(index, jobs, self.results, stageBytes), daemon=True)
+            process.start()
+            self.workers.append({"process": process, "jobs": jobs, "pending": set(), "alive": True})
+        self.waitReady()
+
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+
+    # Espera a mensagem "ready" de todos os workers
+    def waitReady(self):
+        deadline = time.monotonic() + WARMUP_TIMEOUT
+        ready = 0
+        while ready < len(self.workers):
+            try:
+                message = self.results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.close()
+                raise RuntimeError("Workers did not start in time")
+            if message[0] == "ready":
+                ready += 1
+
+    # Agenda uma requisição (ServiceJob). Retorno: Future com (bytes do resultado, informações da execução)
+    def submit(self, job):
+        with self.lock:
+            if self.closed or len(self.requests) >= self.queueSize:
+                self.metrics.count("rejected")
+                raise ServiceBusy(f"{len(self.requests)} requests pending")
+            worker = self.route(job.sourceId)
+            if worker is None:
+                raise RequestFailed(503, "No worker available")
+            jobId = next(self.ids)
+            future = Future()
+            self.requests[jobId] = (future, worker, time.perf_counter())
+            self.workers[worker]["pending"].add(jobId)
+        self.metrics.count("accepted")
+        self.workers[worker]["jobs"].put((jobId, job))
+        return future
+
+    # Escolhe o worker de uma requisição (chamada com o lock). Retorno: índice do worker, ou None
+    def route(self, sourceId):
+        alive = [index for index, worker in enumerate(self.workers) if worker["alive"]]
+        if not alive:
+            return None
+        least = min(alive, key=lambda index: len(self.workers[index]["pending"]))
+        owner = self.affinity.get(sourceId)
+        if owner is not None and self.workers[owner]["alive"] and \
+                len(self.workers[owner]["pending"]) <= len(self.workers[least]["pending"]) + AFFINITY_SLACK:
+            self.metrics.count("affinity_hits")
+            chosen = owner
+        else:
+            chosen = least
+
+        self.affinity[sourceId] = chosen
+        self.affinity.move_to_end(sourceId)
+        while len(self.affinity) > AFFINITY_ENTRIES:
+            self.affinity.popitem(last=False)
+        return chosen
+
+    # Thread que recebe as respostas dos workers
+    def collect(self):
+        lastCheck = time.monotonic()
+        while not self.closed:
+            try:
+                message = self.results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                message = None
+            except (EOFError, OSError):
+                break
+            if message is not None and message[0] in ("done", "error"):
+                self.complete(message)
+            if time.monotonic() - lastCheck >= WORKER_CHECK_INTERVAL:
+                self.checkWorkers()
+                lastCheck = time.monotonic()
+
+    # Completa o Future de uma requisição respondida por um worker
+    def complete(self, message):
+        with self.lock:
+            entry = self.requests.pop(message[1], None)
+            if entry is None:
+                return
+            future, worker, start = entry
+            self.workers[worker]["pending"].discard(message[1])
+        latency = time.perf_counter() - start
+
+        if message[0] == "done":
+            _, _, data, info = message
+            info = dict(info, worker=worker, latency=latency)
+            if info["source_reused"]:
+                self.metrics.count("source_reused")
+            self.metrics.finish(latency, info["seconds"], True)
+            future.set_result((data, info))
+        else:
+            _, _, status, error = message
+            self.metrics.finish(latency, 0.0, False)
+            future.set_exception(RequestFailed(status, error))
+
+    # Marca os workers encerrados e falha as suas requisições pendentes
+    def checkWorkers(self):
+        failed = []
+        with self.lock:
+            for index, worker in enumerate(self.workers):
+                if worker["alive"] and not worker["process"].is_alive():
+                    worker["alive"] = False
+                    for jobId in worker["pending"]:
+                        failed.append(self.requests.pop(jobId)[0])
+                    worker["pending"].clear()
+        for future in failed:
+            self.metrics.finish(0.0, 0.0, False)
+            future.set_exception(RequestFailed(500, "Worker process exited"))
+
+    # Resumo do serviço: métricas, profundidade da fila e estado dos workers
+    def snapshot(self):
+        with self.lock:
+            depth = len(self.requests)
+            workers = [{"pending": len(worker["pending"]), "alive": worker["alive"]} for worker in self.workers]
+        return dict(self.metrics.snapshot(), queue_depth=depth, queue_size=self.queueSize, workers=workers)
+
+    # Encerra os workers (as requisições pendentes são descartadas)
+    def close(self):
+        self.closed = True
+        for worker in self.workers:
+            if worker["process"].is_alive():
+                worker["jobs"].put(None)
+        for worker in self.workers:
+            worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ------------------------------------------------------------------------------------
+# HTTP Server ------------------------------------------------------------------------
+
+# Tratamento das requisições HTTP (uma thread por conexão, ThreadingHTTPServer):
+#   POST /colorize  corpo JSON (ver parseJob) -> imagem de resultado; 400 (requisição inválida), 503 (fila cheia),
+#                   500 (falha no worker) ou 504 (tempo esgotado), com {"error": mensagem}
+#   GET /metrics    métricas do serviço (JSON)
+#   GET /health     estado dos workers (JSON)
+class ServiceHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/metrics":
+            self.sendJson(200, service.snapshot())
+        elif self.path == "/health":
+            alive = sum(worker["alive"] for worker in service.workers)
+            self.sendJson(200 if alive else 503, {"workers": len(service.workers), "alive": alive})
+        else:
+            self.sendJson(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/colorize":
+            self.sendJson(404, {"error": f"Unknown path {self.path}"})
+            return
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.sendJson(411, {"error": "Content-Length is required"})
+            return
+        if int(length) > MAX_BODY_BYTES:
+            self.sendJson(413, {"error": f"Request larger than {MAX_BODY_BYTES} bytes"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(int(length))
+
+        try:
+            job = parseJob(body)
+            data, info = self.server.service.submit(job).result(timeout=REQUEST_TIMEOUT)
+        except ValueError as e:
+            self.sendJson(400, {"error": str(e)})
+            return
+        except ServiceBusy as e:
+            self.sendJson(503, {"error": f"Service busy: {e}"}, {"Retry-After": str(RETRY_AFTER)})
+            return
+        except RequestFailed as e:
+            self.sendJson(e.status, {"error": str(e)})
+            return
+        except FutureTimeout:
+            self.sendJson(504, {"error": "Timed out"})
+            return
+
+        self.send(200, data, CONTENT_TYPES[job.extension], {
+            "X-Worker": str(info["worker"]),
+            "X-Processing-Seconds": f"{info['seconds']:.4f}",
+            "X-Source-Reused": str(int(info["source_reused"])),
+        })
+
+    # Envia uma resposta
+    def send(self, status, data, contentType, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def sendJson(self, status, value, headers=None):
+        self.send(status, json.dumps(value, default=float).encode(), "application/json", headers)
+
+    # Mensagens de log apenas com verbose
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+# Servidor HTTP do serviço
+class ServiceServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+        self.verbose = verbose
+
+# Função que inicia o serviço e atende requisições até ser interrompido (Ctrl+C)
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, queueSize=DEFAULT_QUEUE_SIZE, stageBytes=WORKER_STAGE_BYTES, verbose=False):
+    with ColorizationService(workers, queueSize, stageBytes) as service:
+        with ServiceServer((host, port), service, verbose) as server:
+            print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]} with {len(service.workers)} workers")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+# ------------------------------------------------------------------------------------
+# Client -----------------------------------------------------------------------------
+
+# Função que envia uma transferência de cores ao serviço (ex.: em testes ou scripts na máquina local).
+# source e target são os bytes dos arquivos de imagem; swatches, params e options seguem o formato de parseJob.
+# Retorno: tupla (bytes do resultado, cabeçalhos da resposta). Erros do serviço são lançados como RequestFailed.
+def requestColorize(url, source, target, mode="global", swatches=None, params=None, format=".png", options=None, timeout=REQUEST_TIMEOUT):
+    body = {"mode": mode, "source": base64.b64encode(source).decode(), "target": base64.b64encode(target).decode(),
+            "params": params or {}, "format": format, "options": options or {}}
+    if swatches is not None:
+        body["swatches"] = swatches
+    request = urllib.request.Request(url.rstrip("/") + "/colorize", data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read(), dict(response.headers)
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read())["error"]
+        except (ValueError, KeyError):
+            message = e.reason
+        raise RequestFailed(e.code, message)
@@ -0,0 +1,41 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import json
+
+import tkinter as tk
+from tkinter import filedialog, messagebox
+
+from instrument import formatReport
+
+# ------------------------------------------------------------------------------------
+# Stats Window -----------------------------------------------------------------------
+
+# Função que abre uma janela com o resumo da última transferência de cores (etapas, contadores, memória e informações
+# do processo), com um botão para exportar o resumo em JSON.
+# report é o dicionário de Instrumentation.report (com "stats"), ou None se nenhuma transferência terminou ainda.
+def showStats(parent, report):
+    if report is None:
+        messagebox.showinfo("Stats", "Run a color transfer first.")
+        return
+
+    window = tk.Toplevel(parent)
+    window.title("Stats")
+
+    # Resumo em texto (somente leitura)
+    text = tk.Text(window, width=80, height=24)
+    text.insert("1.0", formatReport(report))
+    text.config(state="disabled")
+    text.pack(padx=10, pady=(10, 5), fill="both", expand=True)
+
+    # Exporta o resumo em JSON
+    def export():
+        path = filedialog.asksaveasfilename(parent=window, defaultextension=".json", filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if path:
+            try:
+                with open(path, "w") as f:
+                    json.dump(report, f, indent=2, default=str)
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to export stats: {e}", parent=window)
+
+    tk.Button(window, text="Export JSON", command=export).pack(pady=(0, 10))
@@ -2,15 +2,21 @@
 # Bibliotecas ------------------------------------------------------------------------
 
 import numpy as np
-from scipy.ndimage import generic_filter
-import cv2
-import random
+import os
 
 import tkinter as tk
 from tkinter import *
 from tkinter import filedialog, messagebox
 from tkinter.simpledialog import askinteger
-from PIL import Image, ImageTk
+
+from transfer import TransferParams, SwatchTransfer
+from cache import StageCache
+from background import runInBackground, whenDone
+from loader import ImageLoader
+from instrument import Instrumentation
+from statsview import showStats
+from viewport import Viewport
+from writer import AsyncWriter, WriteOptions, checkOptions
 
 # ------------------------------------------------------------------------------------
 # Constantes -------------------------------------------------------------------------
@@ -22,6 +28,8 @@ NEIGHBOURHOOD_KERNEL_SIZE = 5
 JITTER_SAMPLES = 50
 JITTER_SAMPLES_M = int(np.ceil(np.sqrt(JITTER_SAMPLES)))
 JITTER_SAMPLES_N = JITTER_SAMPLES_M
+STRATIFIED_SAMPLING = 0 # Distribui as M*N amostras da source no espaço (luminância, desvio padrão) em vez da grade espacial MxN
+SEED = None # Semente do jitter sampling (None sorteia novas amostras a cada execução; com semente os pares de swatches já coloridos ficam no cache de etapas)
 
 # Constantes relativas aos swatches
 MAX_SWATCHES = 10
@@ -31,6 +39,18 @@ SWATCH_DEFAULT_HEIGHT = 50
 
 # Constantes relativas ao texture synthesis
 WINDOW_SIZE = 5  # Tamanho da janela de vizinhança para síntese de textura
+ANN_MODE = 0 # Busca aproximada (PCA + árvore KD) das janelas dos swatches, para swatches grandes
+SWATCH_WORKERS = os.cpu_count() or 1 # Threads que colorem os pares de swatches em paralelo
+ANN_CANDIDATES = 8 # Candidatos da busca aproximada comparados com a distância exata (mais candidatos = mais preciso e mais lento)
+
+# Mede o pico de memória de cada etapa (tracemalloc) no resumo do menu Stats; deixa a transferência mais lenta
+TRACK_MEMORY = 0
+
+# Opções de gravação do resultado (menu File > Save); o formato é dado pela extensão do arquivo
+PNG_COMPRESSION = 3 # Nível de compressão dos arquivos PNG (0 a 9; menor é mais rápido)
+JPEG_QUALITY = 95 # Qualidade dos arquivos JPEG (0 a 100)
+SAVE_16_BIT = 0 # Grava 16 bits por canal (PNG, TIFF ou .npy)
+SAVE_LAB = 0 # Grava o resultado em Lab float32 (TIFF ou .npy)
 
 # ------------------------------------------------------------------------------------
 # Definição das imagens envolvidas no processo de transferência de cores
@@ -41,14 +61,28 @@ result = None
 # Definição dos swatches nas imagens
 swatches = []
 
+# Cache das imagens decodificadas: reabrir uma imagem usada há pouco não lê o arquivo de novo.
+# Os arrays são somente leitura e compartilhados entre a tela e o processo de transferência de cores.
+image_loader = ImageLoader()
+
+# Transferência de cores em andamento (background.BackgroundTask)
+running_task = None
+
+# Gravação do resultado em segundo plano: a interface continua respondendo enquanto a imagem é codificada
+result_writer = AsyncWriter()
+
+# Cache em memória das etapas da transferência de cores: ao mudar uma configuração, só as etapas que dependem dela são refeitas
+stage_cache = StageCache()
+
+# Resumo da última transferência de cores (etapas, contadores e informações do processo), mostrado no menu Stats
+last_report = None
+
 # ------------------------------------------------------------------------------------
 # Set Default Image ------------------------------------------------------------------
 
 # Função que coloca a imagem default no display informado
 def setDefaultImg(display):
-    default = ImageTk.PhotoImage(file="img/default.jpg")
-    display.config(image=default)
-    display.image = default
+    display.show(image_loader.load("img/default.jpg"))
 
 # ------------------------------------------------------------------------------------
 # Add Swatch -------------------------------------------------------------------------
@@ -84,8 +118,10 @@ def add_swatch(event, image_type):
     if not width or not height:
         return
 
-    # Determina as coordenadas do retângulo, respeitando os limites da imagem
-    x1, y1 = event.x, event.y
+    # Determina as coordenadas do retângulo na imagem em resolução total (o clique é no canvas, que pode estar com zoom),
+    # respeitando os limites da imagem
+    display = source_display if image_type == "source" else target_display
+    x1, y1 = display.toImage(event.x, event.y)
     x2, y2 = min(x1 + width, img_width), min(y1 + height, img_height)
 
     # Determina a cor para o novo swatch
@@ -102,10 +138,8 @@ def add_swatch(event, image_type):
         "color": color
     })
 
-    # Desenha o retângulo
-    display = source_display if image_type == "source" else target_display
-    canvas = display.canvas
-    canvas.create_rectangle(x1, y1, x2, y2, outline=color, width=2)
+    # Desenha o retângulo (guardado em coordenadas da imagem, acompanha o zoom e o pan)
+    display.addRectangle((x1, y1, x2, y2), color)
 
 # ------------------------------------------------------------------------------------
 # Clear Swatch -----------------------------------------------------------------------
@@ -120,30 +154,13 @@ def clear_swatches(image_type):
         # Filtra os swatches que não correspondem ao tipo especificado
         swatches = [s for s in swatches if s["type"] != image_type]
 
-        # Redesenha o canvas
+        # Remove os retângulos da imagem
         if image_type == "source":
             display = source_display
         else:
             display = target_display
 
-        canvas = display.canvas
-        canvas.delete("all")
-        canvas.create_image(0, 0, anchor=NW, image=display.image)
-
-# ------------------------------------------------------------------------------------
-# Configure Canvas -------------------------------------------------------------------
-
-# Função que configura o canvas para ter o mesmo tamanho da imagem e exibir swatches sobrepostos.
-def configure_canvas(display, image):
-
-    # Remove o canvas existente, se houver
-    if hasattr(display, "canvas") and display.canvas is not None:
-        display.canvas.destroy()
-
-    canvas = Canvas(display, width=image.shape[1], height=image.shape[0], bg="white", highlightthickness=0)
-    canvas.pack(fill=BOTH, expand=True)
-    canvas.create_image(0, 0, anchor=NW, image=display.image)
-    return canvas
+        display.clearRectangles()
 
 # ------------------------------------------------------------------------------------
 # Configure Canvas Events ------------------------------------------------------------
@@ -156,81 +173,6 @@ def configure_canvas_events():
     if target is not None:
         target_display.canvas.bind("<Button-1>", lambda event: add_swatch(event, "target"))
 
-# ------------------------------------------------------------------------------------
-# Luminance Remapping ----------------------------------------------------------------
-
-# Função que realiza o Luminance Remapping sobre a imagem A
-def lumRemap(lumA, lumB):
-   
-   # Pega a média das luminâncias de ambas imagens
-   meanA = np.mean(lumA)
-   meanB = np.mean(lumB)
-
-   # Pega o desvio padrão das luminâncias de ambas imagens
-   stdA = np.std(lumA)
-   stdB = np.std(lumB)
-
-   # Evita divisão por zero
-   if stdA == 0:
-      stdA = 1
-   stdB_A = stdB/stdA
-
-   # Remapeia os valores da imagem A e retorna
-   return stdB_A * (lumA - meanA) + meanB
-
-# ------------------------------------------------------------------------------------
-# Jitter Sampling --------------------------------------------------------------------
-
-# Função para amostragem jitterizada e armazenamento de coordenadas
-# Como funciona:
-# - A imagem é dividida em uma grade de MxN blocos.
-# - Para cada bloco, um ponto é selecionado aleatoriamente dentro de seus limites. Isso é feito para evitar padrões fixos.
-# Retorno: três arrays
-# 1) Coordenadas de cada amostra na imagem original
-# 2) Valor da luminância de cada amostra
-# 3) Desvio padrão relativo a cada amostra (usa os valores pré-calculados e recebidos como argumento na função)
-def jitterSampling(img, M, N, imgStd):
-
-    # Cria vetores que armazenam coordenadas, valores de luminância e desvio padrão, respectivamente
-    coord = []
-    lum = []
-    std = []
-
-    # Calcula o tamanho dos passos a partir do tamanho dos MxN blocos indicados
-    stepX = img.shape[0] // M  # Tamanho do passo em linhas
-    stepY = img.shape[1] // N  # Tamanho do passo em colunas
-
-    # Pega MxN amostras
-    for i in range(M):
-        for j in range(N):
-
-            # Coordenada x aleatória
-            x = random.randint(i * stepX, min((i + 1) * stepX - 1, img.shape[0] - 1))
-
-            # Coordenada y aleatória
-            y = random.randint(j * stepY, min((j + 1) * stepY - 1, img.shape[1] - 1))
-
-            # Guarda as coordenadas, valores de luminância e desvio padrão
-            coord.append((x, y))
-            lum.append(img[x, y])
-            std.append(imgStd[x, y])
-
-    # Retorna os vetores
-    return np.array(coord), np.array(lum), np.array(std)
-
-# ------------------------------------------------------------------------------------
-# Best Matching Color ----------------------------------------------------------------
-
-# Função que encontra a melhor cor de match da imagem source a ser usada na imagem target com base em luminância (50%) e desvio padrão (50%)
-def bestMatch(target, targetStd, source, sourceCoord, sourceStd):
-
-    # Calcula uma "distância" para cada amostra, que é a soma das diferenças quadráticas entre as luminância e entre os desvios padrões.
-    # Os pesos (50% cada) estão implícitos na fórmula, tratando igualmente as diferenças quadradas para luminância e desvio padrão.
-    distances = (source - target)**2 + (sourceStd - targetStd)**2  # Distância ponderada
-
-    # Retorna as coordenadas da melhor correspondência (menor distância)
-    return sourceCoord[np.argmin(distances)]
-
 # ------------------------------------------------------------------------------------
 # Show Result Image ------------------------------------------------------------------
 
@@ -239,68 +181,38 @@ def showResult(result, display):
 
     global NEIGHBOURHOOD_KERNEL_SIZE, JITTER_SAMPLES, JITTER_SAMPLES_M, JITTER_SAMPLES_N
 
-    # Configura a imagem e o display indicado para mostra-la na tela.
-    result = Image.fromarray(result)
-    result = ImageTk.PhotoImage(result)
-    display.config(image = result)
-    display.image = result
-
-# ------------------------------------------------------------------------------------
-# Texture Synthesis ------------------------------------------------------------------
-# Função que faz a síntese de texturas dos swatches coloridos para os pixels não coloridos.
-def texture_synthesis(colorized_swatches, result_img, result_mask):
-
-    # Aplica padding para evitar problemas em bordas.
-    half_size = WINDOW_SIZE // 2
-    size = 2*half_size
-    result_pad = cv2.copyMakeBorder(result_img, size, size, size, size, cv2.BORDER_REPLICATE)
-    mask_pad = cv2.copyMakeBorder(result_mask, size, size, size, size, cv2.BORDER_REPLICATE)
-    swatches_pad = {}
-    for k in range(len(colorized_swatches)):
-        swatches_pad[k] = cv2.copyMakeBorder(colorized_swatches[k], size, size, size, size, cv2.BORDER_REPLICATE)
-
-    # Iterando pelos pixels da imagem de resultado em passos de 2*d
-    for i in range(size, result_pad.shape[0]-half_size, size):
-        for j in range(size, result_pad.shape[1]-half_size, size):
-
-            # Ignora janelas completamente marcadas
-            if all(mask_pad[i+dx, j+dy] == 1 for dx in [-half_size, half_size] for dy in [-half_size, half_size]):
-                continue
-
-            # Extraindo janela de vizinhança do canal de luminância (L)
-            temp = result_pad[i-half_size:i+half_size, j-half_size:j+half_size, 0]
-            min_error = float('inf')  # Inicializando erro mínimo
-            best_patch = None
-
-            # Comparando com todos os swatches
-            for swatch in swatches_pad.values():
-                # Iterando pelas janelas dentro do swatch
-                for l in range(size, swatch.shape[0]-half_size, size):
-                    for m in range(size, swatch.shape[1]-half_size, size):
-                        each = swatch[l-half_size:l+half_size, m-half_size:m+half_size, 0]
-                        error = np.sum((temp - each) ** 2)  # Calculando erro
-
-                        # Atualizando a melhor correspondência
-                        if error < min_error:
-                            min_error = error
-                            best_patch = swatch[l-half_size:l+half_size, m-half_size:m+half_size]
-            
-            # Aplicando a melhor correspondência de cor (A e B)
-            if best_patch is not None:
-                result_pad[i-half_size:i+half_size, j-half_size:j+half_size, 1:] = best_patch[:, :, 1:]
-            else:
-                print("aaaaaaaaaa")
-
-    # Retorna o resultado sem o padding
-    return result_pad[size:-size, size:-size]
+    # Mostra a imagem no display indicado (prévia do tamanho da tela, com zoom e pan)
+    display.show(result)
 
 # ------------------------------------------------------------------------------------
 # Transferring Color to Greyscale Images ---------------------------------------------
 
-# Algoritmo do processo de transferência de cores
+# Parâmetros do processo de transferência de cores a partir das configurações atuais
+def currentParams():
+    return TransferParams(
+        kernel_size=NEIGHBOURHOOD_KERNEL_SIZE,
+        jitter_m=JITTER_SAMPLES_M,
+        jitter_n=JITTER_SAMPLES_N,
+        sampler="stratified" if STRATIFIED_SAMPLING else "jitter",
+        window_size=WINDOW_SIZE,
+        ann=bool(ANN_MODE),
+        ann_candidates=ANN_CANDIDATES,
+        workers=SWATCH_WORKERS,
+        executor="thread",  # a transferência roda em um thread de fundo, de onde não é seguro criar processos (fork)
+        seed=SEED,
+    )
+
+# Algoritmo do processo de transferência de cores.
+# A transferência roda em segundo plano (background.runInBackground), com janela de progresso e opção de cancelar;
+# a interface continua respondendo e só é atualizada quando o resultado fica pronto (showTransferResult).
 def colorTransfer(display):
-    global source, target, result
-   
+    global source, target, running_task
+
+    # Não permite iniciar uma nova transferência enquanto outra está em andamento
+    if running_task is not None and running_task.running():
+        messagebox.showinfo("Process", "A color transfer process is already running.")
+        return
+
     # Verifica se as imagens foram selecionadas
     if source is not None and target is not None:
         global swatches
@@ -315,31 +227,12 @@ def colorTransfer(display):
             # Verifica se há pelo menos um swatch
             if source_count != 0:
 
-                # Converte a imagem source para o espaço de cores Lab
-                sourceLab = cv2.cvtColor(source, cv2.COLOR_RGB2Lab)
-                
-                # Converte para tipo float64 para maior precisão
-                sourceLab = sourceLab.astype(np.float64)
-                targetLum = target.astype(np.float64)
-                
-                # Pega a luminância da imagem source
-                sourceLum = sourceLab[:,:,0]
-
-                # Configura variável que guarda o resultado do processo
-                result_aux = np.zeros((targetLum.shape[0], targetLum.shape[1], 3))  # Inicializa o array do resultado
-                result_aux[:, :, 0] = targetLum  # Copia o canal de luminância da imagem target
-
-                # Configura variável que guarda quais pixels da imagem de resultado estão coloridos após o processo sobre o par de swatches
-                result_colorized_pixels = np.zeros((targetLum.shape[0], targetLum.shape[1]))
-
-                # Configura variável que guarda os swatches do resultado
-                result_swatches = {}  # Inicializa o array do resultado
-
                 global SWATCH_COLORS
                 source_idx = 0
                 target_idx = 0
 
-                # Passa por cada par de swatches
+                # Monta a lista de pares de swatches (na ordem das cores)
+                pairs = []
                 for i in range(source_count):
 
                     # Pega o índice dos par de swatches
@@ -351,64 +244,23 @@ def colorTransfer(display):
                                 target_idx = j
 
                     # Pega as coordenadas das imagens capturadas pelo respectivo swatch
-                    source_coords = swatches[source_idx]["coords"]
-                    target_coords = swatches[target_idx]["coords"]
-
-                    # Pega o pedaço da imagem referente ao respectivo swatch
-                    sourceLab_patch = sourceLab[source_coords[1]:source_coords[3], source_coords[0]:source_coords[2]]
-                    source_patch = sourceLum[source_coords[1]:source_coords[3], source_coords[0]:source_coords[2]]
-                    target_patch = targetLum[target_coords[1]:target_coords[3], target_coords[0]:target_coords[2]]
-
-                    # Realiza o Luminance Remapping sobre a imagem source
-                    sourceRemap = lumRemap(source_patch, target_patch)
-
-                    # Pré-computa o desvio padrão dos valores de luminância de vizinhanças 5x5 em cada imagem.
-                    sourceStd = generic_filter(sourceRemap, np.std, size = NEIGHBOURHOOD_KERNEL_SIZE)
-                    targetStd = generic_filter(target_patch, np.std, size = NEIGHBOURHOOD_KERNEL_SIZE)
-
-                    # Realiza Jitter Sampling para diminuir o número de amostras necessárias da imagem source
-                    sourceSamplesCoord, sourceSamplesLum, sourceSamplesStd = jitterSampling(sourceRemap, JITTER_SAMPLES_M, JITTER_SAMPLES_N, sourceStd)
-
-                    # Configura variável que guarda o resultado do processo sobre o par de swatches
-                    result_patch = np.zeros((target_patch.shape[0], target_patch.shape[1], 3))  # Inicializa o array do resultado
-                    result_patch[:, :, 0] = target_patch  # Copia o canal de luminância da imagem target
-
-                    # Loop para colorir cada pixel da imagem
-                    for m in range(result_patch.shape[0]):
-                        for n in range(result_patch.shape[1]):
-                        
-                            # Encontra a melhor cor de match para o pixel, onde a cor é dada pelos índices dos canais alfa e beta da imagem source
-                            [a, b] = bestMatch(result_patch[m][n][0], targetStd[m][n], sourceSamplesLum, sourceSamplesCoord, sourceSamplesStd)
-
-                            # Pega os valores dos canais alfa e beta do pixel da imagem original
-                            alpha_channel = sourceLab_patch[a][b][1]  # Canal alpha
-                            beta_channel = sourceLab_patch[a][b][2]  # Canal beta
-
-                            # Salva os valores dos canais alfa e beta na imagem resultante
-                            result_patch[m][n][1] = alpha_channel
-                            result_patch[m][n][2] = beta_channel
+                    pairs.append((swatches[source_idx]["coords"], swatches[target_idx]["coords"]))
 
-                    # Salva as novas cores na imagem de resultado
-                    result_aux[target_coords[1]:target_coords[3], target_coords[0]:target_coords[2]] = result_patch
+                # Realiza a transferência de cores com swatches (transfer.SwatchTransfer) fora da thread da interface,
+                # com os parâmetros e imagens desta execução
+                params = currentParams()
+                source_img, target_img = source, target
+                track_memory = bool(TRACK_MEMORY)
 
-                    # Indica que o pixel foi colorido
-                    result_colorized_pixels[target_coords[1]:target_coords[3], target_coords[0]:target_coords[2]] = 1
+                def work(progress):
+                    instrument = Instrumentation(memory=track_memory)
+                    try:
+                        transfer = SwatchTransfer(params, instrument=instrument, progress=progress, stages=stage_cache)
+                        return transfer.run(source_img, target_img, pairs), transfer, instrument
+                    finally:
+                        instrument.close()
 
-                    # Salva o swatch da imagem de resultado
-                    result_swatches[i] = result_patch
-                
-                # Realiza a síntese de texturas para colorir a imagem
-                result = texture_synthesis(result_swatches, result_aux, result_colorized_pixels)
-                
-                # Configura imagem do resultado
-                result = result.astype('uint8')  # Converte o resultado para tipo uint8
-                result = cv2.cvtColor(result, cv2.COLOR_LAB2RGB)  # Converte para RGB
-
-                # Mostra imagem de resultado na tela
-                showResult(result, display)
-
-                # Avisa que o processo terminou
-                messagebox.showinfo("Process", "The color transfer process was successful!")
+                running_task = runInBackground(result_window, work, lambda done: showTransferResult(done, display))
 
             else:
                 messagebox.showinfo("Error", "At least one swatch must be selected in each image.")
@@ -417,6 +269,19 @@ def colorTransfer(display):
     else:
         messagebox.showinfo("Unfound file", "You must select source and target images.")
       
+# Função que mostra o resultado de uma transferência concluída (chamada na thread da interface)
+def showTransferResult(done, display):
+    global result, last_report
+    result, transfer, instrument = done
+    # Etapas, cache de etapas e recall da busca aproximada ficam no relatório (janela Stats)
+    last_report = dict(instrument.report(), stats=transfer.stats)
+
+    # Mostra imagem de resultado na tela
+    showResult(result, display)
+
+    # Avisa que o processo terminou
+    messagebox.showinfo("Process", "The color transfer process was successful!")
+
 # ------------------------------------------------------------------------------------
 # Root Window Destruction ------------------------------------------------------------
 
@@ -439,26 +304,19 @@ def OpenFile(image_type, display, grayscale):
         # Limpa swatches e canvas antigo caso existam
         clear_swatches(image_type)
 
-        # Lê o arquivo
-        img = cv2.imread(file)
+        # Lê o arquivo (ou pega a imagem do cache): a imagem target em tons de cinza, a source em RGB
+        img = image_loader.load(file, grayscale=grayscale)
         if grayscale:
-            # Caso for a imagem target, a mesma deve estar em tons de cinza
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
             # Salva a imagem target na variável
             global target
             target = img
         else:
-            # Caso contrário, é source, e a convertemos para o espaço de cores RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
             # Salva a imagem source na variável
             global source
             source = img
         
-        # Configura a imagem e o display indicado para mostra-la na tela.
-        image = Image.fromarray(img)
-        image = ImageTk.PhotoImage(image)
-        display.image = image
-        display.canvas = configure_canvas(display, img)
+        # Mostra a imagem no display indicado (prévia do tamanho da tela, com zoom e pan)
+        display.show(img)
 
         # Configura eventos nos canvas
         configure_canvas_events()
@@ -480,12 +338,35 @@ def openSettings():
 
     def saveSettings():
         try:
-            global NEIGHBOURHOOD_KERNEL_SIZE, JITTER_SAMPLES_M, JITTER_SAMPLES_N, WINDOW_SIZE
+            global NEIGHBOURHOOD_KERNEL_SIZE, JITTER_SAMPLES_M, JITTER_SAMPLES_N, WINDOW_SIZE, ANN_MODE, ANN_CANDIDATES, SWATCH_WORKERS, TRACK_MEMORY, SEED, STRATIFIED_SAMPLING, PNG_COMPRESSION, JPEG_QUALITY, SAVE_16_BIT, SAVE_LAB
             # Obtém os novos valores das entradas e atualiza as constantes
             NEIGHBOURHOOD_KERNEL_SIZE = int(kernel_size_entry.get())
             JITTER_SAMPLES_M = int(jitter_samples_m_entry.get())
             JITTER_SAMPLES_N = int(jitter_samples_n_entry.get())
+            STRATIFIED_SAMPLING = stratified_sampling_var.get()
             WINDOW_SIZE = int(window_size_entry.get())
+            ann_candidates = int(ann_candidates_entry.get())
+            if ann_candidates < 1:
+                raise ValueError
+            ANN_CANDIDATES = ann_candidates
+            ANN_MODE = ann_mode_var.get()
+            swatch_workers = int(swatch_workers_entry.get())
+            if swatch_workers < 1:
+                raise ValueError
+            SWATCH_WORKERS = swatch_workers
+            TRACK_MEMORY = track_memory_var.get()
+            seed = int(seed_entry.get()) if seed_entry.get().strip() else None
+            if seed is not None and seed < 0:
+                raise ValueError
+            SEED = seed
+            png_compression = int(png_compression_entry.get())
+            jpeg_quality = int(jpeg_quality_entry.get())
+            if not 0 <= png_compression <= 9 or not 0 <= jpeg_quality <= 100:
+                raise ValueError
+            PNG_COMPRESSION = png_compression
+            JPEG_QUALITY = jpeg_quality
+            SAVE_16_BIT = save_16_bit_var.get()
+            SAVE_LAB = save_lab_var.get()
 
             # Fecha a janela de configurações
             settings_window.destroy()
@@ -505,6 +386,9 @@ def openSettings():
     kernel_size_entry.insert(0, str(NEIGHBOURHOOD_KERNEL_SIZE))
     kernel_size_entry.grid(row=0, column=1, padx=10, pady=5)
 
+    stratified_sampling_var = tk.IntVar(value=STRATIFIED_SAMPLING)
+    tk.Checkbutton(settings_window, text="Stratified sampling (luminance, std)", variable=stratified_sampling_var).grid(row=1, column=0, columnspan=2, padx=10, pady=5)
+
     tk.Label(settings_window, text="Jitter M:").grid(row=2, column=0, padx=10, pady=5)
     jitter_samples_m_entry = tk.Entry(settings_window)
     jitter_samples_m_entry.insert(0, str(JITTER_SAMPLES_M))
@@ -520,33 +404,79 @@ def openSettings():
     window_size_entry.insert(0, str(WINDOW_SIZE))
     window_size_entry.grid(row=4, column=1, padx=10, pady=5)
 
+    ann_mode_var = tk.IntVar(value=ANN_MODE)
+    tk.Checkbutton(settings_window, text="Approximate patch search", variable=ann_mode_var).grid(row=5, column=0, columnspan=2, padx=10, pady=5)
+
+    tk.Label(settings_window, text="ANN candidates:").grid(row=6, column=0, padx=10, pady=5)
+    ann_candidates_entry = tk.Entry(settings_window)
+    ann_candidates_entry.insert(0, str(ANN_CANDIDATES))
+    ann_candidates_entry.grid(row=6, column=1, padx=10, pady=5)
+
+    tk.Label(settings_window, text="Workers:").grid(row=7, column=0, padx=10, pady=5)
+    swatch_workers_entry = tk.Entry(settings_window)
+    swatch_workers_entry.insert(0, str(SWATCH_WORKERS))
+    swatch_workers_entry.grid(row=7, column=1, padx=10, pady=5)
+
+    tk.Label(settings_window, text="Seed (empty = random):").grid(row=8, column=0, padx=10, pady=5)
+    seed_entry = tk.Entry(settings_window)
+    seed_entry.insert(0, "" if SEED is None else str(SEED))
+    seed_entry.grid(row=8, column=1, padx=10, pady=5)
+
+    track_memory_var = tk.IntVar(value=TRACK_MEMORY)
+    tk.Checkbutton(settings_window, text="Track memory in Stats (slower)", variable=track_memory_var).grid(row=9, column=0, columnspan=2, padx=10, pady=5)
+
+    tk.Label(settings_window, text="PNG compression (0-9):").grid(row=10, column=0, padx=10, pady=5)
+    png_compression_entry = tk.Entry(settings_window)
+    png_compression_entry.insert(0, str(PNG_COMPRESSION))
+    png_compression_entry.grid(row=10, column=1, padx=10, pady=5)
+
+    tk.Label(settings_window, text="JPEG quality (0-100):").grid(row=11, column=0, padx=10, pady=5)
+    jpeg_quality_entry = tk.Entry(settings_window)
+    jpeg_quality_entry.insert(0, str(JPEG_QUALITY))
+    jpeg_quality_entry.grid(row=11, column=1, padx=10, pady=5)
+
+    save_16_bit_var = tk.IntVar(value=SAVE_16_BIT)
+    tk.Checkbutton(settings_window, text="Save 16 bits per channel (PNG, TIFF, NPY)", variable=save_16_bit_var).grid(row=12, column=0, columnspan=2, padx=10, pady=5)
+
+    save_lab_var = tk.IntVar(value=SAVE_LAB)
+    tk.Checkbutton(settings_window, text="Save as float Lab (TIFF, NPY)", variable=save_lab_var).grid(row=13, column=0, columnspan=2, padx=10, pady=5)
+
     # Botão para salvar as configurações
-    tk.Button(settings_window, text="Salvar", command=saveSettings).grid(row=5, column=0, columnspan=2, pady=10)
+    tk.Button(settings_window, text="Salvar", command=saveSettings).grid(row=14, column=0, columnspan=2, pady=10)
 
 # ------------------------------------------------------------------------------------
 # Save Image -------------------------------------------------------------------------
 
-# Função para salvar a imagem gerada
-def saveImage(display):
+# Função para salvar a imagem gerada.
+# O resultado é gravado a partir do array em resolução total, em segundo plano (writer.AsyncWriter), no formato dado
+# pela extensão escolhida e com as opções de gravação das configurações.
+def saveImage():
     global result
     if result is not None:
-        try:
-            # Pega a imagem atualmente exibida no display
-            image = display.image._PhotoImage__photo  # Acessa o objeto interno da imagem
-            if image:
-                # Abre a janela de diálogo para salvar o arquivo
-                file_path = filedialog.asksaveasfilename(defaultextension=".png",
-                                                        filetypes=[("PNG files", "*.png"),
-                                                                    ("JPEG files", "*.jpg"),
-                                                                    ("All files", "*.*")])
-                if file_path:
-                    # Salva a imagem no local especificado
-                    image.write(file_path, format="png")
-                    messagebox.showinfo("Save Image", "Image saved successfully!")
-            else:
-                messagebox.showerror("Error", "No image to save.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save image: {e}")
+        # Abre a janela de diálogo para salvar o arquivo
+        file_path = filedialog.asksaveasfilename(defaultextension=".png",
+                                                filetypes=[("PNG files", "*.png"),
+                                                            ("JPEG files", "*.jpg"),
+                                                            ("TIFF files", "*.tif"),
+                                                            ("NumPy arrays", "*.npy"),
+                                                            ("All files", "*.*")])
+        if file_path:
+            options = WriteOptions(png_compression=PNG_COMPRESSION, jpeg_quality=JPEG_QUALITY, depth=16 if SAVE_16_BIT else 8, lab=bool(SAVE_LAB))
+            try:
+                checkOptions(file_path, options)
+            except ValueError as e:
+                messagebox.showerror("Error", f"Failed to save image: {e}")
+                return
+
+            # Grava em segundo plano e avisa quando terminar; a thread da interface nunca espera por uma vaga (com gravações
+            # demais pendentes, pede para tentar de novo)
+            future = result_writer.submit(file_path, result, options, blocking=False)
+            if future is None:
+                messagebox.showinfo("Save Image", "Previous images are still being saved. Please wait and try again.")
+                return
+            whenDone(result_window, future,
+                     lambda _: messagebox.showinfo("Save Image", "Image saved successfully!"),
+                     lambda e: messagebox.showerror("Error", f"Failed to save image: {e}"))
 
 # ------------------------------------------------------------------------------------
 # Interface --------------------------------------------------------------------------
@@ -565,8 +495,8 @@ source_window.geometry("+0+0")
 source_menu_bar = Menu(source_window)
 
 # Display da imagem (começa com imagem default)
-source_display = tk.Label(source_window)
-source_display.pack()
+source_display = Viewport(source_window)
+source_display.pack(fill=BOTH, expand=True)
 setDefaultImg(source_display)
 
 # Configura as opções da barra de menu
@@ -593,8 +523,8 @@ target_window.geometry("+500+0")
 target_menu_bar = Menu(target_window)
 
 # Display da imagem (começa com imagem default)
-target_display = tk.Label(target_window)
-target_display.pack()
+target_display = Viewport(target_window)
+target_display.pack(fill=BOTH, expand=True)
 setDefaultImg(target_display)
 
 # Configura as opções da barra de menu
@@ -623,14 +553,14 @@ result_window.geometry("+1000+0")
 result_menu_bar = Menu(result_window)
 
 # Display da imagem (começa com imagem default)
-result_display = tk.Label(result_window)
-result_display.pack()
+result_display = Viewport(result_window)
+result_display.pack(fill=BOTH, expand=True)
 setDefaultImg(result_display)
 
 # Configura as opções da barra de menu
 result_apply_menu = Menu(result_menu_bar, tearoff= 0)
 result_save_menu = Menu(result_menu_bar, tearoff=0)
-result_save_menu.add_command(label="Save", command=lambda: saveImage(result_display))
+result_save_menu.add_command(label="Save", command=saveImage)
 result_menu_bar.add_cascade(label="File", menu=result_save_menu)
 result_apply_menu.add_command(label= "Apply", command = lambda: colorTransfer(result_display))
 result_menu_bar.add_cascade(label= "Process", menu = result_apply_menu)
@@ -643,6 +573,9 @@ result_window.protocol("WM_DELETE_WINDOW", on_toplevel_close)
 # Adiciona um botão na janela principal para abrir as configurações
 result_menu_bar.add_command(label="Settings", command=openSettings)
 
+# Adiciona um botão para ver o resumo (etapas, contadores e memória) da última transferência
+result_menu_bar.add_command(label="Stats", command=lambda: showStats(result_window, last_report))
+
 # ------------------------------------------------------------------------------------
 
 # Mantém o loop da janela principal
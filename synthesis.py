@@ -0,0 +1,361 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from matching import MATCH_CHUNK_ELEMENTS, QUERY_WORKERS
+from instrument import NULL_INSTRUMENTATION
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Tamanho da janela de vizinhança para síntese de textura
+WINDOW_SIZE = 5
+
+# Modo aproximado: número de componentes principais em que as janelas são projetadas
+ANN_COMPONENTS = 6
+
+# Modo aproximado: número de candidatos buscados na árvore e comparados com a distância exata
+# (quanto maior, mais próximo da busca exata e mais lento)
+ANN_CANDIDATES = 8
+
+# Número de janelas da imagem resultado comparadas por bloco na síntese; o progresso é informado a cada bloco
+SYNTHESIS_BLOCK_WINDOWS = 4096
+
+# Número de janelas (sorteadas) usadas para medir o recall do modo aproximado em relação à busca exata
+RECALL_CHECK_WINDOWS = 2000
+
+# ------------------------------------------------------------------------------------
+# Patch Extraction -------------------------------------------------------------------
+
+# Função que devolve o início das janelas percorridas em uma dimensão de tamanho length: de 2*d em 2*d, começando em -d,
+# como no laço original da síntese de texturas sobre a imagem com padding de 2*d pixels (sem o padding).
+def windowStarts(length, half_size):
+    return np.arange(-half_size, length, 2*half_size)
+
+# Função que devolve os índices das janelas percorridas em uma dimensão de tamanho length: uma linha por janela,
+# com as 2*d posições que ela cobre. As posições fora da imagem são levadas para a borda mais próxima, o que
+# equivale ao padding BORDER_REPLICATE sem copiar a imagem.
+# Retorno: array (número de janelas, 2*d)
+def windowIndices(length, half_size):
+    return np.clip(windowStarts(length, half_size)[:, None] + np.arange(2*half_size), 0, length - 1)
+
+# Função que extrai as janelas de img dadas pelos índices de linha e coluna (windowIndices) de cada janela.
+# Retorno: array (número de janelas, 2*d, 2*d, ...) com uma cópia de cada janela.
+def extractPatches(img, rowIndices, colIndices):
+    return img[rowIndices[:, :, None], colIndices[:, None, :]]
+
+# Função que devolve a metade da janela de síntese, verificando o tamanho
+def halfWindow(window_size):
+    half_size = window_size // 2
+    if half_size == 0:
+        raise ValueError("window_size must be at least 2")
+    return half_size
+
+# Função que encontra as janelas da imagem resultado que precisam ser coloridas: as que não têm os quatro cantos
+# (nas posições -d e +d em relação ao centro de cada janela, como no laço original) marcados na máscara.
+# Retorno: tupla (índices das linhas e das colunas de cada janela da grade, linha e coluna de cada janela pendente na grade)
+def pendingWindows(result_mask, half_size):
+    height, width = result_mask.shape
+    rows = windowIndices(height, half_size)
+    cols = windowIndices(width, half_size)
+    marked = np.ones((len(rows), len(cols)), dtype=bool)
+    for dx in [0, 2*half_size]:
+        for dy in [0, 2*half_size]:
+            cornerRows = np.clip(windowStarts(height, half_size) + dx, 0, height - 1)
+            cornerCols = np.clip(windowStarts(width, half_size) + dy, 0, width - 1)
+            marked &= result_mask[np.ix_(cornerRows, cornerCols)] == 1
+    pending_rows, pending_cols = np.nonzero(~marked)
+    return rows, cols, pending_rows, pending_cols
+
+# Função que monta a matriz de luminância (float64, uma janela por linha) das janelas pendentes (pendingWindows) de lum
+def windowLum(lum, rows, cols, pending_rows, pending_cols):
+    patches = extractPatches(lum, rows[pending_rows], cols[pending_cols])
+    return patches.reshape(len(patches), -1).astype(np.float64)
+
+# Função que extrai as janelas (em passos de 2*d, na ordem linha, coluna) de um swatch colorido (Lab).
+# Retorno: (luminância, uma janela por linha, com o dtype do swatch; canais alfa e beta, array (janelas, 2*d, 2*d, 2))
+def swatchWindows(swatch, half_size):
+    rows = windowIndices(swatch.shape[0], half_size)
+    cols = windowIndices(swatch.shape[1], half_size)
+    patches = extractPatches(swatch, np.repeat(rows, len(cols), axis=0), np.tile(cols, (len(rows), 1)))
+    return patches[:, :, :, 0].reshape(len(patches), -1), patches[:, :, :, 1:]
+
+# Função que escreve em result_img os canais alfa e beta das janelas escolhidas (chosen: índice em ab da janela
+# escolhida para cada posição da grade, -1 onde não há), em faixas de linhas: cada pixel pertence a uma única janela da grade.
+def applyWindows(result_img, chosen, ab, half_size):
+    size = 2*half_size
+    height, width = result_img.shape[:2]
+    gridRow, offsetRow = np.divmod(np.arange(height) + half_size, size)
+    gridCol, offsetCol = np.divmod(np.arange(width) + half_size, size)
+    bandRows = max(1, SYNTHESIS_BLOCK_WINDOWS * size * size // max(1, width))
+    for top in range(0, height, bandRows):
+        band = slice(top, top + bandRows)
+        window = chosen[gridRow[band, None], gridCol[None, :]]
+        fill = window >= 0
+        r, c = np.nonzero(fill)
+        result_img[top + r, c, 1:] = ab[window[fill], offsetRow[band][r], offsetCol[c]]
+
+# ------------------------------------------------------------------------------------
+# Swatch Patches ---------------------------------------------------------------------
+
+# Janelas de todos os swatches coloridos, prontas para a busca da melhor correspondência.
+# Como funciona:
+# - As janelas de luminância (em passos de 2*d) são extraídas uma única vez em uma matriz (uma janela por linha),
+#   na mesma ordem do laço original: swatch, linha, coluna. Os canais alfa e beta ficam em um array paralelo.
+# - Janelas de luminância repetidas (comuns em regiões uniformes) são comparadas uma única vez: apenas a primeira
+#   ocorrência de cada uma (distinct, em ordem crescente de posição) participa da busca.
+# - match compara um lote de janelas com as janelas distintas dos swatches, em blocos, pela forma ||a||² + ||b||² - 2a·b
+#   (produto de matrizes). Como a luminância tem valores inteiros, tanto o erro float64 do laço original quanto essa
+#   forma são exatos, e o np.argmin (primeiro mínimo) escolhe a mesma janela que o laço original (verificado por
+#   benchmark.py verify).
+class SwatchPatches:
+
+    def __init__(self, colorized_swatches, window_size=WINDOW_SIZE, chunkElements=MATCH_CHUNK_ELEMENTS):
+        half_size = halfWindow(window_size)
+        size = 2*half_size
+        self.half_size = half_size
+        self.chunkElements = chunkElements
+
+        lum = []
+        ab = []
+        for k in range(len(colorized_swatches)):
+            swatchLum, swatchAb = swatchWindows(colorized_swatches[k], half_size)
+            lum.append(swatchLum)
+            ab.append(swatchAb)
+        self.lum = np.concatenate(lum).astype(np.float64) if lum else np.empty((0, size*size))
+        self.ab = np.concatenate(ab) if ab else np.empty((0, size, size, 2), dtype=np.uint8)
+
+        # Primeira ocorrência de cada janela de luminância, em ordem de posição
+        self.distinct = np.sort(np.unique(self.lum, axis=0, return_index=True)[1]) if len(self.lum) else np.empty(0, dtype=np.intp)
+        self.norm = np.sum(self.lum[self.distinct] ** 2, axis=1)
+
+    # Número de janelas dos swatches
+    def __len__(self):
+        return len(self.lum)
+
+    # Função que encontra, para cada janela de lum (uma por linha), o índice da janela dos swatches de menor erro
+    def match(self, lum):
+        return self.exactMatch(lum)
+
+    # Número de comparações de janelas (distâncias calculadas) feitas por match para windows janelas
+    def comparisons(self, windows):
+        return windows * len(self.distinct)
+
+    # Busca exata (ver descrição da classe)
+    def exactMatch(self, lum):
+        return self.exactSearch(lum)[0]
+
+    # Busca exata que também devolve o erro da janela escolhida, sem o termo ||a||² (o mesmo para todas as janelas
+    # dos swatches, então os erros de buscas em swatches diferentes podem ser comparados entre si).
+    # Retorno: (índice da janela escolhida, erro) para cada janela de lum
+    def exactSearch(self, lum):
+        patches = self.lum[self.distinct]
+        best = np.empty(len(lum), dtype=np.intp)
+        bestError = np.empty(len(lum), dtype=np.float64)
+        chunk = max(1, self.chunkElements // max(1, len(patches)))
+        for start in range(0, len(lum), chunk):
+            # Calculando erro: ||b||² - 2a·b (o termo ||a||² é o mesmo em toda a linha e não muda o np.argmin), sem temporários
+            error = lum[start:start + chunk] @ patches.T
+            error *= -2
+            error += self.norm
+            best[start:start + chunk] = np.argmin(error, axis=1)
+            bestError[start:start + chunk] = error[np.arange(len(error)), best[start:start + chunk]]
+        return self.distinct[best], bestError
+
+# Índice aproximado das janelas dos swatches, para swatches grandes (o custo da busca exata cresce com a área deles).
+# Como funciona:
+# - As janelas de luminância distintas são projetadas em uma base PCA de components dimensões (calculada sobre as
+#   próprias janelas) e indexadas em uma árvore KD, uma única vez por transferência.
+# - match busca na árvore os candidates vizinhos mais próximos de cada janela no espaço reduzido e escolhe entre eles
+#   pela distância exata (empates resolvidos pela menor posição, como na busca exata).
+# - candidates é o ajuste entre precisão e velocidade: com candidates igual ao número de janelas dos swatches o
+#   resultado é o mesmo da busca exata.
+# (components também troca precisão por velocidade, mas com menos efeito: as janelas têm apenas (2*d)² dimensões.)
+class PatchIndex(SwatchPatches):
+
+    def __init__(self, colorized_swatches, window_size=WINDOW_SIZE, components=ANN_COMPONENTS, candidates=ANN_CANDIDATES, chunkElements=MATCH_CHUNK_ELEMENTS, workers=QUERY_WORKERS):
+        super().__init__(colorized_swatches, window_size, chunkElements)
+        self.workers = workers  # threads de cada consulta à árvore (matching.QUERY_WORKERS)
+        self.candidates = max(1, min(candidates, len(self.distinct)))
+        self.components = max(1, min(components, self.lum.shape[1]))
+        self.tree = None
+        if len(self.lum) == 0:
+            return
+
+        # Base PCA das janelas de luminância
+        patches = self.lum[self.distinct]
+        self.mean = patches.mean(axis=0)
+        basis = np.linalg.svd(patches - self.mean, full_matrices=False)[2]
+        self.basis = basis[:self.components].T
+        self.tree = cKDTree(self.project(patches))
+
+    # Projeta janelas de luminância (uma por linha) na base PCA
+    def project(self, lum):
+        return (lum - self.mean) @ self.basis
+
+    # Número de comparações exatas (a busca na árvore não é contada)
+    def comparisons(self, windows):
+        return windows * self.candidates if self.tree is not None else super().comparisons(windows)
+
+    # Busca aproximada (ver descrição da classe)
+    def match(self, lum):
+        if self.tree is None or len(lum) == 0:
+            return self.exactMatch(lum)
+
+        # Candidatos mais próximos no espaço reduzido
+        candidates = self.distinct[self.tree.query(self.project(lum), k=self.candidates, workers=self.workers)[1].reshape(len(lum), -1)]
+
+        # Distância exata para cada candidato; o menor erro vence e empates ficam com a menor posição
+        error = np.sum((lum[:, None, :] - self.lum[candidates]) ** 2, axis=2)
+        tied = error == error.min(axis=1, keepdims=True)
+        return np.where(tied, candidates, len(self.lum)).min(axis=1)
+
+# Função que mede o quanto o índice aproximado se afasta da busca exata nas janelas pendentes da imagem resultado.
+# Retorno: dicionário com o recall (fração das janelas verificadas, até checkWindows sorteadas, em que o índice encontra
+# uma janela de erro mínimo), same_window (fração em que encontra exatamente a janela da busca exata; difere do recall
+# quando há empates) e error_ratio (razão média entre o erro da janela encontrada e o erro mínimo; 1 = exato).
+def patchRecall(index, result_img, result_mask, checkWindows=RECALL_CHECK_WINDOWS, seed=0):
+    rows, cols, pending_rows, pending_cols = pendingWindows(result_mask, index.half_size)
+    if len(pending_rows) == 0 or len(index) == 0:
+        return {"recall": 1.0, "same_window": 1.0, "error_ratio": 1.0, "checked_windows": 0}
+
+    # Sorteia as janelas verificadas
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(pending_rows), size=min(checkWindows, len(pending_rows)), replace=False)
+    check = windowLum(result_img[:, :, 0], rows, cols, pending_rows[chosen], pending_cols[chosen])
+
+    approx = index.match(check)
+    exact = index.exactMatch(check)
+    approxError = np.sum((check - index.lum[approx]) ** 2, axis=1)
+    exactError = np.sum((check - index.lum[exact]) ** 2, axis=1)
+    ratio = np.where(exactError > 0, approxError / np.maximum(exactError, 1e-12), np.where(approxError > 0, np.inf, 1.0))
+
+    return {
+        "recall": float(np.mean(approxError == exactError)),
+        "same_window": float(np.mean(approx == exact)),
+        "error_ratio": float(np.mean(ratio[np.isfinite(ratio)])) if np.isfinite(ratio).any() else float("inf"),
+        "checked_windows": int(len(check)),
+    }
+
+# ------------------------------------------------------------------------------------
+# Texture Synthesis ------------------------------------------------------------------
+
+# Função que faz a síntese de texturas dos swatches coloridos para os pixels não coloridos.
+# Como funciona:
+# - As janelas não coloridas da imagem resultado são comparadas com as janelas dos swatches (patches: SwatchPatches para
+#   a busca exata, o padrão, ou PatchIndex para a busca aproximada), em blocos de SYNTHESIS_BLOCK_WINDOWS janelas.
+# - As bordas são tratadas pelos índices das janelas (windowIndices), sem cópias com padding da imagem e da máscara.
+# - Os canais alfa e beta das janelas escolhidas são escritos diretamente em result_img, em faixas de linhas:
+#   cada pixel pertence a uma única janela da grade.
+# - Com progress (progress.Progress), o andamento é informado a cada bloco (o que também permite cancelar a síntese).
+# - instrument (instrument.Instrumentation) recebe os contadores de janelas ignoradas (quatro cantos já coloridos),
+#   janelas buscadas e comparações de janelas.
+# As janelas da imagem resultado não se sobrepõem e só os canais alfa e beta são alterados, então a ordem de
+# processamento não muda o resultado.
+# Retorno: result_img (alterada no próprio array)
+def texture_synthesis(colorized_swatches, result_img, result_mask, window_size=WINDOW_SIZE, patches=None, progress=None, instrument=NULL_INSTRUMENTATION):
+    if patches is None:
+        patches = SwatchPatches(colorized_swatches, window_size)
+
+    # Janelas da imagem resultado, ignorando as que têm os quatro cantos marcados
+    half_size = patches.half_size
+    rows, cols, pending_rows, pending_cols = pendingWindows(result_mask, half_size)
+    pending = len(pending_rows)
+    instrument.count("windows_skipped", len(rows) * len(cols) - pending)
+    if pending == 0 or len(patches) == 0:
+        return result_img
+    instrument.count("windows_searched", pending)
+    instrument.count("patch_comparisons", patches.comparisons(pending))
+
+    # Melhor janela dos swatches para cada janela pendente
+    best = np.empty(pending, dtype=np.intp)
+    if progress is not None:
+        progress.update("texture synthesis", 0, pending)
+    for start in range(0, pending, SYNTHESIS_BLOCK_WINDOWS):
+        stop = min(start + SYNTHESIS_BLOCK_WINDOWS, pending)
+        best[start:stop] = patches.match(windowLum(result_img[:, :, 0], rows, cols, pending_rows[start:stop], pending_cols[start:stop]))
+        if progress is not None:
+            progress.update("texture synthesis", stop, pending)
+
+    # Janela escolhida para cada posição da grade (-1 onde a janela não é pendente)
+    chosen = np.full((len(rows), len(cols)), -1, dtype=np.intp)
+    chosen[pending_rows, pending_cols] = best
+
+    # Aplicando a melhor correspondência de cor (A e B): cada pixel recebe o pixel correspondente da janela escolhida
+    applyWindows(result_img, chosen, patches.ab, half_size)
+    return result_img
+
+# ------------------------------------------------------------------------------------
+# Incremental Texture Synthesis ------------------------------------------------------
+
+# Resultado da busca exata de um único swatch nas janelas da grade da imagem resultado (as mesmas de pendingWindows),
+# preenchido sob demanda: só as janelas pendentes ainda não buscadas são comparadas com as janelas do swatch.
+# Apenas a luminância do swatch e da imagem é usada, então o resultado não depende das cores nem dos outros swatches
+# e pode ser guardado por swatch e reaproveitado quando outros pares são adicionados, removidos ou movidos
+# (synthesizeFromMatches): ao adicionar um par, só o swatch novo é buscado; ao remover, só as janelas que ele cobria.
+# - best: índice da melhor janela no swatch para cada posição da grade (-1 onde ainda não foi buscada)
+# - error: erro dessa janela, sem o termo ||a||² (comparável entre swatches)
+class WindowMatches:
+
+    def __init__(self, swatchLum, result_shape, window_size=WINDOW_SIZE):
+        self.swatchLum = np.ascontiguousarray(swatchLum)
+        self.window_size = window_size
+        half_size = halfWindow(window_size)
+        grid = (len(windowStarts(result_shape[0], half_size)), len(windowStarts(result_shape[1], half_size)))
+        self.best = np.full(grid, -1, dtype=np.intp)
+        self.error = np.full(grid, np.inf)
+
+    # Função que busca as janelas (grid_rows, grid_cols) ainda não buscadas, em blocos de SYNTHESIS_BLOCK_WINDOWS.
+    # Retorno: número de janelas buscadas
+    def search(self, lum, rows, cols, grid_rows, grid_cols, instrument=NULL_INSTRUMENTATION):
+        missing = self.best[grid_rows, grid_cols] < 0
+        grid_rows, grid_cols = grid_rows[missing], grid_cols[missing]
+        windows = len(grid_rows)
+        if windows == 0:
+            return 0
+        patches = SwatchPatches({0: self.swatchLum[:, :, None]}, self.window_size)
+        instrument.count("patch_comparisons", patches.comparisons(windows))
+        for start in range(0, windows, SYNTHESIS_BLOCK_WINDOWS):
+            block = slice(start, start + SYNTHESIS_BLOCK_WINDOWS)
+            best, error = patches.exactSearch(windowLum(lum, rows, cols, grid_rows[block], grid_cols[block]))
+            self.best[grid_rows[block], grid_cols[block]] = best
+            self.error[grid_rows[block], grid_cols[block]] = error
+        return windows
+
+# Função que faz a síntese de texturas (busca exata) a partir das buscas de cada swatch (WindowMatches, na ordem
+# de colorized_swatches). As janelas pendentes que ainda não foram buscadas em algum swatch são buscadas nele; depois,
+# cada janela pendente fica com a janela de menor erro entre os swatches, e os empates com o primeiro swatch, como na
+# busca sobre todos os swatches juntos. O resultado é idêntico ao de texture_synthesis com SwatchPatches.
+# O contador windows_searched conta uma busca por janela e swatch.
+# Retorno: result_img (alterada no próprio array)
+def synthesizeFromMatches(colorized_swatches, matches, result_img, result_mask, window_size=WINDOW_SIZE, progress=None, instrument=NULL_INSTRUMENTATION):
+    half_size = halfWindow(window_size)
+    rows, cols, pending_rows, pending_cols = pendingWindows(result_mask, half_size)
+    pending = len(pending_rows)
+    instrument.count("windows_skipped", len(rows) * len(cols) - pending)
+    if pending == 0 or len(matches) == 0:
+        return result_img
+
+    # Busca as janelas pendentes que faltam em cada swatch
+    if progress is not None:
+        progress.update("texture synthesis", 0, len(matches))
+    for k, match in enumerate(matches):
+        instrument.count("windows_searched", match.search(result_img[:, :, 0], rows, cols, pending_rows, pending_cols, instrument))
+        if progress is not None:
+            progress.update("texture synthesis", k + 1, len(matches))
+
+    # Swatch de menor erro para cada janela pendente
+    errors = np.stack([match.error[pending_rows, pending_cols] for match in matches])
+    swatch = np.argmin(errors, axis=0)
+    local = np.stack([match.best[pending_rows, pending_cols] for match in matches])[swatch, np.arange(pending)]
+
+    # Índice da janela escolhida nos canais alfa e beta de todos os swatches (concatenados na ordem dos swatches)
+    ab = [swatchWindows(colorized_swatches[k], half_size)[1] for k in range(len(colorized_swatches))]
+    offsets = np.concatenate([[0], np.cumsum([len(a) for a in ab])[:-1]]).astype(np.intp)
+    chosen = np.full((len(rows), len(cols)), -1, dtype=np.intp)
+    chosen[pending_rows, pending_cols] = offsets[swatch] + local
+
+    applyWindows(result_img, chosen, np.concatenate(ab), half_size)
+    return result_img
@@ -0,0 +1,132 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import cv2
+
+from matching import transferChroma, buildChromaLut, applyChromaLut
+from neighbourhood import localStd
+from transfer import GlobalTransfer, lumRemapCoefficients, readTarget
+from writer import StreamingWriter
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Tamanho padrão (em pixels) do lado de cada tile
+TILE_SIZE = 1024
+
+# Maior desvio padrão possível de valores entre 0 e 255; usado como limite da tabela de lookup,
+# já que o máximo real só seria conhecido depois de passar por todos os tiles
+MAX_LUM_STD = 127.5
+
+# ------------------------------------------------------------------------------------
+# Target Input -----------------------------------------------------------------------
+
+# Função que abre a imagem target para o processamento em tiles.
+# Arquivos .npy (array 2-D uint8) são abertos com mmap e lidos sob demanda; outros formatos são decodificados
+# uma única vez em tons de cinza (1 byte por pixel).
+def openTarget(path):
+    if path.lower().endswith(".npy"):
+        target = np.load(path, mmap_mode="r")
+        if target.ndim != 2 or target.dtype != np.uint8:
+            raise ValueError(f"{path}: expected a 2-D uint8 array, got {target.shape} {target.dtype}")
+        return target
+    return readTarget(path)
+
+# ------------------------------------------------------------------------------------
+# Streaming Statistics ---------------------------------------------------------------
+
+# Função que calcula a média e o desvio padrão da luminância percorrendo a imagem em faixas de linhas,
+# sem converter a imagem inteira para float (primeira passada do modo em tiles).
+# As faixas são combinadas pela fórmula de Chan et al. (média e soma dos quadrados dos desvios), que é estável numericamente.
+def streamingMeanStd(img, rows=TILE_SIZE):
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    for start in range(0, img.shape[0], rows):
+        block = np.asarray(img[start:start + rows], dtype=np.float64)
+        blockCount = block.size
+        blockMean = block.mean()
+        blockM2 = np.sum((block - blockMean) ** 2)
+
+        # Combina a faixa com o acumulado
+        delta = blockMean - mean
+        total = count + blockCount
+        mean += delta * blockCount / total
+        m2 += blockM2 + delta * delta * count * blockCount / total
+        count = total
+
+    return mean, np.sqrt(m2 / count)
+
+# ------------------------------------------------------------------------------------
+# Tiled Transfer ---------------------------------------------------------------------
+
+# Transferência de cores global em tiles, para imagens target que não cabem na memória.
+# Como funciona:
+# - Primeira passada: média e desvio padrão da target em faixas (streamingMeanStd), usados no Luminance Remapping.
+# - Segunda passada: cada tile é lido com uma borda extra (halo) de kernel_size//2 pixels, de modo que o desvio
+#   padrão da vizinhança nas bordas do tile seja o mesmo da imagem inteira; o halo é descartado depois do cálculo.
+# - O resultado (RGB uint8) é escrito tile a tile no arquivo de saída (writer.StreamingWriter: .npy mapeado em memória,
+#   PNG codificado por faixas de tiles), então o pico de memória depende do tamanho do tile e não do tamanho da imagem.
+# Uso: TiledTransfer(params, tileSize).run(source_rgb, target_gray, outputPath, options)
+class TiledTransfer:
+
+    def __init__(self, params=None, tileSize=TILE_SIZE, cache=None):
+        self.transfer = GlobalTransfer(params, cache)
+        self.params = self.transfer.params
+        self.tileSize = tileSize
+        self.stats = {}
+
+    # Colore a imagem target e grava o resultado em outputPath, com as opções de gravação options (writer.WriteOptions).
+    # outputPath .npy recebe o array diretamente (e o resultado é devolvido como memmap somente leitura).
+    def run(self, source, target, outputPath, options=None):
+        prepared = self.transfer.prepare(source)
+        with StreamingWriter(outputPath, target.shape, options) as writer:
+            self.apply(prepared, target, writer)
+        if outputPath.lower().endswith(".npy"):
+            return np.load(outputPath, mmap_mode="r")
+
+    # Colore a imagem target a partir da source pré-computada, escrevendo o resultado tile a tile em writer
+    # (writer.StreamingWriter; as faixas de tiles são escritas de cima para baixo)
+    def apply(self, prepared, target, writer):
+        params = self.params
+        height, width = target.shape
+        halo = params.kernel_size // 2
+        tile = self.tileSize
+
+        # Primeira passada: estatísticas globais da luminância da target e remapeamento das amostras
+        meanB, stdB = streamingMeanStd(target, tile)
+        index = prepared.index.remapped(*lumRemapCoefficients(prepared.lum_mean, prepared.lum_std, meanB, stdB))
+
+        # Com tabela de lookup, ela é montada uma única vez para todos os tiles
+        lut = buildChromaLut(prepared.lab, index, MAX_LUM_STD, params.lut_std_step) if params.lut else None
+
+        # Segunda passada: tiles com halo
+        tiles = 0
+        for top in range(0, height, tile):
+            for left in range(0, width, tile):
+                bottom, right = min(top + tile, height), min(left + tile, width)
+
+                # Lê o tile com o halo (limitado às bordas da imagem)
+                haloTop, haloLeft = max(top - halo, 0), max(left - halo, 0)
+                haloBottom, haloRight = min(bottom + halo, height), min(right + halo, width)
+                tileLum = np.asarray(target[haloTop:haloBottom, haloLeft:haloRight], dtype=np.float64)
+
+                # Desvio padrão da vizinhança calculado com o halo e recortado para o tile
+                inner = (slice(top - haloTop, bottom - haloTop), slice(left - haloLeft, right - haloLeft))
+                tileStd = localStd(tileLum, params.kernel_size)[inner]
+                tileLum = tileLum[inner]
+
+                # Colore o tile (Lab uint8, com os canais alfa e beta escritos diretamente)
+                tileLab = np.empty((tileLum.shape[0], tileLum.shape[1], 3), dtype=np.uint8)
+                tileLab[:, :, 0] = tileLum
+                if lut is not None:
+                    applyChromaLut(lut, tileLab, tileLum, tileStd, params.lut_std_step)
+                else:
+                    transferChroma(tileLab, prepared.lab, index.match(tileLum, tileStd))
+
+                # Converte para RGB (no próprio tile) e escreve no resultado
+                writer.write(top, left, cv2.cvtColor(tileLab, cv2.COLOR_LAB2RGB, dst=tileLab))
+                tiles += 1
+
+        self.stats = {"tiles": tiles, "tile_size": tile, "target_mean": meanB, "target_std": stdB}
@@ -0,0 +1,719 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import cv2
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+
+from matching import QUERY_WORKERS, SampleIndex, bestMatchSamples, transferChroma, buildChromaLut, applyChromaLut, lutDeviation
+from neighbourhood import localStd, localStdRows, guidedUpsample
+from sampling import sampleSource, samplingRng, SAMPLERS
+from synthesis import texture_synthesis, SwatchPatches, PatchIndex, patchRecall, WindowMatches, synthesizeFromMatches
+from instrument import NULL_INSTRUMENTATION
+from cache import NULL_STAGE_CACHE
+from progress import Progress
+from loader import decodeImage
+from writer import writeImage
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Número aproximado de pixels da target por faixa de linhas no matching; o progresso é informado (e o cancelamento
+# verificado) a cada faixa
+PROGRESS_PIXELS = 1 << 16
+
+# Número de amostras padrão do jitter sampling em cada modo (a grade MxN é a menor grade quadrada que as comporta)
+GLOBAL_JITTER_SAMPLES = 200
+SWATCH_JITTER_SAMPLES = 50
+
+# ------------------------------------------------------------------------------------
+# Transfer Parameters ----------------------------------------------------------------
+
+# Parâmetros do processo de transferência de cores (os mesmos da janela de configurações)
+# - kernel_size: tamanho da vizinhança em que se pré-computa o desvio padrão
+# - jitter_m, jitter_n: grade MxN do jitter sampling
+# - sampler: amostrador da imagem source: "jitter" (grade espacial MxN) ou "stratified" (M*N amostras distribuídas no
+#   espaço (luminância, desvio padrão), ver sampling.stratifiedSampling)
+# - window_size: tamanho da janela de vizinhança para síntese de textura (apenas no modo com swatches)
+# - lut, lut_std_step, lut_all_pixels: modo de tabela de lookup (apenas no modo global)
+# - ann, ann_components, ann_candidates: busca aproximada na síntese de textura (apenas no modo com swatches)
+# - preview_scale, guide_radius, guide_eps: modo rápido (apenas no modo global): com preview_scale < 1 o matching é feito
+#   na target reduzida por esse fator e os canais alfa e beta são ampliados guiados pela luminância (guided filter)
+# - workers, executor: número de workers e tipo do pool ("thread" ou "process") que processa os pares de swatches
+# - query_workers: threads de cada consulta aos índices espaciais (-1: todos os núcleos); dentro de um pool (pares de
+#   swatches, batch.py, service.py) as consultas usam 1
+# - seed: semente do jitter sampling (inteiro não negativo; None sorteia novas amostras a cada execução)
+@dataclass
+class TransferParams:
+    kernel_size: int = 5
+    jitter_m: int = int(np.ceil(np.sqrt(GLOBAL_JITTER_SAMPLES)))
+    jitter_n: int = int(np.ceil(np.sqrt(GLOBAL_JITTER_SAMPLES)))
+    sampler: str = "jitter"
+    window_size: int = 5
+    lut: bool = False
+    lut_std_step: float = 0.5
+    lut_all_pixels: bool = False
+    preview_scale: float = 1.0
+    guide_radius: int = 2
+    guide_eps: float = 1e-3
+    ann: bool = False
+    ann_components: int = 6
+    ann_candidates: int = 8
+    workers: int = 1
+    executor: str = "thread"
+    query_workers: int = QUERY_WORKERS
+    seed: int = None
+
+    # Gerador usado pelo jitter sampling (numpy.random.Generator)
+    def rng(self):
+        return samplingRng(self.seed)
+
+# Função que verifica o tipo e o intervalo de cada campo dos parâmetros (ex.: vindos de uma requisição JSON), para que
+# valores inválidos sejam recusados antes da transferência. Lança ValueError com o campo inválido.
+def checkParams(params):
+    integers = (("kernel_size", 1), ("jitter_m", 1), ("jitter_n", 1), ("window_size", 2), ("guide_radius", 0),
+                ("ann_components", 1), ("ann_candidates", 1), ("workers", 1))
+    for name, minimum in integers:
+        value = getattr(params, name)
+        if not isinstance(value, (int, np.integer)) or isinstance(value, bool) or value < minimum:
+            raise ValueError(f"{name} must be an integer >= {minimum}, got {value!r}")
+    for name in ("lut", "lut_all_pixels", "ann"):
+        if not isinstance(getattr(params, name), (bool, np.bool_)):
+            raise ValueError(f"{name} must be a boolean, got {getattr(params, name)!r}")
+    for name in ("lut_std_step", "preview_scale", "guide_eps"):
+        value = getattr(params, name)
+        if not isinstance(value, (int, float, np.number)) or isinstance(value, bool) or not np.isfinite(value) or value <= 0:
+            raise ValueError(f"{name} must be a positive number, got {value!r}")
+    if params.preview_scale > 1:
+        raise ValueError(f"preview_scale must be in (0, 1], got {params.preview_scale!r}")
+    query = params.query_workers
+    if not isinstance(query, (int, np.integer)) or isinstance(query, bool) or (query != -1 and query < 1):
+        raise ValueError(f"query_workers must be -1 or an integer >= 1, got {query!r}")
+    if params.sampler not in SAMPLERS:
+        raise ValueError(f"Unknown sampler {params.sampler!r}, expected one of {', '.join(SAMPLERS)}")
+    if params.executor not in ("thread", "process"):
+        raise ValueError(f"Unknown executor {params.executor!r}, expected 'thread' or 'process'")
+    if params.seed is not None and (not isinstance(params.seed, (int, np.integer)) or isinstance(params.seed, bool) or params.seed < 0):
+        raise ValueError(f"seed must be a non-negative integer, got {params.seed!r}")
+
+# ------------------------------------------------------------------------------------
+# Luminance Remapping ----------------------------------------------------------------
+
+# Função que realiza o Luminance Remapping sobre a imagem A
+def lumRemap(lumA, lumB):
+
+   # Pega a média das luminâncias de ambas imagens
+   meanA = np.mean(lumA)
+   meanB = np.mean(lumB)
+
+   # Pega o desvio padrão das luminâncias de ambas imagens
+   stdA = np.std(lumA)
+   stdB = np.std(lumB)
+
+   # Evita divisão por zero
+   if stdA == 0:
+      stdA = 1
+   stdB_A = stdB/stdA
+
+   # Remapeia os valores da imagem A e retorna
+   return stdB_A * (lumA - meanA) + meanB
+
+# Função que calcula os coeficientes do Luminance Remapping da imagem A (média meanA, desvio padrão stdA)
+# para as estatísticas da imagem B (meanB, stdB), de forma que lumRemap(lumA, lumB) = scale * lumA + offset.
+# Retorno: tupla (scale, offset)
+def lumRemapCoefficients(meanA, stdA, meanB, stdB):
+
+   # Evita divisão por zero
+   if stdA == 0:
+      stdA = 1
+   scale = stdB/stdA
+
+   return scale, meanB - scale * meanA
+
+# Função que calcula a média e o desvio padrão da luminância de uma imagem.
+# Imagens uint8 são resumidas em um histograma de 256 níveis, montado em faixas de linhas: as somas são exatas
+# e nenhuma cópia em float da imagem inteira é criada (np.std criaria duas).
+# Retorno: tupla (média, desvio padrão)
+def lumMeanStd(img):
+   if img.dtype != np.uint8:
+      return float(np.mean(img)), float(np.std(img))
+
+   hist = np.zeros(256, dtype=np.int64)
+   rows = max(1, PROGRESS_PIXELS // max(1, img.shape[1]))
+   for top in range(0, img.shape[0], rows):
+      hist += np.bincount(img[top:top + rows].ravel(), minlength=256)
+
+   levels = np.arange(256, dtype=np.float64)
+   mean = hist @ levels / img.size
+   return float(mean), float(np.sqrt(hist @ (levels - mean)**2 / img.size))
+
+# ------------------------------------------------------------------------------------
+# Prepared Source --------------------------------------------------------------------
+
+# Pré-computação da imagem source que não depende da imagem target, feita uma única vez por source:
+# - lab: imagem source no espaço de cores Lab (uint8)
+# - lum_mean, lum_std: média e desvio padrão da luminância (usados no Luminance Remapping de cada target)
+# - index: amostras (luminância, desvio padrão da vizinhança) da luminância original, prontas para o matching
+# O Luminance Remapping é linear, então o remapeamento para cada target é aplicado às amostras
+# (SampleIndex.remapped) em vez de refazer a conversão para Lab, o filtro de desvio padrão e o jitter sampling.
+# - key: chave da etapa de sampling no cache de etapas (cache.StageCache), ou None sem cache de etapas
+# Os arrays não são alterados depois de criados e podem ser compartilhados entre processos.
+@dataclass
+class PreparedSource:
+    lab: np.ndarray
+    lum_mean: float
+    lum_std: float
+    index: SampleIndex
+    key: str = None
+
+# ------------------------------------------------------------------------------------
+# Global Transfer --------------------------------------------------------------------
+
+# Transferência de cores global: cada pixel da imagem target recebe a cor da amostra da imagem source
+# com luminância e desvio padrão mais próximos.
+# Uso: GlobalTransfer(params).run(source_rgb, target_gray) -> imagem RGB uint8
+# Para uma source e várias targets: prepared = transfer.prepare(source_rgb) e transfer.apply(prepared, target_gray).
+# Com um cache de etapas (cache.StageCache), cada etapa (conversão para Lab, mapa de desvio padrão da source,
+# jitter sampling, Luminance Remapping, matching) é guardada pela chave das suas entradas, e mudar um parâmetro refaz
+# apenas as etapas que dependem dele. O desvio padrão da target é calculado por faixas dentro do matching.
+# Não depende de janelas nem de variáveis globais, então pode ser usada em processos sem display.
+class GlobalTransfer:
+
+    def __init__(self, params=None, cache=None, instrument=None, progress=None, stages=None):
+        self.params = params if params is not None else TransferParams()
+
+        # Cache em disco da pré-computação da source (cache.SourceCache), usado apenas com semente definida
+        self.cache = cache
+
+        # Medição do tempo de cada etapa (instrument.Instrumentation); desligada por padrão
+        self.instrument = instrument if instrument is not None else NULL_INSTRUMENTATION
+
+        # Canal de progresso e cancelamento (progress.Progress); opcional
+        self.progress = progress
+
+        # Cache em memória das saídas de cada etapa (cache.StageCache); desligado por padrão
+        self.stages = stages if stages is not None else NULL_STAGE_CACHE
+
+        # Informações da última execução (ex.: desvio da tabela de lookup)
+        self.stats = {}
+
+        # Acesso ao cache em disco na última pré-computação ("hit" ou "miss"; None se o cache não foi consultado)
+        self.sourceCacheAccess = None
+
+    # Algoritmo do processo de transferência de cores
+    def run(self, source, target):
+        self.stages.begin()
+        self.sourceCacheAccess = None
+        result = self.apply(self.prepare(source), target)
+        if self.stages.enabled:
+            self.stats["stages"] = self.stages.summary()
+        if self.sourceCacheAccess is not None:
+            cache = self.cache
+            self.stats["source_cache"] = f"{self.sourceCacheAccess} ({cache.hits} hits, {cache.misses} misses, {cache.evictions} evictions in {cache.directory})"
+        return result
+
+    # Pré-computa tudo o que depende apenas da imagem source, usando o cache de etapas e o cache em disco quando disponíveis
+    def prepare(self, source):
+        params = self.params
+        if self.progress is not None:
+            self.progress.update("source", 0, 1)
+
+        stages = self.stages
+        sourceKey = stages.fingerprint(source)
+        key = stages.key("sampling", sourceKey, params.kernel_size, params.jitter_m, params.jitter_n, params.sampler, params.seed, bool(params.lut and params.lut_all_pixels))
+        return stages.run("sampling", key, lambda: self.loadPrepared(source, sourceKey, key))
+
+    # Pré-computa a source ou a lê do cache em disco.
+    # Sem semente o jitter sampling não é reprodutível, então o cache em disco não é usado.
+    def loadPrepared(self, source, sourceKey, key):
+        params = self.params
+        if self.cache is None or params.seed is None:
+            return self.computePrepared(source, sourceKey, key)
+
+        # A chave inclui todos os parâmetros que mudam a pré-computação
+        key = self.cache.key(source, kernel_size=params.kernel_size, jitter_m=params.jitter_m, jitter_n=params.jitter_n,
+                             seed=params.seed, sampler=params.sampler, all_pixels=bool(params.lut and params.lut_all_pixels))
+        entry = self.cache.get(key)
+        self.sourceCacheAccess = "miss" if entry is None else "hit"
+        if entry is not None:
+            arrays, values = entry
+            return PreparedSource(
+                lab=arrays["lab"],
+                lum_mean=values["lum_mean"],
+                lum_std=values["lum_std"],
+                index=SampleIndex(arrays["lum"], arrays["coord"], arrays["std"]),
+                key=key,
+            )
+
+        prepared = self.computePrepared(source, sourceKey, key)
+        self.cache.put(key,
+                       {"lab": prepared.lab, "coord": prepared.index.coord, "lum": prepared.index.source, "std": prepared.index.std},
+                       {"lum_mean": prepared.lum_mean, "lum_std": prepared.lum_std})
+        return prepared
+
+    # Pré-computa a source (sem o cache em disco). A conversão para Lab e o mapa de desvio padrão passam pelo cache
+    # de etapas; key é a chave da etapa de sampling, guardada no resultado.
+    def computePrepared(self, source, sourceKey=None, key=None):
+        params = self.params
+        instrument = self.instrument
+        stages = self.stages
+
+        with instrument.span("lab_conversion"):
+
+            # Converte a imagem source para o espaço de cores Lab
+            labKey = stages.key("lab_conversion", sourceKey)
+            sourceLab = stages.run("lab_conversion", labKey, lambda: cv2.cvtColor(source, cv2.COLOR_RGB2Lab))
+
+            # Pega a luminância da imagem source (float64 para maior precisão)
+            sourceLum = sourceLab[:,:,0].astype(np.float64)
+
+        # Pré-computa o desvio padrão dos valores de luminância das vizinhanças (filtro de caixa, custo independente do tamanho).
+        with instrument.span("std_filter"):
+            sourceStd = stages.run("std_maps", stages.key("std_maps", labKey, params.kernel_size), lambda: localStd(sourceLum, params.kernel_size))
+
+        if params.lut and params.lut_all_pixels:
+
+            # A tabela de lookup usa todos os pixels da imagem source como candidatos
+            sourceSamplesCoord = np.indices(sourceLum.shape).reshape(2, -1).T
+            sourceSamplesLum = sourceLum.ravel()
+            sourceSamplesStd = sourceStd.ravel()
+
+        else:
+
+            # Amostra a imagem source (jitter sampling ou amostragem estratificada, params.sampler) para diminuir o número de amostras necessárias
+            with instrument.span("sampling"):
+                sourceSamplesCoord, sourceSamplesLum, sourceSamplesStd = sampleSource(sourceLum, sourceStd, params.jitter_m, params.jitter_n, params.sampler, params.rng())
+
+        # Constrói o índice das amostras
+        with instrument.span("sample_index"):
+            index = SampleIndex(sourceSamplesLum, sourceSamplesCoord, sourceSamplesStd)
+        instrument.count("samples", len(index))
+
+        return PreparedSource(
+            lab=sourceLab,
+            lum_mean=float(np.mean(sourceLum)),
+            lum_std=float(np.std(sourceLum)),
+            index=index,
+            key=key,
+        )
+
+    # Colore a imagem target a partir da source pré-computada.
+    # Com o cache de etapas, o resultado (e as informações da execução) é guardado pela chave da source pré-computada,
+    # da target e dos parâmetros do matching.
+    def apply(self, prepared, target):
+        params = self.params
+        stages = self.stages
+        self.stats = {}
+
+        targetKey = stages.fingerprint(target)
+        key = stages.key("matching", prepared.key, targetKey, params.kernel_size, params.lut, params.lut_std_step,
+                         params.preview_scale, params.guide_radius, params.guide_eps)
+        result, stats = stages.run("matching", key, lambda: (self.colorizeTarget(prepared, target, targetKey), self.stats))
+        self.stats = dict(stats)
+
+        # O resultado guardado no cache não pode ser alterado por quem o recebe
+        return result.copy() if stages.enabled else result
+
+    # Colore a imagem target (etapas de Luminance Remapping e matching).
+    # O resultado é montado em um único array Lab uint8 (luminância da target e canais alfa e beta escritos direto nele),
+    # convertido para RGB no próprio array.
+    def colorizeTarget(self, prepared, target, targetKey=None):
+        params = self.params
+        instrument = self.instrument
+        stages = self.stages
+
+        # Realiza o Luminance Remapping sobre as amostras da imagem source (o desvio padrão da vizinhança é escalado junto)
+        with instrument.span("lum_remap"):
+            targetStats = stages.run("lum_remap", stages.key("lum_remap", targetKey), lambda: lumMeanStd(target))
+            scale, offset = lumRemapCoefficients(prepared.lum_mean, prepared.lum_std, *targetStats)
+            index = prepared.index.remapped(scale, offset)
+
+        if params.preview_scale < 1:
+
+            # Modo rápido: matching na target reduzida (média por área, que preserva a luminância média)
+            with instrument.span("downscale"):
+                height, width = target.shape
+                size = (max(1, round(width * params.preview_scale)), max(1, round(height * params.preview_scale)))
+                small = cv2.resize(target, size, interpolation=cv2.INTER_AREA)
+            smallResult = self.colorize(prepared, index, small)
+
+            # Amplia os canais alfa e beta guiados pela luminância da target e junta com a luminância original
+            with instrument.span("upsampling"):
+                result = np.empty((height, width, 3), dtype=np.uint8)
+                result[:, :, 0] = target
+                guideFull = target.astype(np.float32)
+                guideFull *= np.float32(1 / 255.0)
+                guidedUpsample(small / np.float32(255.0), smallResult[:, :, 1:], guideFull, 2 * params.guide_radius + 1, params.guide_eps, out=result[:, :, 1:])
+                del guideFull
+            self.stats["preview_size"] = small.shape
+
+        else:
+            result = self.colorize(prepared, index, target)
+
+        # Converte o resultado para RGB no próprio array
+        with instrument.span("rgb_conversion"):
+            return cv2.cvtColor(result, cv2.COLOR_LAB2RGB, dst=result)
+
+    # Colore a imagem target (uint8) com as amostras remapeadas index (pelo matching exato ou pela tabela de lookup).
+    # A target é percorrida em faixas de linhas: o desvio padrão da vizinhança (float64) só existe para a faixa atual
+    # (no modo de tabela de lookup, para a imagem inteira), e o progresso é informado (e o cancelamento verificado) entre elas.
+    # Retorno: imagem de resultado Lab (uint8)
+    def colorize(self, prepared, index, target):
+        params = self.params
+        instrument = self.instrument
+        progress = self.progress if self.progress is not None else Progress()
+        height, width = target.shape
+        rows = max(1, PROGRESS_PIXELS // max(1, width))
+        bands = [(top, min(top + rows, height)) for top in range(0, height, rows)]
+
+        # Configura variável que guarda o resultado do processo
+        result = np.empty((height, width, 3), dtype=np.uint8)  # Inicializa o array do resultado
+        result[:, :, 0] = target  # Copia o canal de luminância da imagem target
+
+        if params.lut:
+
+            # Pré-computa o desvio padrão dos valores de luminância das vizinhanças da imagem target uma única vez, em
+            # float64 (o tamanho da tabela depende do maior valor, então a imagem inteira é filtrada antes de colorir)
+            with instrument.span("std_filter"):
+                targetStd = np.empty((height, width), dtype=np.float64)
+                for top, bottom in bands:
+                    targetStd[top:bottom] = localStdRows(target, top, bottom, params.kernel_size)
+
+            # Resolve o matching uma única vez por par (L, desvio padrão quantizado) e colore a imagem com uma leitura na tabela
+            progress.update("matching", 0, height)
+            with instrument.span("matching"):
+                lut = buildChromaLut(prepared.lab, index, np.max(targetStd), params.lut_std_step, params.query_workers)
+                for top, bottom in bands:
+                    applyChromaLut(lut, result[top:bottom], target[top:bottom], targetStd[top:bottom], params.lut_std_step)
+                    progress.update("matching", bottom, height)
+            instrument.count("lut_entries", lut.shape[0] * lut.shape[1])
+            instrument.count("pixels_lut", target.size)
+
+            # Mede o desvio em relação ao matching exato
+            with instrument.span("lut_deviation"):
+                self.stats["lut_shape"] = lut.shape[:2]
+                self.stats["lut_deviation"] = lutDeviation(lut, prepared.lab, index, target, targetStd, params.lut_std_step, workers=params.query_workers)
+
+        else:
+
+            progress.update("matching", 0, height)
+            for top, bottom in bands:
+
+                # Pré-computa o desvio padrão dos valores de luminância das vizinhanças da faixa
+                with instrument.span("std_filter"):
+                    bandStd = localStdRows(target, top, bottom, params.kernel_size)
+
+                with instrument.span("matching"):
+
+                    # Encontra a melhor cor de match para todos os pixels da faixa de uma vez (índice espacial quando há muitas amostras), onde a cor é dada pelos índices dos canais alfa e beta da imagem source
+                    matchCoord = index.match(target[top:bottom], bandStd, params.query_workers)
+
+                    # Salva os valores dos canais alfa e beta dos pixels da imagem original na imagem resultante
+                    transferChroma(result[top:bottom], prepared.lab, matchCoord)
+                instrument.count("pixels_matched", matchCoord.shape[0])
+                progress.update("matching", bottom, height)
+
+        return result
+
+# ------------------------------------------------------------------------------------
+# Swatch Pair Transfer ---------------------------------------------------------------
+
+# Etapas da transferência de cores entre um par de swatches (retângulos (x1, y1, x2, y2) nas imagens source e target).
+# As imagens (sourceLab, sourceLum e targetLum, uint8) são apenas recortadas; só os pedaços dos swatches são convertidos para float.
+# Cada etapa é uma função separada para que a sua saída possa ser guardada no cache de etapas (SwatchTransfer.colorizePairs).
+
+# Função que verifica os pares de swatches: cada retângulo (x1, y1, x2, y2) deve ter x1 < x2 e y1 < y2 e estar dentro
+# da sua imagem (shape da source e da target). Lança ValueError com o par e o retângulo inválidos.
+def checkSwatchPairs(pairs, sourceShape, targetShape):
+    for number, pair in enumerate(pairs, 1):
+        for name, rect, shape in (("source", pair[0], sourceShape), ("target", pair[1], targetShape)):
+            if len(rect) != 4:
+                raise ValueError(f"Swatch pair {number}: {name} rectangle {tuple(rect)} must be x1, y1, x2, y2")
+            x1, y1, x2, y2 = rect
+            if not (x1 < x2 and y1 < y2):
+                raise ValueError(f"Swatch pair {number}: {name} rectangle {tuple(rect)} must have x1 < x2 and y1 < y2")
+            if x1 < 0 or y1 < 0 or x2 > shape[1] or y2 > shape[0]:
+                raise ValueError(f"Swatch pair {number}: {name} rectangle {tuple(rect)} is outside the {name} image ({shape[1]}x{shape[0]})")
+
+# Função que recorta o pedaço da imagem referente a um swatch
+def swatchPatch(img, rect):
+    return img[rect[1]:rect[3], rect[0]:rect[2]]
+
+# Realiza o Luminance Remapping sobre o swatch da imagem source
+def remapSwatchPair(sourceLum, targetLum, sourceRect, targetRect):
+    return lumRemap(swatchPatch(sourceLum, sourceRect), swatchPatch(targetLum, targetRect))
+
+# Pré-computa o desvio padrão dos valores de luminância das vizinhanças em cada swatch (filtro de caixa, custo independente do tamanho).
+# Retorno: (desvio padrão do swatch source remapeado, desvio padrão do swatch target)
+def swatchStdMaps(sourceRemap, targetLum, targetRect, kernel_size):
+    return localStd(sourceRemap, kernel_size), localStd(swatchPatch(targetLum, targetRect), kernel_size)
+
+# Amostra o swatch source (jitter sampling ou amostragem estratificada, params.sampler) para diminuir o número de amostras necessárias.
+# Retorno: (coordenadas, luminâncias, desvios padrão) das amostras
+def sampleSwatchPair(sourceRemap, sourceStd, params, rng=None):
+    return sampleSource(sourceRemap, sourceStd, params.jitter_m, params.jitter_n, params.sampler, rng)
+
+# Encontra a melhor cor de match para todos os pixels do swatch target de uma vez (índice espacial quando há muitas amostras),
+# onde a cor é dada pelos índices dos canais alfa e beta do swatch source.
+# Retorno: pedaço da imagem de resultado (Lab, uint8) correspondente ao swatch da imagem target
+def matchSwatchPair(sourceLab, targetLum, sourceRect, targetRect, targetStd, samples, workers=QUERY_WORKERS):
+    return matchSwatchPatches(swatchPatch(sourceLab, sourceRect), swatchPatch(targetLum, targetRect), targetStd, samples, workers)
+
+# Faz o matching de um par de swatches já recortados (swatch source em Lab e swatch target em luminância). É a tarefa
+# enviada ao pool: só os recortes são copiados para os processos, e não as imagens inteiras (e, no pool, workers = 1).
+def matchSwatchPatches(source_patch, target_patch, targetStd, samples, workers=QUERY_WORKERS):
+    sourceSamplesCoord, sourceSamplesLum, sourceSamplesStd = samples
+
+    # Configura variável que guarda o resultado do processo sobre o par de swatches
+    result_patch = np.empty((target_patch.shape[0], target_patch.shape[1], 3), dtype=np.uint8)  # Inicializa o array do resultado
+    result_patch[:, :, 0] = target_patch  # Copia o canal de luminância da imagem target
+
+    matchCoord = bestMatchSamples(target_patch, targetStd, sourceSamplesLum, sourceSamplesCoord, sourceSamplesStd, workers)
+
+    # Salva os valores dos canais alfa e beta dos pixels da imagem original na imagem resultante
+    return transferChroma(result_patch, source_patch, matchCoord)
+
+# Pool de pares de swatches, criado na primeira execução que o usa e mantido entre execuções (criar um pool de
+# processos a cada execução custa mais do que o matching de poucos pares). Um novo pool só é criado quando o tipo
+# ou o número de workers muda.
+swatch_pool = None
+swatch_pool_config = None
+swatch_pool_lock = threading.Lock()
+
+# Função que devolve o pool de pares de swatches com o tipo ("thread" ou "process") e o número de workers pedidos
+def swatchPool(executor, workers):
+    global swatch_pool, swatch_pool_config
+    if executor not in ("thread", "process"):
+        raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+    with swatch_pool_lock:
+        if swatch_pool_config != (executor, workers):
+            if swatch_pool is not None:
+                swatch_pool.shutdown(wait=False)
+            swatch_pool = ThreadPoolExecutor(max_workers=workers) if executor == "thread" else ProcessPoolExecutor(max_workers=workers)
+            swatch_pool_config = (executor, workers)
+        return swatch_pool
+
+# ------------------------------------------------------------------------------------
+# Swatch Transfer --------------------------------------------------------------------
+
+# Transferência de cores com swatches: cada par de swatches (source, target) é colorido pelo processo global
+# e as cores são propagadas para o restante da imagem target por síntese de textura.
+# Uso: SwatchTransfer(params).run(source_rgb, target_gray, pairs) -> imagem RGB uint8,
+# onde pairs é uma lista de pares de retângulos ((x1, y1, x2, y2) na source, (x1, y1, x2, y2) na target).
+# Com um cache de etapas (cache.StageCache), as etapas de cada par (Luminance Remapping, mapas de desvio padrão,
+# jitter sampling, matching) e a síntese de textura são guardadas pela chave das suas entradas: mudar window_size
+# refaz apenas a síntese de textura. As chaves de um par dependem dos seus retângulos, e não da sua posição na lista,
+# então ao adicionar, remover ou mover swatches só os pares novos ou alterados são coloridos. Na síntese com busca
+# exata, a busca de cada swatch em todas as janelas da imagem também é guardada por par (synthesis_search): só os
+# swatches novos ou movidos são comparados com as janelas, e a escolha de cada janela é refeita a partir dos erros guardados.
+class SwatchTransfer:
+
+    def __init__(self, params=None, instrument=None, progress=None, stages=None):
+        if params is None:
+            samples = int(np.ceil(np.sqrt(SWATCH_JITTER_SAMPLES)))
+            params = TransferParams(jitter_m=samples, jitter_n=samples)
+        self.params = params
+        self.instrument = instrument if instrument is not None else NULL_INSTRUMENTATION
+        self.progress = progress
+        self.stages = stages if stages is not None else NULL_STAGE_CACHE
+        self.stats = {}
+
+    # Algoritmo do processo de transferência de cores
+    def run(self, source, target, pairs):
+        params = self.params
+        instrument = self.instrument
+        stages = self.stages
+        progress = self.progress if self.progress is not None else Progress()
+        self.stats = {}
+        stages.begin()
+
+        # Verifica se há pelo menos um par de swatches
+        if len(pairs) == 0:
+            raise ValueError("At least one swatch pair is required.")
+        checkSwatchPairs(pairs, source.shape, target.shape)
+
+        # Converte a imagem source para o espaço de cores Lab (uint8; cada par converte para float apenas os seus swatches)
+        sourceKey = stages.fingerprint(source)
+        with instrument.span("lab_conversion"):
+            sourceLab = stages.run("lab_conversion", stages.key("lab_conversion", sourceKey), lambda: cv2.cvtColor(source, cv2.COLOR_RGB2Lab))
+
+        # Colore cada par de swatches (em paralelo com mais de um worker)
+        targetKey = stages.fingerprint(target)
+        result_patches, pairKeys = self.colorizePairs(sourceLab, target, pairs, progress, sourceKey, targetKey)
+        for result_patch in result_patches:
+            instrument.count("pixels_matched", result_patch.shape[0] * result_patch.shape[1])
+
+        # Propaga as cores dos swatches para o restante da imagem
+        key = stages.key("texture_synthesis", targetKey, tuple(pairKeys), params.window_size, params.ann, params.ann_components, params.ann_candidates)
+        result, stats = stages.run("texture_synthesis", key, lambda: (self.synthesize(target, pairs, result_patches, progress, targetKey), self.stats))
+        self.stats = dict(stats)
+        if stages.enabled:
+            self.stats["stages"] = stages.summary()
+
+        # O resultado guardado no cache não pode ser alterado por quem o recebe
+        return result.copy() if stages.enabled else result
+
+    # Junta os swatches coloridos na imagem de resultado e colore o restante por síntese de textura.
+    # Retorno: imagem RGB uint8
+    def synthesize(self, targetLum, pairs, result_patches, progress, targetKey=None):
+        params = self.params
+        instrument = self.instrument
+        stages = self.stages
+
+        # Configura variável que guarda o resultado do processo (Lab uint8, convertido para RGB no próprio array no final)
+        result_aux = np.zeros((targetLum.shape[0], targetLum.shape[1], 3), dtype=np.uint8)  # Inicializa o array do resultado
+        result_aux[:, :, 0] = targetLum  # Copia o canal de luminância da imagem target
+
+        # Configura variável que guarda quais pixels da imagem de resultado estão coloridos após o processo sobre o par de swatches
+        result_colorized_pixels = np.zeros((targetLum.shape[0], targetLum.shape[1]), dtype=np.uint8)
+
+        # Configura variável que guarda os swatches do resultado
+        result_swatches = {}
+
+        # Junta os pares na ordem em que foram informados (em caso de sobreposição, o último par prevalece)
+        for i, ((sourceRect, targetRect), result_patch) in enumerate(zip(pairs, result_patches)):
+
+            # Salva as novas cores na imagem de resultado
+            result_aux[targetRect[1]:targetRect[3], targetRect[0]:targetRect[2]] = result_patch
+
+            # Indica que o pixel foi colorido
+            result_colorized_pixels[targetRect[1]:targetRect[3], targetRect[0]:targetRect[2]] = 1
+
+            # Salva o swatch da imagem de resultado
+            result_swatches[i] = result_patch
+
+        # Realiza a síntese de texturas para colorir a imagem (com busca exata ou aproximada das janelas dos swatches).
+        # Com o cache de etapas, a busca exata é guardada swatch a swatch (synthesis.WindowMatches) e só as janelas
+        # ainda não buscadas em cada swatch são comparadas.
+        with instrument.span("texture_synthesis"):
+            if stages.enabled and not params.ann:
+                matches = []
+                for i, (_, targetRect) in enumerate(pairs):
+                    key = stages.key("synthesis_search", targetKey, tuple(targetRect), params.window_size)
+                    matches.append(stages.run("synthesis_search", key, lambda: WindowMatches(result_swatches[i][:, :, 0], targetLum.shape, params.window_size)))
+                synthesizeFromMatches(result_swatches, matches, result_aux, result_colorized_pixels, params.window_size, progress, instrument)
+            else:
+                if params.ann:
+                    patches = PatchIndex(result_swatches, params.window_size, params.ann_components, params.ann_candidates, workers=params.query_workers)
+                else:
+                    patches = SwatchPatches(result_swatches, params.window_size)
+                texture_synthesis(result_swatches, result_aux, result_colorized_pixels, params.window_size, patches, progress, instrument)
+
+        # Mede o recall da busca aproximada em relação à busca exata
+        if params.ann:
+            with instrument.span("synthesis_recall"):
+                self.stats["synthesis_recall"] = patchRecall(patches, result_aux, result_colorized_pixels)
+
+        # Converte o resultado para RGB no próprio array
+        with instrument.span("rgb_conversion"):
+            return cv2.cvtColor(result_aux, cv2.COLOR_LAB2RGB, dst=result_aux)
+
+    # Sementes do jitter sampling de cada par (cada uma gera um numpy.random.Generator independente). Com params.seed,
+    # a semente de um par depende apenas dela e dos retângulos do par, então adicionar, remover ou mover outros pares
+    # não muda as amostras dos pares restantes; sem semente, cada par recebe um fluxo independente sorteado
+    # (SeedSequence.spawn).
+    def pairSeeds(self, pairs):
+        params = self.params
+        if params.seed is None:
+            return np.random.SeedSequence().spawn(len(pairs))
+        seeds = []
+        for sourceRect, targetRect in pairs:
+            digest = hashlib.blake2b(repr((params.seed, tuple(sourceRect), tuple(targetRect))).encode(), digest_size=8).digest()
+            seeds.append(int.from_bytes(digest, "little"))
+        return seeds
+
+    # Função que colore os pares de swatches. As etapas leves de cada par (Luminance Remapping, mapas de desvio padrão
+    # e jitter sampling) são feitas no processo principal, passando pelo cache de etapas; o matching dos pares que não
+    # estão no cache é feito no próprio thread quando há um só par pendente (ou params.workers = 1), e senão no pool
+    # de params.workers workers (swatchPool), mantido entre execuções.
+    # Cada par tem o seu próprio gerador do jitter sampling, com a sua semente (pairSeeds); assim o resultado é o mesmo
+    # para qualquer número e tipo de workers.
+    # O padrão são threads (params.executor = "thread"): o matching passa quase todo o tempo em NumPy/SciPy, que
+    # liberam o GIL, e não há cópia das imagens nem fork (inseguro a partir do thread de fundo das interfaces).
+    # Com processos, cada tarefa leva apenas os recortes do seu par.
+    # O progresso é informado a cada par concluído; com cancelamento, os pares que ainda não começaram são descartados.
+    # Retorno: (lista com o pedaço colorido da imagem de resultado de cada par, lista com a chave do matching de cada par),
+    # na ordem de pairs
+    def colorizePairs(self, sourceLab, targetLum, pairs, progress, sourceKey=None, targetKey=None):
+        params = self.params
+        instrument = self.instrument
+        stages = self.stages
+        sourceLum = sourceLab[:,:,0]
+        seeds = self.pairSeeds(pairs)
+        progress.update("swatch pairs", 0, len(pairs))
+        instrument.count("swatch_pairs", len(pairs))
+
+        # Etapas anteriores ao matching, e o matching dos pares já guardados no cache
+        patches = [None] * len(pairs)
+        keys = []
+        pending = []  # (índice do par, desvio padrão do swatch target, amostras)
+        for i, ((sourceRect, targetRect), seed) in enumerate(zip(pairs, seeds)):
+            rects = (tuple(sourceRect), tuple(targetRect))
+            remapKey = stages.key("lum_remap", sourceKey, targetKey, rects)
+            stdKey = stages.key("std_maps", remapKey, params.kernel_size)
+            samplesKey = stages.key("sampling", stdKey, params.jitter_m, params.jitter_n, params.sampler, params.seed, seed)
+            key = stages.key("matching", samplesKey)
+            keys.append(key)
+            patches[i] = stages.get("matching", key)
+            if patches[i] is not None:
+                continue
+
+            sourceRemap = stages.run("lum_remap", remapKey, lambda: remapSwatchPair(sourceLum, targetLum, sourceRect, targetRect))
+            with instrument.span("std_filter"):
+                sourceStd, targetStd = stages.run("std_maps", stdKey, lambda: swatchStdMaps(sourceRemap, targetLum, targetRect, params.kernel_size))
+            with instrument.span("sampling"):
+                samples = stages.run("sampling", samplesKey, lambda: sampleSwatchPair(sourceRemap, sourceStd, params, seed))
+            instrument.count("samples", len(samples[1]))
+            pending.append((i, targetStd, samples))
+
+        done = len(pairs) - len(pending)
+        progress.update("swatch pairs", done, len(pairs))
+
+        workers = min(params.workers, len(pending))
+        if workers <= 1:
+            for i, targetStd, samples in pending:
+                sourceRect, targetRect = pairs[i]
+                with instrument.span("matching"):
+                    patches[i] = matchSwatchPair(sourceLab, targetLum, sourceRect, targetRect, targetStd, samples, params.query_workers)
+                stages.put("matching", keys[i], patches[i])
+                done += 1
+                progress.update("swatch pairs", done, len(pairs))
+            return patches, keys
+
+        pool = swatchPool(params.executor, params.workers)
+        with instrument.span("swatch_pairs"):
+            futures = []
+            try:
+                for i, targetStd, samples in pending:
+                    sourceRect, targetRect = pairs[i]
+                    futures.append((i, pool.submit(matchSwatchPatches, swatchPatch(sourceLab, sourceRect), swatchPatch(targetLum, targetRect), targetStd, samples, 1)))
+                for i, future in futures:
+                    patches[i] = future.result()
+                    stages.put("matching", keys[i], patches[i])
+                    done += 1
+                    progress.update("swatch pairs", done, len(pairs))
+            except BaseException:
+                # O pool continua em uso: descarta apenas os pares desta execução que ainda não começaram
+                for _, future in futures:
+                    future.cancel()
+                raise
+            return patches, keys
+
+# ------------------------------------------------------------------------------------
+# Image Files ------------------------------------------------------------------------
+
+# Função que lê a imagem source (colorida) no espaço de cores RGB
+def readSource(path):
+    return decodeImage(path)
+
+# Função que lê a imagem target em tons de cinza
+def readTarget(path):
+    return decodeImage(path, grayscale=True)
+
+# Função que salva a imagem de resultado (RGB); o formato é dado pela extensão do arquivo e as opções (compressão,
+# qualidade, 16 bits, Lab) por options (writer.WriteOptions)
+def writeResult(path, result, options=None):
+    writeImage(path, result, options)
@@ -0,0 +1,200 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import math
+
+import numpy as np
+import cv2
+import tkinter as tk
+from PIL import Image, ImageTk
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Fração da tela ocupada, no máximo, pela área de imagem de cada janela ao abrir uma imagem
+VIEW_SCREEN_FRACTION = 0.45
+
+# Fator de zoom de cada passo da roda do mouse
+ZOOM_STEP = 1.25
+
+# Zoom máximo (pixels da tela por pixel da imagem)
+MAX_ZOOM = 16.0
+
+# Maior redução das imagens de prévia (pirâmide de reduções à metade: 1/2, 1/4, ...)
+MAX_PROXY_LEVEL = 64
+
+# ------------------------------------------------------------------------------------
+# Viewport ---------------------------------------------------------------------------
+
+# Área de exibição de uma imagem (array RGB ou em tons de cinza) com zoom e pan, para imagens maiores que a tela.
+# Como funciona:
+# - Só a região visível é desenhada, no tamanho da tela: ela é recortada da menor prévia (pirâmide de reduções à
+#   metade da imagem, criadas sob demanda) que ainda tem resolução suficiente para o zoom atual, e redimensionada.
+#   Assim, o PhotoImage do Tk tem sempre o tamanho da janela, e não o da imagem.
+# - A roda do mouse aplica zoom em torno do cursor; arrastar com o botão direito (ou do meio) move a imagem;
+#   um duplo clique com o botão direito volta a mostrar a imagem inteira.
+# - toImage converte coordenadas do canvas (ex.: as de um clique) para coordenadas da imagem em resolução total,
+#   e os retângulos (addRectangle) são guardados em coordenadas da imagem e redesenhados a cada zoom/pan.
+# Uso:
+#     viewport = Viewport(window)
+#     viewport.pack(fill="both", expand=True)
+#     viewport.show(img)
+#     viewport.canvas.bind("<Button-1>", lambda event: print(viewport.toImage(event.x, event.y)))
+class Viewport:
+
+    def __init__(self, parent, background="white"):
+        self.canvas = tk.Canvas(parent, bg=background, highlightthickness=0)
+        self.image = None
+        self.levels = {}  # fator de redução -> prévia
+        self.zoom = 1.0  # pixels da tela por pixel da imagem
+        self.left = 0.0  # coordenadas da imagem no canto superior esquerdo do canvas
+        self.top = 0.0
+        self.rectangles = []  # (x1, y1, x2, y2, cor), em coordenadas da imagem
+        self.photo = None
+        self.pending = None
+        self.dragStart = None
+
+        self.canvas.bind("<Configure>", lambda event: self.scheduleRender())
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoomAt(event.x, event.y, ZOOM_STEP if event.delta > 0 else 1 / ZOOM_STEP))
+        self.canvas.bind("<Button-4>", lambda event: self.zoomAt(event.x, event.y, ZOOM_STEP))
+        self.canvas.bind("<Button-5>", lambda event: self.zoomAt(event.x, event.y, 1 / ZOOM_STEP))
+        for button in (2, 3):
+            self.canvas.bind(f"<ButtonPress-{button}>", self.startDrag)
+            self.canvas.bind(f"<B{button}-Motion>", self.drag)
+        self.canvas.bind("<Double-Button-3>", lambda event: self.fit())
+
+    # Posiciona o canvas na janela (mesmos argumentos do pack do Tk)
+    def pack(self, **options):
+        self.canvas.pack(**options)
+
+    # Mostra uma nova imagem, inteira, com o canvas do tamanho da imagem reduzida para caber na tela
+    def show(self, img):
+        self.image = img
+        self.levels = {1: img}
+        self.rectangles = []
+        height, width = img.shape[:2]
+        maxWidth = int(self.canvas.winfo_screenwidth() * VIEW_SCREEN_FRACTION)
+        maxHeight = int(self.canvas.winfo_screenheight() * VIEW_SCREEN_FRACTION)
+        zoom = min(maxWidth / width, maxHeight / height, 1.0)
+        self.canvas.config(width=max(1, round(width * zoom)), height=max(1, round(height * zoom)))
+        self.zoom, self.left, self.top = zoom, 0.0, 0.0
+        self.render()
+
+    # Volta a mostrar a imagem inteira no tamanho atual do canvas
+    def fit(self):
+        if self.image is None:
+            return
+        width, height = self.canvasSize()
+        self.zoom = min(width / self.image.shape[1], height / self.image.shape[0])
+        self.left, self.top = 0.0, 0.0
+        self.render()
+
+    # Tamanho atual do canvas (o pedido, antes de a janela ser desenhada)
+    def canvasSize(self):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            width, height = int(self.canvas.cget("width")), int(self.canvas.cget("height"))
+        return width, height
+
+    # Converte coordenadas do canvas em coordenadas (x, y) da imagem em resolução total, limitadas à imagem
+    def toImage(self, x, y):
+        height, width = self.image.shape[:2]
+        imageX = int(math.floor(self.left + x / self.zoom))
+        imageY = int(math.floor(self.top + y / self.zoom))
+        return min(max(imageX, 0), width - 1), min(max(imageY, 0), height - 1)
+
+    # Converte coordenadas da imagem em coordenadas do canvas
+    def toCanvas(self, x, y):
+        return (x - self.left) * self.zoom, (y - self.top) * self.zoom
+
+    # Adiciona um retângulo (em coordenadas da imagem) desenhado sobre a imagem
+    def addRectangle(self, rect, color):
+        self.rectangles.append((*rect, color))
+        self.drawRectangle(*rect, color)
+
+    # Remove todos os retângulos
+    def clearRectangles(self):
+        self.rectangles = []
+        self.canvas.delete("rectangle")
+
+    # Zoom por factor em torno do ponto (x, y) do canvas, que continua sobre o mesmo pixel da imagem
+    def zoomAt(self, x, y, factor):
+        if self.image is None:
+            return
+        width, height = self.canvasSize()
+        fitZoom = min(width / self.image.shape[1], height / self.image.shape[0], 1.0)
+        zoom = min(max(self.zoom * factor, fitZoom), MAX_ZOOM)
+        self.left += x / self.zoom - x / zoom
+        self.top += y / self.zoom - y / zoom
+        self.zoom = zoom
+        self.scheduleRender()
+
+    # Início e andamento do arrasto (pan)
+    def startDrag(self, event):
+        self.dragStart = (event.x, event.y, self.left, self.top)
+
+    def drag(self, event):
+        if self.image is None or self.dragStart is None:
+            return
+        x, y, left, top = self.dragStart
+        self.left = left - (event.x - x) / self.zoom
+        self.top = top - (event.y - y) / self.zoom
+        self.scheduleRender()
+
+    # Agrupa os pedidos de redesenho (vários eventos de roda ou de arrasto) em um único desenho
+    def scheduleRender(self):
+        if self.pending is None:
+            self.pending = self.canvas.after_idle(self.render)
+
+    # Prévia reduzida por factor (potência de 2), criada reduzindo à metade a prévia anterior
+    def level(self, factor):
+        if factor not in self.levels:
+            previous = self.level(factor // 2)
+            size = (max(1, (previous.shape[1] + 1) // 2), max(1, (previous.shape[0] + 1) // 2))
+            self.levels[factor] = cv2.resize(previous, size, interpolation=cv2.INTER_AREA)
+        return self.levels[factor]
+
+    # Desenha a região visível da imagem e os retângulos
+    def render(self):
+        self.pending = None
+        if self.image is None:
+            return
+        height, width = self.image.shape[:2]
+        canvasWidth, canvasHeight = self.canvasSize()
+
+        # Mantém a região visível dentro da imagem (centralizada quando a imagem é menor que o canvas)
+        viewWidth, viewHeight = canvasWidth / self.zoom, canvasHeight / self.zoom
+        self.left = min(max(self.left, 0.0), width - viewWidth) if viewWidth < width else (width - viewWidth) / 2
+        self.top = min(max(self.top, 0.0), height - viewHeight) if viewHeight < height else (height - viewHeight) / 2
+
+        # Região visível em resolução total
+        x1, y1 = max(0, int(math.floor(self.left))), max(0, int(math.floor(self.top)))
+        x2, y2 = min(width, int(math.ceil(self.left + viewWidth))), min(height, int(math.ceil(self.top + viewHeight)))
+
+        # Menor prévia com pelo menos um pixel por pixel da tela, e o recorte correspondente nela
+        factor = 1
+        while factor * 2 <= min(1 / self.zoom, MAX_PROXY_LEVEL):
+            factor *= 2
+        proxy = self.level(factor)
+        px1, py1 = x1 // factor, y1 // factor
+        px2, py2 = max(px1 + 1, -(-x2 // factor)), max(py1 + 1, -(-y2 // factor))
+        crop = proxy[py1:py2, px1:px2]
+
+        # Redimensiona o recorte para a tela (vizinho mais próximo ao ampliar, para ver os pixels da imagem)
+        left, top = self.toCanvas(px1 * factor, py1 * factor)
+        right, bottom = self.toCanvas(min(px2 * factor, width), min(py2 * factor, height))
+        size = (max(1, round(right - left)), max(1, round(bottom - top)))
+        interpolation = cv2.INTER_AREA if size[0] < crop.shape[1] else cv2.INTER_NEAREST
+        view = cv2.resize(np.ascontiguousarray(crop), size, interpolation=interpolation)
+
+        self.photo = ImageTk.PhotoImage(Image.fromarray(view))
+        self.canvas.delete("all")
+        self.canvas.create_image(round(left), round(top), anchor="nw", image=self.photo)
+        for rect in self.rectangles:
+            self.drawRectangle(*rect)
+
+    # Desenha um retângulo dado em coordenadas da imagem
+    def drawRectangle(self, x1, y1, x2, y2, color):
+        left, top = self.toCanvas(x1, y1)
+        right, bottom = self.toCanvas(x2, y2)
+        self.canvas.create_rectangle(left, top, right, bottom, outline=color, width=2, tags="rectangle")
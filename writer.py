@@ -0,0 +1,305 @@
+# ------------------------------------------------------------------------------------
+# Bibliotecas ------------------------------------------------------------------------
+
+import numpy as np
+import cv2
+import io
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# ------------------------------------------------------------------------------------
+# Constantes -------------------------------------------------------------------------
+
+# Nível de compressão padrão dos arquivos PNG (0 = sem compressão, 9 = máxima e mais lenta)
+DEFAULT_PNG_COMPRESSION = 3
+
+# Qualidade padrão dos arquivos JPEG (0 a 100)
+DEFAULT_JPEG_QUALITY = 95
+
+# Formatos que aceitam 16 bits por canal e formatos que aceitam Lab em ponto flutuante
+SIXTEEN_BIT_EXTENSIONS = (".png", ".tif", ".tiff", ".npy")
+LAB_EXTENSIONS = (".tif", ".tiff", ".npy")
+
+# Número máximo de imagens aguardando gravação no AsyncWriter; submit espera quando há mais (limita a memória)
+MAX_PENDING_WRITES = 2
+
+# Assinatura dos arquivos PNG
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# ------------------------------------------------------------------------------------
+# Write Options ----------------------------------------------------------------------
+
+# Opções de gravação da imagem de resultado
+# - png_compression: nível de compressão dos arquivos PNG (0 a 9)
+# - jpeg_quality: qualidade dos arquivos JPEG (0 a 100)
+# - depth: bits por canal do RGB gravado (8 ou 16; 16 apenas em PNG, TIFF e .npy, com os valores multiplicados por 257)
+# - lab: grava o resultado em Lab float32 (L de 0 a 100, a e b em torno de 0) em vez de RGB (apenas TIFF e .npy)
+# O formato do arquivo é dado pela extensão; .npy recebe o array sem codificação.
+@dataclass
+class WriteOptions:
+    png_compression: int = DEFAULT_PNG_COMPRESSION
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY
+    depth: int = 8
+    lab: bool = False
+
+# Função que verifica se as opções de gravação são válidas para o arquivo path.
+# Retorno: extensão do arquivo (minúscula)
+def checkOptions(path, options):
+    extension = os.path.splitext(path)[1].lower()
+    if not 0 <= options.png_compression <= 9:
+        raise ValueError(f"PNG compression must be between 0 and 9, got {options.png_compression}")
+    if not 0 <= options.jpeg_quality <= 100:
+        raise ValueError(f"JPEG quality must be between 0 and 100, got {options.jpeg_quality}")
+    if options.depth not in (8, 16):
+        raise ValueError(f"Unsupported depth {options.depth}, expected 8 or 16")
+    if options.lab and extension not in LAB_EXTENSIONS:
+        raise ValueError(f"Lab export needs one of {LAB_EXTENSIONS}, got {path}")
+    if options.depth == 16 and not options.lab and extension not in SIXTEEN_BIT_EXTENSIONS:
+        raise ValueError(f"16-bit export needs one of {SIXTEEN_BIT_EXTENSIONS}, got {path}")
+    return extension
+
+# Função que converte o resultado (RGB uint8) para a representação gravada: RGB uint8, RGB uint16 ou Lab float32
+def convertResult(rgb, options):
+    if options.lab:
+        return cv2.cvtColor(rgb.astype(np.float32) / 255, cv2.COLOR_RGB2Lab)
+    if options.depth == 16:
+        return rgb.astype(np.uint16) * 257
+    return rgb
+
+# ------------------------------------------------------------------------------------
+# Image Encoding ---------------------------------------------------------------------
+
+# Função que prepara o resultado para o codificador do OpenCV: array convertido (BGR, exceto em Lab) e parâmetros do
+# formato. A conversão para BGR é feita em um array novo; o resultado (que pode ser somente leitura) não é alterado.
+def encoderInput(extension, rgb, options):
+    img = convertResult(rgb, options)
+    if options.lab:
+        return img, []
+    params = {".png": [cv2.IMWRITE_PNG_COMPRESSION, options.png_compression],
+              ".jpg": [cv2.IMWRITE_JPEG_QUALITY, options.jpeg_quality],
+              ".jpeg": [cv2.IMWRITE_JPEG_QUALITY, options.jpeg_quality]}.get(extension, [])
+    return cv2.cvtColor(img, cv2.COLOR_RGB2BGR), params
+
+# Função que grava a imagem de resultado (RGB) no arquivo path, no formato dado pela extensão, com o OpenCV
+def writeImage(path, rgb, options=None):
+    options = options or WriteOptions()
+    extension = checkOptions(path, options)
+    if extension == ".npy":
+        np.save(path, convertResult(rgb, options))
+        return
+
+    img, params = encoderInput(extension, rgb, options)
+    if not cv2.imwrite(path, img, params):
+        raise OSError(f"Could not write {path}")
+
+# Função que codifica a imagem de resultado (RGB) na memória, no formato da extensão (ex.: ".png").
+# Retorno: bytes do arquivo
+def encodeImage(extension, rgb, options=None):
+    options = options or WriteOptions()
+    extension = checkOptions("result" + extension, options)
+    if extension == ".npy":
+        buffer = io.BytesIO()
+        np.save(buffer, convertResult(rgb, options))
+        return buffer.getvalue()
+
+    img, params = encoderInput(extension, rgb, options)
+    ok, data = cv2.imencode(extension, img, params)
+    if not ok:
+        raise ValueError(f"Could not encode {extension}")
+    return data.tobytes()
+
+# ------------------------------------------------------------------------------------
+# Async Writer -----------------------------------------------------------------------
+
+# Gravação de imagens em uma thread separada: a codificação (OpenCV/zlib, que liberam o GIL) roda enquanto a interface
+# continua respondendo, ou enquanto a próxima imagem de um lote é colorida.
+# Como funciona:
+# - submit devolve um Future (concurrent.futures) da gravação; com maxPending gravações pendentes ele espera uma
+#   terminar, então no máximo maxPending resultados ficam na memória aguardando. Com blocking=False (ex.: na thread da
+#   interface) ele não espera e devolve None.
+# - Os arquivos que falharam ficam em failed (arquivo -> mensagem de erro).
+# - close (ou o fim do bloco with) espera todas as gravações.
+# Uso:
+#     with AsyncWriter() as writer:
+#         future = writer.submit(path, result, WriteOptions(jpeg_quality=90))
+class AsyncWriter:
+
+    def __init__(self, maxPending=MAX_PENDING_WRITES):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.slots = threading.BoundedSemaphore(maxPending)
+        self.failed = {}
+
+    # Agenda a gravação de rgb em path. Retorno: Future da gravação, ou None se blocking=False e não há vaga
+    def submit(self, path, rgb, options=None, blocking=True):
+        if not self.slots.acquire(blocking=blocking):
+            return None
+        future = self.executor.submit(writeImage, path, rgb, options)
+        future.add_done_callback(lambda done: self.finished(path, done))
+        return future
+
+    # Fim de uma gravação: libera a vaga e registra a falha, se houver
+    def finished(self, path, future):
+        self.slots.release()
+        error = future.exception()
+        if error is not None:
+            self.failed[path] = f"{type(error).__name__}: {error}"
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ------------------------------------------------------------------------------------
+# Streaming Writer -------------------------------------------------------------------
+
+# Gravação de uma imagem de resultado recebida em blocos (ex.: os tiles do modo em tiles), sem montar a imagem inteira
+# na memória.
+# Como funciona:
+# - .npy: os blocos são escritos diretamente em um array mapeado em memória (na representação das opções).
+# - .png: o arquivo é codificado por faixas de linhas, à medida que cada faixa fica completa: as linhas são filtradas
+#   (filtro "Up" do PNG, a diferença para a linha anterior) e comprimidas com zlib em um único fluxo. Os blocos devem
+#   chegar faixa por faixa, de cima para baixo (em qualquer ordem dentro da faixa); só a faixa atual fica na memória.
+# - Outros formatos: os blocos vão para um array temporário mapeado em memória, ao lado do arquivo, que é codificado
+#   com writeImage no close (os codificadores do OpenCV precisam da imagem inteira).
+# Uso:
+#     with StreamingWriter(path, (height, width), options) as writer:
+#         writer.write(top, left, rgbTile)
+class StreamingWriter:
+
+    def __init__(self, path, shape, options=None):
+        self.path = path
+        self.options = options or WriteOptions()
+        self.extension = checkOptions(path, self.options)
+        self.height, self.width = shape
+        self.array = None
+        self.tmp = None
+        self.file = None
+
+        if self.extension == ".npy":
+            dtype = np.float32 if self.options.lab else np.uint16 if self.options.depth == 16 else np.uint8
+            self.array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(self.height, self.width, 3))
+        elif self.extension == ".png" and not self.options.lab:
+            self.openPng()
+        else:
+            fd, self.tmp = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(os.path.abspath(path)))
+            os.close(fd)
+            self.array = np.lib.format.open_memmap(self.tmp, mode="w+", dtype=np.uint8, shape=(self.height, self.width, 3))
+
+    # Escreve o bloco rgb (RGB uint8) com o canto superior esquerdo em (top, left)
+    def write(self, top, left, rgb):
+        if self.file is not None:
+            self.writePngBlock(top, left, rgb)
+        elif self.tmp is not None:
+            self.array[top:top + rgb.shape[0], left:left + rgb.shape[1]] = rgb
+        else:
+            self.array[top:top + rgb.shape[0], left:left + rgb.shape[1]] = convertResult(rgb, self.options)
+
+    # Termina a gravação (e, nos formatos sem escrita em blocos, codifica o array temporário)
+    def close(self):
+        if self.file is not None:
+            self.closePng()
+        elif self.tmp is not None:
+            try:
+                writeImage(self.path, self.array, self.options)
+            finally:
+                self.array = None
+                os.remove(self.tmp)
+                self.tmp = None
+        elif self.array is not None:
+            self.array.flush()
+            self.array = None
+
+    # Interrompe a gravação, removendo o arquivo incompleto e o array temporário
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.array = None
+        for path in (self.path, self.tmp):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+        self.tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        if excType is None:
+            self.close()
+        else:
+            self.abort()
+
+    # PNG: cabeçalho (IHDR) e início do fluxo zlib
+    def openPng(self):
+        self.file = open(self.path, "wb")
+        self.file.write(PNG_SIGNATURE)
+        self.writeChunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, self.options.depth, 2, 0, 0, 0))
+        self.compressor = zlib.compressobj(self.options.png_compression)
+        self.rowBytes = self.width * 3 * self.options.depth // 8
+        self.previousRow = np.zeros(self.rowBytes, dtype=np.uint8)
+        self.nextRow = 0
+        self.band = None
+        self.bandPixels = 0
+
+    # PNG: guarda o bloco na faixa atual e codifica a faixa quando ela fica completa
+    def writePngBlock(self, top, left, rgb):
+        if top != self.nextRow:
+            raise ValueError(f"PNG rows must be written from top to bottom: expected row {self.nextRow}, got {top}")
+        if self.band is None:
+            self.band = np.empty((rgb.shape[0], self.width, 3), dtype=np.uint8)
+            self.bandPixels = 0
+        elif rgb.shape[0] != self.band.shape[0]:
+            raise ValueError(f"Blocks of the band starting at row {self.nextRow} must have {self.band.shape[0]} rows")
+
+        self.band[:, left:left + rgb.shape[1]] = rgb
+        self.bandPixels += rgb.shape[0] * rgb.shape[1]
+        if self.bandPixels == self.band.shape[0] * self.width:
+            self.encodeBand(self.band)
+            self.nextRow += self.band.shape[0]
+            self.band = None
+
+    # PNG: filtra (Up) e comprime as linhas de uma faixa completa
+    def encodeBand(self, band):
+        img = convertResult(band, self.options)
+        if self.options.depth == 16:
+            img = img.astype(">u2")
+        rows = img.reshape(band.shape[0], -1).view(np.uint8)
+
+        filtered = np.empty((rows.shape[0], self.rowBytes + 1), dtype=np.uint8)
+        filtered[:, 0] = 2  # filtro Up
+        np.subtract(rows[0], self.previousRow, out=filtered[0, 1:])
+        np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+        self.previousRow = rows[-1].copy()
+        self.writeData(self.compressor.compress(filtered))
+
+    # PNG: grava a parte já comprimida do fluxo zlib (IDAT)
+    def writeData(self, data):
+        if data:
+            self.writeChunk(b"IDAT", data)
+
+    # PNG: fim do fluxo zlib e do arquivo (IEND)
+    def closePng(self):
+        try:
+            if self.nextRow != self.height:
+                raise ValueError(f"Incomplete PNG: {self.nextRow} of {self.height} rows written")
+            self.writeData(self.compressor.flush())
+            self.writeChunk(b"IEND", b"")
+        finally:
+            self.file.close()
+            self.file = None
+
+    # PNG: grava um chunk (tamanho, tipo, dados e CRC)
+    def writeChunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))